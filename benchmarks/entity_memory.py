@@ -0,0 +1,77 @@
+"""
+Memory used per MaltegoEntity, compared to the previous __dict__ based layout.
+
+Run from the repository root:
+
+    python -m benchmarks.entity_memory [entity_count]
+"""
+import sys
+import tracemalloc
+
+from maltego_trx.maltego import MaltegoEntity
+
+
+class DictMaltegoEntity(object):
+    """The entity layout before MaltegoEntity used __slots__"""
+
+    def __init__(self, type=None, value=None):
+        self.entityType = type
+        self.value = value
+
+        self.weight = 100
+        self.additionalFields = []
+        self.displayInformation = []
+        self.iconURL = ""
+        self.overlays = []
+
+    def addProperty(self, fieldName=None, displayName=None, matchingRule='loose', value=None):
+        self.additionalFields.append([fieldName, displayName, matchingRule, value])
+
+    def addDisplayInformation(self, content=None, title='Info'):
+        self.displayInformation.append([title, content])
+
+
+def bare_entity(entity_cls, idx):
+    return entity_cls("maltego.Phrase", f"value {idx}")
+
+
+def entity_with_properties(entity_cls, idx):
+    entity = entity_cls("maltego.Phrase", f"value {idx}")
+    entity.addProperty("first", "First", "loose", "first value")
+    entity.addProperty("second", "Second", "strict", "second value")
+    entity.addProperty("link#maltego.link.color", "LinkColor", "", "#0000FF")
+    entity.addDisplayInformation("<b>content</b>", "Info")
+    return entity
+
+
+def measure(make_entity, entity_cls, count: int) -> float:
+    """Returns the bytes allocated per entity"""
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    entities = [make_entity(entity_cls, idx) for idx in range(count)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del entities
+    return (end - start) / count
+
+
+def run(count: int = 50_000) -> dict:
+    results = {}
+    for make_entity in (bare_entity, entity_with_properties):
+        before = measure(make_entity, DictMaltegoEntity, count)
+        after = measure(make_entity, MaltegoEntity, count)
+        results[make_entity.__name__] = {
+            "dict_bytes_per_entity": round(before),
+            "slots_bytes_per_entity": round(after),
+            "reduction": round(1 - after / before, 3),
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    entity_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    for name, result in run(entity_count).items():
+        print(f"{name}: {result['dict_bytes_per_entity']} B -> {result['slots_bytes_per_entity']} B per entity "
+              f"({result['reduction']:.0%} less)")
@@ -0,0 +1,224 @@
+"""
+Benchmarks for the request/response hot path: request parsing, response serialization, the Flask transform runner
+and the registry config generation.
+
+Run from the repository root:
+
+    python -m benchmarks.hot_path [--output results.json] [--compare previous.json] [--filter return_output] [--quick]
+
+Every benchmark reports the best and median time per call over several rounds. The results are written as JSON
+together with the library and Python version, so the files of two releases can be compared with --compare.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Dict, Iterable, Optional
+
+from maltego_trx import VERSION
+from maltego_trx.decorator_registry import TransformRegistry, TransformSetting, TransformSet
+from maltego_trx.maltego import MaltegoMsg, MaltegoTransform, PARSERS, SERIALIZERS
+from maltego_trx.overlays import OverlayPosition, OverlayType
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+
+REQUEST_TEMPLATE = """<MaltegoMessage>
+    <MaltegoTransformRequestMessage>
+        <Entities>
+            <Entity Type="maltego.Domain">
+                <Genealogy><Type Name="maltego.Domain" OldName="Domain"/></Genealogy>
+                <AdditionalFields>{fields}</AdditionalFields>
+                <Value>paterva.com</Value>
+                <Weight>0</Weight>
+            </Entity>
+        </Entities>
+        <Limits SoftLimit="12" HardLimit="12"/>
+        <TransformFields>{settings}</TransformFields>
+    </MaltegoTransformRequestMessage>
+</MaltegoMessage>"""
+
+FIELD_TEMPLATE = '<Field Name="{name}" DisplayName="{display}">{value}</Field>'
+
+RESPONSE_SIZES = (1, 100, 10_000)
+
+
+def make_request(field_count: int, value_size: int) -> str:
+    fields = "".join(FIELD_TEMPLATE.format(name=f"field{idx}", display=f"Field {idx}", value="v" * value_size)
+                     for idx in range(field_count))
+    settings = "".join(FIELD_TEMPLATE.format(name=f"setting{idx}", display=f"Setting {idx}", value="on")
+                       for idx in range(5))
+    return REQUEST_TEMPLATE.format(fields=fields, settings=settings)
+
+
+def add_entities(response: MaltegoTransform, count: int):
+    for idx in range(count):
+        entity = response.addEntity("maltego.Phrase", f"Entity {idx} & friends")
+        entity.setWeight(idx % 100)
+        entity.addProperty("index", "Index", "strict", idx)
+        entity.addProperty("source", "Source", "loose", "<upstream>")
+        entity.addDisplayInformation(f"<p>Entity <b>{idx}</b></p>", "Info")
+        entity.addOverlay("index", OverlayPosition.NORTH, OverlayType.TEXT)
+        entity.setLinkLabel("found")
+
+
+class BenchmarkTransform(DiscoverableTransform):
+    entity_count = 100
+
+    @classmethod
+    def create_entities(cls, request, response):
+        add_entities(response, cls.entity_count)
+
+
+def make_registry(transform_count: int) -> TransformRegistry:
+    registry = TransformRegistry(owner="Maltego Technologies GmbH", author="Maltego Support",
+                                 host_url="https://transforms.acme.org", seed_ids=["demo"])
+    registry.global_settings = [TransformSetting(name="api_key", display_name="API Key", setting_type="string")]
+    transform_set = TransformSet("Benchmark", "Benchmark transforms")
+
+    for idx in range(transform_count):
+        transform = type(f"BenchmarkTransform{idx}", (DiscoverableTransform,), {})
+        registry.register_transform(display_name=f"Benchmark {idx}", input_entity="maltego.Phrase",
+                                    description="A transform for benchmarks", output_entities=["maltego.Phrase"],
+                                    transform_set=transform_set)(transform)
+
+    return registry
+
+
+def parse_benchmarks(quick: bool, work_dir: str) -> Dict[str, Callable]:
+    requests = {
+        "small": make_request(field_count=3, value_size=20),
+        "large": make_request(field_count=50 if quick else 500, value_size=2_000),
+    }
+
+    return {
+        f"parse_{size}_{parser}": (lambda request=request, parser=parser: MaltegoMsg(request, parser=parser))
+        for size, request in requests.items()
+        for parser in PARSERS.values()
+    }
+
+
+def return_output_benchmarks(quick: bool, work_dir: str) -> Dict[str, Callable]:
+    benchmarks = {}
+    for count in RESPONSE_SIZES[:2] if quick else RESPONSE_SIZES:
+        for serializer in SERIALIZERS.values():
+            response = MaltegoTransform(serializer=serializer)
+            add_entities(response, count)
+            benchmarks[f"return_output_{count}_{serializer}"] = response.returnOutput
+
+    return benchmarks
+
+
+def transform_runner_benchmarks(quick: bool, work_dir: str) -> Dict[str, Callable]:
+    register_transform_function(BenchmarkTransform)
+    client = app.test_client()
+    request = make_request(field_count=3, value_size=20)
+
+    def run_transform():
+        response = client.post("/run/benchmarktransform/", data=request)
+        assert response.status_code == 200
+
+    return {"transform_runner_100": run_transform}
+
+
+def registry_benchmarks(quick: bool, work_dir: str) -> Dict[str, Callable]:
+    registry = make_registry(20 if quick else 500)
+
+    return {
+        "registry_transforms_csv": lambda: registry.write_transforms_config(
+            os.path.join(work_dir, "transforms.csv")),
+        "registry_settings_csv": lambda: registry.write_settings_config(os.path.join(work_dir, "settings.csv")),
+        "registry_local_mtz": lambda: registry.write_local_mtz(os.path.join(work_dir, "local.mtz")),
+    }
+
+
+BENCHMARK_GROUPS = (parse_benchmarks, return_output_benchmarks, transform_runner_benchmarks, registry_benchmarks)
+
+
+def measure(benchmark: Callable, rounds: int, min_time: float) -> dict:
+    """Returns the best and median seconds per call, calls are repeated until a round takes at least min_time"""
+    timer = timeit.Timer(benchmark)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+
+    times = [elapsed / number for elapsed in timer.repeat(repeat=rounds, number=number)]
+    return {
+        "best": min(times),
+        "median": statistics.median(times),
+        "calls_per_round": number,
+        "rounds": rounds,
+    }
+
+
+def run(name_filter: Optional[str] = None, quick: bool = False) -> dict:
+    rounds, min_time = (2, 0.0) if quick else (5, 0.2)
+    results = {}
+
+    # warnings about missing values and the server's debug logging would be measured as well
+    logging.disable(logging.WARNING)
+    try:
+        # files written by the benchmarks are removed after the run
+        with tempfile.TemporaryDirectory(prefix="maltego-trx-benchmark-") as work_dir:
+            for group in BENCHMARK_GROUPS:
+                for name, benchmark in group(quick, work_dir).items():
+                    if name_filter and name_filter not in name:
+                        continue
+                    results[name] = measure(benchmark, rounds, min_time)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {
+        "maltego_trx": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "quick": quick,
+        "benchmarks": results,
+    }
+
+
+def compare(previous: dict, current: dict) -> Iterable[str]:
+    """Yields one line per benchmark with the change of the best time against the previous results"""
+    for name, result in current["benchmarks"].items():
+        before = previous["benchmarks"].get(name)
+        if not before:
+            yield f"{name}: {result['best'] * 1000:.3f} ms (new)"
+            continue
+
+        change = result["best"] / before["best"] - 1
+        yield f"{name}: {before['best'] * 1000:.3f} ms -> {result['best'] * 1000:.3f} ms ({change:+.1%})"
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and fewer rounds, for smoke tests")
+    options = parser.parse_args(args)
+
+    results = run(options.filter, options.quick)
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if options.compare:
+        with open(options.compare) as previous_file:
+            lines = compare(json.load(previous_file), results)
+    else:
+        lines = (f"{name}: {result['best'] * 1000:.3f} ms" for name, result in results["benchmarks"].items())
+
+    for line in lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,273 @@
+"""
+ASGI application for the transform server.
+
+Transforms are dispatched through the same registry.mapping as the Flask app in server.py. Async transforms
+(AsyncDiscoverableTransform) are awaited on the event loop, so a single worker can wait on hundreds of upstream
+requests at once. Sync transforms and transform functions run in a thread pool. The concurrency limits of async
+transforms are enforced with a semaphore on the event loop instead of the thread pool of maltego_trx.executor.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import make_cache_key
+from .coalesce import AsyncSingleFlight
+from .executor import TransformSaturated, get_executor, get_limits
+from .instrumentation import collect_timings, count_entities
+from .maltego import MaltegoMsg
+from .metrics import CONTENT_TYPE, metrics as default_metrics, metrics_enabled
+from .registry import mapping
+from .runner import EXCEPTION_MESSAGE, execute_transform, get_exception_message, get_saturated_message
+
+log = logging.getLogger("maltego.asgi")
+
+# threads for sync transforms without a concurrency limit, every running sync transform blocks one of them
+DEFAULT_MAX_THREADS = 32
+
+TRANSFORM_PATH = re.compile(r"^/run/(?P<transform_name>[^/]+)/?$")
+HEADERS = [(b"content-type", b"text/html; charset=utf-8")]
+METRICS_HEADERS = [(b"content-type", CONTENT_TYPE.encode())]
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+class AsyncLimiter(object):
+    """Runs at most max_concurrency calls of an async transform at once, and lets at most queue_depth calls wait"""
+
+    def __init__(self, max_concurrency: int, queue_depth: int = 0, name: str = ""):
+        self.max_concurrency = max_concurrency
+        self.queue_depth = queue_depth
+        self.name = name
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of running and waiting calls"""
+        return self._pending
+
+    @contextlib.asynccontextmanager
+    async def limit(self):
+        # only used on the event loop, so the count needs no lock
+        if self._pending >= self.max_concurrency + self.queue_depth:
+            raise TransformSaturated(f"Transform '{self.name}' is running {self.max_concurrency} calls "
+                                     f"and {self.queue_depth} calls are waiting")
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self._pending -= 1
+
+
+class TransformASGIApp:
+    def __init__(self, max_threads: int = DEFAULT_MAX_THREADS, cache=None, metrics=None):
+        self.max_threads = max_threads
+        # a maltego_trx.cache.ResponseCache to cache transform responses
+        self.cache = cache
+        # the maltego_trx.metrics.Metrics served on /metrics, None disables the metrics
+        self.metrics = metrics
+        self.in_flight = AsyncSingleFlight()
+        # transform name -> AsyncLimiter of the async transforms with a concurrency limit
+        self.limiters = {}
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # created on first use, so importing the app doesn't start any threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="maltego-trx")
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            try:
+                status, body = await self.handle(scope["method"], scope["path"], receive)
+            except Exception as e:
+                log.error("An exception occurred while handling the request.")
+                log.error(e, exc_info=True)
+                status, body = 500, "Internal Server Error"
+
+            headers = METRICS_HEADERS if scope["path"] == "/metrics" and status == 200 else HEADERS
+            await self.send_response(send, status, body, headers)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, method, path, receive):
+        """Returns the status and body of the response, the body is a string, bytes or an async iterator of strings"""
+        if path == "/":
+            return 200, "You have reached a Maltego Transform Server."
+
+        if path == "/metrics":
+            if self.metrics is None:
+                return 404, "Metrics are disabled."
+            return 200, self.metrics.render()
+
+        match = TRANSFORM_PATH.match(path)
+        if not match:
+            return 404, "Not Found"
+
+        transform_name = match.group("transform_name").lower()
+        if transform_name not in mapping:
+            log.info("No transform found with the name '%s'.", transform_name)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Available transforms are:\n %s", list(mapping))
+            return 404, "No transform found with the name '%s'." % transform_name
+
+        if method != "POST":
+            return 200, ("Transform found with name '%s', you will need to send a POST request to run it."
+                         % transform_name)
+
+        body = await read_body(receive)
+        start = time.perf_counter()
+        # the transform counts its entities in its EXECUTE span, so the response doesn't have to be scanned for them
+        with collect_timings() as timings:
+            if self.cache is not None and self.cache.is_cacheable(mapping[transform_name]):
+                status, output = await self.run_cached(transform_name, body)
+            else:
+                status, output = await self.run(transform_name, MaltegoMsg(body))
+
+        # streamed responses are observed once they have been sent, see run_transform
+        if self.metrics is not None and isinstance(output, (str, bytes)):
+            self.metrics.observe_response(transform_name, time.perf_counter() - start, output, status,
+                                          count_entities(timings))
+        return status, output
+
+    async def run_cached(self, transform_name, body):
+        transform = mapping[transform_name]
+        body_key, cached = self.cache.lookup_body(transform_name, body)
+        if cached is not None:
+            return 200, cached
+
+        client_msg = MaltegoMsg(body)
+        key, cached = self.cache.lookup(transform_name, transform, client_msg, body_key)
+        if cached is not None:
+            return 200, cached
+
+        status, output = await self.run(transform_name, client_msg)
+        if isinstance(output, str):
+            self.cache.save(transform, key, output, status, body_key)
+        return status, output
+
+    async def run(self, transform_name, client_msg):
+        transform = mapping[transform_name]
+        if getattr(transform, "coalesce", False) and not getattr(transform, "stream", False):
+            key = make_cache_key(transform_name, transform, client_msg)
+            return await self.in_flight.do(key, getattr(transform, "coalesce_window", 0), self.run_transform,
+                                           transform_name, client_msg)
+
+        return await self.run_transform(transform_name, client_msg)
+
+    async def run_transform(self, transform_name, client_msg):
+        transform = mapping[transform_name]
+
+        if hasattr(transform, "run_transform_async"):
+            limiter = self.get_limiter(transform_name, transform)
+            try:
+                if limiter is None:
+                    return 200, await transform.run_transform_async(client_msg)
+                async with limiter.limit():
+                    return 200, await transform.run_transform_async(client_msg)
+            except TransformSaturated as e:
+                output, status = get_saturated_message(e)
+                return status, output
+            except Exception as e:
+                log.error("An exception occurred while executing your transform code.")
+                log.error(e, exc_info=True)
+                return 200, get_exception_message()
+
+        if getattr(transform, "stream", False):
+            chunks = transform.stream_transform(client_msg, EXCEPTION_MESSAGE)
+            if self.metrics is not None:
+                chunks = self.metrics.observe_stream(transform_name, chunks)
+            return 200, self.iter_chunks(chunks)
+
+        transform_executor = get_executor(transform_name, transform)
+        if transform_executor is None:
+            loop = asyncio.get_running_loop()
+            output, status = await loop.run_in_executor(self.executor, contextvars.copy_context().run,
+                                                        execute_transform, transform_name, client_msg)
+            return status, output
+
+        try:
+            future = transform_executor.submit(execute_transform, transform_name, client_msg)
+        except TransformSaturated as e:
+            output, status = get_saturated_message(e)
+            return status, output
+
+        output, status = await asyncio.wrap_future(future)
+        return status, output
+
+    def get_limiter(self, transform_name, transform):
+        """Returns the limiter of an async transform with a concurrency limit, None if it has no limit"""
+        limiter = self.limiters.get(transform_name)
+        if limiter is not None:
+            return limiter
+
+        limits = get_limits(transform_name, transform)
+        if limits is None:
+            return None
+
+        max_concurrency, queue_depth = limits
+        limiter = self.limiters[transform_name] = AsyncLimiter(max_concurrency, queue_depth, transform_name)
+        return limiter
+
+    async def iter_chunks(self, chunks):
+        # the chunks of a streamed transform are waited for in the thread pool, not on the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    @staticmethod
+    async def send_response(send, status, body, headers=HEADERS):
+        if isinstance(body, (str, bytes)):
+            body = body.encode("utf8") if isinstance(body, str) else body
+            headers = headers + [(b"content-length", str(len(body)).encode())]
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        try:
+            async for chunk in body:
+                await send({"type": "http.response.body", "body": chunk.encode("utf8"), "more_body": True})
+        finally:
+            await body.aclose()
+        await send({"type": "http.response.body", "body": b""})
+
+
+app = TransformASGIApp(metrics=default_metrics if metrics_enabled() else None)
+application = app  # application variable for usage with ASGI servers like uvicorn
@@ -0,0 +1,52 @@
+"""
+Batch runs of a transform on many input entities, for automation that doesn't go through the Maltego client.
+
+A batch request is a regular transform request with several <Entity> elements. Every entity is run as a request of
+its own, with the limits and transform settings of the batch request, and the responses are returned per entity.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from xml.etree import ElementTree
+from xml.parsers.expat import ExpatError
+
+from .maltego import MaltegoMsg
+
+DEFAULT_PARALLELISM = 8
+DEFAULT_MAX_ENTITIES = 1000
+
+# the errors MaltegoMsg and parse_batch_request raise for invalid requests, minidom raises ExpatError
+PARSE_ERRORS = (ElementTree.ParseError, ExpatError, AttributeError, IndexError, KeyError, TypeError)
+
+
+def parse_batch_request(request_xml) -> List[MaltegoMsg]:
+    """
+    Returns one MaltegoMsg per input entity. Raises one of PARSE_ERRORS if the request isn't valid.
+    The request is split into single entity requests, so every entity is read exactly like a regular request.
+    """
+    message_xml = ElementTree.fromstring(request_xml)
+    entities_xml = message_xml.find("MaltegoTransformRequestMessage").find("Entities")
+    entities = list(entities_xml)
+
+    client_msgs = []
+    for entity in entities:
+        entities_xml[:] = [entity]
+        client_msgs.append(MaltegoMsg(ElementTree.tostring(message_xml)))
+
+    return client_msgs
+
+
+def run_batch(transform_name: str, client_msgs: List[MaltegoMsg], run_transform,
+              parallelism: int = DEFAULT_PARALLELISM) -> List[dict]:
+    """Runs run_transform(transform_name, client_msg) for every message, with at most parallelism at once"""
+
+    def run(client_msg):
+        output, _ = run_transform(transform_name, client_msg)
+        return output.decode("utf8") if isinstance(output, bytes) else output
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(client_msgs)))) as pool:
+        outputs = list(pool.map(run, client_msgs))
+
+    return [
+        {"type": client_msg.Type, "value": client_msg.Value, "output": output}
+        for client_msg, output in zip(client_msgs, outputs)
+    ]
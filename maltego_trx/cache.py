@@ -0,0 +1,175 @@
+"""
+Cache for serialized transform responses.
+
+Responses are keyed on the transform name and the normalized request: entity type, value, properties, transform
+settings and slider. The raw request body is stored as an alias of that key, so repeated requests are answered
+without parsing the request or serializing the response again.
+Responses with a PartialError or FatalError message are never cached.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .maltego import MaltegoMsg
+
+# budget for cached responses of the LRUCache, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# seconds a response stays cached unless the transform sets cache_ttl
+DEFAULT_TTL = 300
+
+ERROR_MESSAGE_TYPES = ('MessageType="PartialError"', 'MessageType="FatalError"')
+
+
+class LRUCache(object):
+    """Thread-safe in-process store which drops the least recently used entries once max_bytes is exceeded"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (expires_at, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(key) + len(value)
+
+
+def make_body_key(transform_name: str, body: bytes) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf8")
+    return "body:" + transform_name + ":" + hashlib.sha256(body).hexdigest()
+
+
+def make_cache_key(transform_name: str, transform, client_msg) -> str:
+    """
+    Key of the normalized request. Transforms can limit the properties that are part of the key with
+    cache_properties, e.g. to leave out properties their result doesn't depend on.
+    """
+    properties = client_msg.Properties
+    cache_properties = getattr(transform, "cache_properties", None)
+    if cache_properties is not None:
+        properties = {name: properties.get(name) for name in cache_properties}
+
+    normalized = json.dumps(
+        [client_msg.Type, client_msg.Value, properties, client_msg.TransformSettings, client_msg.Slider],
+        sort_keys=True, default=str,
+    )
+    return "response:" + transform_name + ":" + hashlib.sha256(normalized.encode("utf8")).hexdigest()
+
+
+def is_complete_response(output) -> bool:
+    return not any(message_type in output for message_type in ERROR_MESSAGE_TYPES)
+
+
+class ResponseCache(object):
+    """
+    Caches transform responses in a store with get(key) and set(key, value, ttl), an LRUCache by default.
+    Transforms can set cache_ttl in seconds and opt out with cacheable = False. Streamed transforms are never cached.
+    """
+
+    def __init__(self, store=None, default_ttl: float = DEFAULT_TTL):
+        self.store = store if store is not None else LRUCache()
+        self.default_ttl = default_ttl
+
+    def get_ttl(self, transform) -> float:
+        ttl = getattr(transform, "cache_ttl", None)
+        return self.default_ttl if ttl is None else ttl
+
+    def is_cacheable(self, transform) -> bool:
+        return (getattr(transform, "cacheable", True) and not getattr(transform, "stream", False)
+                and self.get_ttl(transform) > 0)
+
+    def lookup_body(self, transform_name: str, body: bytes) -> Tuple[str, Optional[bytes]]:
+        """Returns the alias key of the raw request body and the cached response, if there is one"""
+        body_key = make_body_key(transform_name, body)
+        key = self.store.get(body_key)
+        return body_key, self.store.get(key.decode("utf8")) if key is not None else None
+
+    def lookup(self, transform_name: str, transform, client_msg, body_key: str) -> Tuple[str, Optional[bytes]]:
+        """Returns the key of the parsed request and the cached response, if there is one"""
+        key = make_cache_key(transform_name, transform, client_msg)
+        cached = self.store.get(key)
+        if cached is not None:
+            self.store.set(body_key, key.encode("utf8"), self.get_ttl(transform))
+        return key, cached
+
+    def save(self, transform, key: str, output, status: int, body_key: str = None):
+        if status != 200 or not is_complete_response(output):
+            return
+
+        ttl = self.get_ttl(transform)
+        self.store.set(key, output.encode("utf8") if isinstance(output, str) else output, ttl)
+        if body_key is not None:
+            self.store.set(body_key, key.encode("utf8"), ttl)
+
+    def run_transform(self, transform_name: str, transform, body: bytes, run_transform):
+        """Returns the cached response for the request body, or runs run_transform(transform_name, client_msg)"""
+        body_key, cached = self.lookup_body(transform_name, body)
+        if cached is not None:
+            return cached, 200
+
+        client_msg = MaltegoMsg(body)
+        key, cached = self.lookup(transform_name, transform, client_msg, body_key)
+        if cached is not None:
+            return cached, 200
+
+        output, status = run_transform(transform_name, client_msg)
+        self.save(transform, key, output, status, body_key)
+        return output, status
+
+    def run_parsed_transform(self, transform_name: str, transform, client_msg, run_transform):
+        """Same as run_transform, for requests that have already been parsed"""
+        key = make_cache_key(transform_name, transform, client_msg)
+        cached = self.store.get(key)
+        if cached is not None:
+            return cached, 200
+
+        output, status = run_transform(transform_name, client_msg)
+        self.save(transform, key, output, status)
+        return output, status
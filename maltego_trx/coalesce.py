@@ -0,0 +1,102 @@
+"""
+Coalescing of identical transform calls.
+
+Transforms with coalesce = True run only once for concurrent requests with the same normalized request (see
+cache.make_cache_key). Requests which arrive while the transform runs wait for it and get the same response. With a
+coalesce_window, requests arriving up to that many seconds after the call finished get its response as well.
+"""
+import threading
+import time
+from typing import Dict
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "error", "expires_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires_at = None
+
+
+class SingleFlight(object):
+    """Runs fn only once for all concurrent calls with the same key, for threads"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key: str, window: float, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.expires_at is not None and call.expires_at <= time.monotonic():
+                call = None
+
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call, window)
+
+    def _finish(self, key, call, window):
+        now = time.monotonic()
+        with self._lock:
+            if window and call.error is None:
+                call.expires_at = now + window
+            elif self._calls.get(key) is call:
+                del self._calls[key]
+
+            # results kept for a window are dropped once other calls finish after it ended
+            for expired_key in [key for key, kept in self._calls.items()
+                                if kept.expires_at is not None and kept.expires_at <= now]:
+                del self._calls[expired_key]
+
+        call.done.set()
+
+
+class AsyncSingleFlight(object):
+    """Awaits fn only once for all concurrent calls with the same key, for a single event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Future"] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: str, window: float, fn, *args):
+        import asyncio
+
+        call = self._calls.get(key)
+        if call is not None:
+            # shielded, so a cancelled follower doesn't cancel the call of all others
+            return await asyncio.shield(call)
+
+        call = self._calls[key] = asyncio.ensure_future(fn(*args))
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if window and call.done() and not call.cancelled() and call.exception() is None:
+                asyncio.get_running_loop().call_later(window, self._forget, key, call)
+            else:
+                self._forget(key, call)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,97 @@
+"""
+Local transform daemon, which keeps a project loaded for the local transforms run by Maltego.
+
+`python project.py daemon` imports the project once and serves its transforms on a Unix socket, see
+local_client.get_socket_path. Each entity is then one round trip from maltego_trx.local_client instead of a new
+interpreter importing the whole project. Requests run in threads of their own, so Maltego can run many at once.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+
+from .local_client import check_owner, get_socket_path
+from .maltego import MaltegoMsg
+from .registry import mapping
+from .runner import get_exception_message, run_transform
+
+log = logging.getLogger(__name__)
+
+
+def run_local_transform(transform_name: str, args) -> str:
+    """Output of `project.py local <transform_name> <args>`"""
+    transform_name = transform_name.lower()
+    if transform_name not in mapping:
+        return get_exception_message(msg="Unable to find a transform matching '%s'." % transform_name)
+
+    output, _ = run_transform(transform_name, MaltegoMsg(LocalArgs=args))
+    return output.decode("utf8") if isinstance(output, bytes) else output
+
+
+class LocalTransformHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.read())
+            output = run_local_transform(request["transform"], request["args"])
+        except Exception as e:
+            log.error("An exception occurred while running a local transform.")
+            log.error(e, exc_info=True)
+            output = get_exception_message()
+
+        # print adds a newline to the output of project.py local as well
+        self.wfile.write((output + "\n").encode("utf8"))
+
+
+class LocalTransformDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        prepare_socket_path(socket_path)
+        super().__init__(socket_path, LocalTransformHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+class DaemonAlreadyRunning(Exception):
+    """Raised when another daemon serves the socket already"""
+
+
+def prepare_socket_path(socket_path: str):
+    # only the current user may connect, since the daemon runs transforms for anyone who can
+    socket_dir = os.path.dirname(socket_path)
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    check_owner(socket_dir, stat.S_ISDIR)
+    os.chmod(socket_dir, 0o700)
+
+    if not os.path.lexists(socket_path):
+        return
+    check_owner(socket_path, stat.S_ISSOCK)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # left behind by a daemon which didn't shut down
+            os.unlink(socket_path)
+            return
+
+    raise DaemonAlreadyRunning(f"A local transform daemon is already running on {socket_path}")
+
+
+def serve(project_path: str):
+    """Serves the registered transforms to maltego_trx.local_client until interrupted"""
+    socket_path = get_socket_path(project_path)
+    with LocalTransformDaemon(socket_path) as daemon:
+        print(f"Serving {len(mapping)} local transforms on {socket_path}")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+DEADLINE_MESSAGE = "The transform ran out of time, the results are incomplete."
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a transform continues to add entities after its deadline"""
+
+
+class Deadline(object):
+    """
+    Time budget of a transform run, available to create_entities as response.deadline.
+    Without a timeout, the deadline never expires unless it is cancelled.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        # time.monotonic is shared by all processes, so the deadline still holds in a process pool worker
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self._cancelled = False
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, e.g. as the timeout of upstream requests, None without a timeout"""
+        if self._cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self._cancelled or (self.expires_at is not None and time.monotonic() >= self.expires_at)
+
+    def check(self):
+        """Raises DeadlineExceeded once the deadline expired, to stop the transform at a convenient place"""
+        if self.expired():
+            raise DeadlineExceeded(f"The transform exceeded its timeout of {self.timeout} seconds")
+
+    def cancel(self):
+        self._cancelled = True
@@ -104,9 +104,13 @@ class TransformRegistry:
         output_entities: List[str] = None,
         disclaimer: str = "",
         transform_set: TransformSet = None,
+        use_process_pool: bool = False,
+        timeout: Optional[float] = None,
     ):
         """This method can be used as a decorator on transform classes. The data will be used to fill out csv config
         files to be imported into a TDS.
+        With use_process_pool, the transform runs in a worker process, see DiscoverableTransform.use_process_pool.
+        timeout sets DiscoverableTransform.timeout, the seconds after which the transform returns partial results.
         """
 
         def decorated(transform_callable: object):
@@ -130,6 +134,12 @@ class TransformRegistry:
             if transform_set:
                 self.transform_sets[transform_set].append(cleaned_transform_name)
 
+            if use_process_pool:
+                transform_callable.use_process_pool = True
+
+            if timeout:
+                transform_callable.timeout = timeout
+
             return transform_callable
 
         return decorated
@@ -219,6 +229,7 @@ class TransformRegistry:
         command: str = "python3",
         params: str = "project.py",
         debug: bool = True,
+        daemon: bool = False,
     ) -> Iterable[Tuple[str, str]]:
         working_dir = os.path.abspath(working_dir)
         if self.global_settings:
@@ -234,8 +245,12 @@ class TransformRegistry:
         yield "Servers/Local.tas", server_xml_str
 
         for name, meta in self.transform_metas.items():
+            # with daemon, the thin client sends the entity to `project.py daemon`, see maltego_trx.local_client
+            transform_params = (
+                f"-m maltego_trx.local_client {params} {name}" if daemon else f"{params} local {name}"
+            )
             settings_xml = create_settings_xml(
-                working_dir, command, f"{params} local {name}", debug
+                working_dir, command, transform_params, debug
             )
             settings_xml_str = serialize_xml(settings_xml)
 
@@ -275,10 +290,11 @@ class TransformRegistry:
         command: str = "python3",
         params: str = "project.py",
         debug: bool = True,
+        daemon: bool = False,
     ):
 
         with zipfile.ZipFile(mtz_path, "w") as mtz:
             for path, content in self._create_local_mtz(
-                working_dir, command, params, debug
+                working_dir, command, params, debug, daemon
             ):
                 mtz.writestr(path, content)
@@ -0,0 +1,108 @@
+"""
+Per-transform concurrency limits.
+
+A transform (class or function) with a max_concurrency attribute, or with limits set by set_limits, runs in a thread
+pool of its own with that many threads. At most queue_depth further calls wait for a free thread. Calls beyond that are
+rejected right away with TransformSaturated, so one slow transform can't take up every worker of the server.
+Transforms without a limit are run on the request thread as before.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from .utils import name_to_path
+
+log = logging.getLogger(__name__)
+
+# transform name -> (max_concurrency, queue_depth), takes precedence over the transform's attributes
+transform_limits: Dict[str, Tuple[int, int]] = {}
+
+executors: Dict[str, "BoundedExecutor"] = {}
+_executors_lock = threading.Lock()
+
+
+class TransformSaturated(Exception):
+    """Raised when a transform already runs max_concurrency calls and queue_depth calls are waiting"""
+
+
+class BoundedExecutor(object):
+    def __init__(self, max_concurrency: int, queue_depth: int = 0, name: str = ""):
+        self.max_concurrency = max_concurrency
+        self.queue_depth = queue_depth
+        self.name = name
+
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"maltego-trx-{name}")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of running and waiting calls"""
+        return self._pending
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pending >= self.max_concurrency + self.queue_depth:
+                raise TransformSaturated(f"Transform '{self.name}' is running {self.max_concurrency} calls "
+                                         f"and {self.queue_depth} calls are waiting")
+            self._pending += 1
+
+        try:
+            # the call runs in the context of the caller, e.g. for the timings of maltego_trx.instrumentation
+            future = self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+def set_limits(transform_name: str, max_concurrency: int, queue_depth: int = 0):
+    """Limits a transform by its name or its class or function name, e.g. for transforms whose code can't be changed"""
+    transform_limits[name_to_path(transform_name)] = (max_concurrency, queue_depth)
+
+
+def get_limits(transform_name: str, transform) -> Optional[Tuple[int, int]]:
+    if transform_name in transform_limits:
+        return transform_limits[transform_name]
+
+    max_concurrency = getattr(transform, "max_concurrency", None)
+    if not max_concurrency:
+        return None
+    return max_concurrency, getattr(transform, "queue_depth", 0) or 0
+
+
+def get_executor(transform_name: str, transform) -> Optional[BoundedExecutor]:
+    """Returns the executor of a transform with a concurrency limit, None if it has no limit"""
+    executor = executors.get(transform_name)
+    if executor is not None:
+        return executor
+
+    limits = get_limits(transform_name, transform)
+    if limits is None:
+        return None
+
+    with _executors_lock:
+        if transform_name not in executors:
+            max_concurrency, queue_depth = limits
+            log.debug("Transform '%s' is limited to %d concurrent calls and %d waiting calls",
+                      transform_name, max_concurrency, queue_depth)
+            executors[transform_name] = BoundedExecutor(max_concurrency, queue_depth, transform_name)
+        return executors[transform_name]
+
+
+def shutdown(wait: bool = True):
+    with _executors_lock:
+        for executor in executors.values():
+            executor.shutdown(wait=wait)
+        executors.clear()
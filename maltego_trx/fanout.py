@@ -0,0 +1,60 @@
+"""
+Fan-out runs of several transforms on the same request.
+
+The request is parsed once and every transform runs concurrently on a copy of it. The responses are returned per
+transform, or combined into a single response. A failing transform only adds its PartialError message.
+"""
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element, SubElement
+
+from .maltego import MaltegoMsg
+from .utils import serialize_xml
+
+DEFAULT_MAX_TRANSFORMS = 20
+
+FORMAT_KEYED = "keyed"
+FORMAT_COMBINED = "combined"
+FORMATS = {
+    "keyed": FORMAT_KEYED,
+    "combined": FORMAT_COMBINED,
+}
+
+
+def run_fanout(transform_names: List[str], client_msg: MaltegoMsg, get_runner) -> Dict[str, str]:
+    """
+    Runs all transforms at the same time and returns their responses by transform name.
+    get_runner(transform_name) returns the function that runs the transform, see server.get_runner.
+    """
+
+    def run(transform_name):
+        # every transform gets a copy, so one transform changing the request doesn't affect the others
+        output, _ = get_runner(transform_name)(transform_name, copy.deepcopy(client_msg))
+        return output.decode("utf8") if isinstance(output, bytes) else output
+
+    with ThreadPoolExecutor(max_workers=max(1, len(transform_names))) as pool:
+        outputs = list(pool.map(run, transform_names))
+
+    return dict(zip(transform_names, outputs))
+
+
+def combine_responses(outputs: List[str]) -> str:
+    """Combines the entities and UI messages of several transform responses into one response"""
+    message_xml = Element('MaltegoMessage')
+    response_xml = SubElement(message_xml, 'MaltegoTransformResponseMessage')
+    entities_xml = SubElement(response_xml, 'Entities')
+    ui_messages_xml = SubElement(response_xml, 'UIMessages')
+
+    for output in outputs:
+        transform_response_xml = ElementTree.fromstring(output).find('MaltegoTransformResponseMessage')
+        if transform_response_xml is None:
+            continue
+
+        for tag, combined_xml in (('Entities', entities_xml), ('UIMessages', ui_messages_xml)):
+            elements = transform_response_xml.find(tag)
+            if elements is not None:
+                combined_xml.extend(elements)
+
+    return serialize_xml(message_xml)
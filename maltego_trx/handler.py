@@ -1,18 +1,28 @@
+import logging
+import sys
+
 from maltego_trx import VERSION
 from .maltego import MaltegoMsg
-from .registry import mapping
-from .server import print_transforms, run_transform, get_exception_message
+from .registry import mapping, rebuild_manifests
+from .runner import print_transforms, run_transform, get_exception_message
 
 """
 Receive commands run inside a project folder.
+
+Only runserver needs the Flask app, the other commands don't import maltego_trx.server unless the project passes the
+app itself.
 """
 
 
-def handle_run(name, args, app, port=8080, ssl_context=None, debug=False):
+def handle_run(name, args, app=None, port=8080, ssl_context=None, debug=False):
     if name == "__main__":
         if len(args) >= 2:
             command = args[1].lower()
             if command == "runserver":
+                if app is None:
+                    from .server import app
+                # the development server logs everything, production servers only import the app and configure logging
+                logging.basicConfig(level=logging.DEBUG)
                 print("\n=== Maltego Transform Server: v%s ===\n" % VERSION)
                 print_transforms()
                 app.run(host="0.0.0.0", port=port, debug=debug, ssl_context=ssl_context)
@@ -25,7 +35,34 @@ def handle_run(name, args, app, port=8080, ssl_context=None, debug=False):
                     print(run_transform(transform_name, client_msg)[0])
                 else:
                     print(get_exception_message(msg="Unable to find a transform matching '%s'." % transform_name))
+            elif command == "daemon":
+                from .local_client import UnsafeSocketPath, daemon_supported
+                if not daemon_supported():
+                    print("The local transform daemon needs Unix sockets, which aren't available on this platform")
+                    return
+
+                # socketserver only has UnixStreamServer where Unix sockets are available
+                from .daemon import DaemonAlreadyRunning, serve
+                try:
+                    serve(args[0])
+                except (DaemonAlreadyRunning, UnsafeSocketPath) as e:
+                    print(e)
+            elif command == "manifest":
+                rebuild_manifests()
+            elif command == "profiles":
+                from .profiling import summarize_profiles
+                if app is None:
+                    # the project configures the profiler on the app of the server, if it imported the server
+                    server = sys.modules.get("maltego_trx.server")
+                    app = server.app if server is not None else None
+                profiler = app.config.get("TRX_PROFILER") if app is not None else None
+                if len(args) > 2:
+                    print(summarize_profiles(args[2]))
+                elif profiler is not None:
+                    print(summarize_profiles(profiler.directory))
+                else:
+                    print("Set app.config[\"TRX_PROFILER\"] or pass the profile directory: profiles <directory>")
 
         else:
-            commands = ["list", "local", "runserver"]
+            commands = ["daemon", "list", "local", "manifest", "profiles", "runserver"]
             print("Command not recognised. Available commands are:\r\n{0}".format("\r\n".join(commands)))
@@ -0,0 +1,120 @@
+"""
+Timing of the phases of a transform request.
+
+The server and DiscoverableTransform time the phases of a request in spans: parsing the request (PARSE), running the
+transform (EXECUTE) and serializing the response (SERIALIZE). Every finished span calls the registered hooks with
+hook(phase, transform_name, duration, size), where size is the bytes of the request or response, or the number of
+entities for EXECUTE. Without hooks, and outside collect_timings, span returns a shared no-op span.
+"""
+import contextvars
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+PARSE = "parse"
+EXECUTE = "execute"
+SERIALIZE = "serialize"
+
+hooks: List[Callable[[str, str, float, int], None]] = []
+
+# the (phase, duration, size) of the spans of the current request, while collect_timings is active
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float, int]]]] = contextvars.ContextVar("timings",
+                                                                                                   default=None)
+
+
+def add_hook(hook: Callable[[str, str, float, int], None]):
+    hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, str, float, int], None]):
+    hooks.remove(hook)
+
+
+class Span(object):
+    __slots__ = ("phase", "transform_name", "size", "start", "duration")
+
+    def __init__(self, phase: str, transform_name: str, size: int = 0):
+        self.phase = phase
+        self.transform_name = transform_name
+        # can be set within the span, e.g. once the size of the response is known
+        self.size = size
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self.start
+
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((self.phase, self.duration, self.size))
+
+        for hook in hooks:
+            try:
+                hook(self.phase, self.transform_name, self.duration, self.size)
+            except Exception as e:
+                log.warning("Instrumentation hook %r failed: %s", hook, e)
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @property
+    def size(self):
+        return 0
+
+    @size.setter
+    def size(self, size):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(phase: str, transform_name: str, size: int = 0):
+    """Context manager timing a phase of a transform request"""
+    if not hooks and _timings.get() is None:
+        return NO_SPAN
+    return Span(phase, transform_name, size)
+
+
+class collect_timings(object):
+    """
+    Collects the (phase, duration, size) of all spans within it, including spans in threads started with copy_context.
+    The spans are passed on to an enclosing collect_timings as well.
+    """
+
+    def __enter__(self) -> List[Tuple[str, float, int]]:
+        self._outer = _timings.get()
+        self._timings = []
+        self._token = _timings.set(self._timings)
+        return self._timings
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _timings.reset(self._token)
+        if self._outer is not None:
+            self._outer.extend(self._timings)
+
+
+def count_entities(timings: List[Tuple[str, float, int]]) -> int:
+    """Entities returned by the transforms of the collected spans, the sizes of the EXECUTE spans"""
+    return sum(size for phase, _, size in timings if phase == EXECUTE)
+
+
+def format_server_timing(timings: List[Tuple[str, float, int]]) -> str:
+    """Server-Timing header value with the total milliseconds of every phase"""
+    totals = {}
+    for phase, duration, *_ in timings:
+        totals[phase] = totals.get(phase, 0) + duration
+    return ", ".join(f"{phase};dur={duration * 1000:.3f}" for phase, duration in totals.items())
@@ -0,0 +1,113 @@
+"""
+Thin client for local transforms served by a local transform daemon, see maltego_trx.daemon.
+
+Maltego starts a new process for every entity a local transform runs on. Instead of `python3 project.py local`, which
+imports the whole project every time, the .mtz generated with daemon=True runs
+
+    python3 -m maltego_trx.local_client project.py <transform_name> <value> <properties>
+
+which only imports the standard library and sends the arguments to the daemon of the project. Without a running
+daemon, a socket which another user may have created, or Unix sockets (e.g. on Windows), it runs `project.py local`
+like before.
+"""
+import hashlib
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+from typing import Optional
+
+
+class UnsafeSocketPath(Exception):
+    """Raised when the socket or its directory may be controlled by another user"""
+
+
+def daemon_supported() -> bool:
+    """Unix sockets and user ids aren't available everywhere, e.g. on Windows"""
+    return hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+
+
+def get_socket_dir() -> str:
+    """Directory of the sockets of the current user, $XDG_RUNTIME_DIR if it's set"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "maltego-trx")
+    return os.path.join(tempfile.gettempdir(), f"maltego-trx-{os.getuid()}")
+
+
+def get_socket_path(project_path: str) -> str:
+    """Unix socket of the daemon of a project, in a directory only the current user can access"""
+    project_hash = hashlib.sha256(os.path.abspath(project_path).encode("utf8")).hexdigest()[:16]
+    return os.path.join(get_socket_dir(), f"{project_hash}.sock")
+
+
+def check_owner(path: str, file_type, private: bool = False):
+    """Raises UnsafeSocketPath unless path is of file_type, owned by the current user and, if private, only
+    accessible by them"""
+    path_stat = os.lstat(path)
+    if path_stat.st_uid != os.getuid() or not file_type(path_stat.st_mode):
+        raise UnsafeSocketPath(f"{path} isn't owned by the current user")
+    if private and stat.S_IMODE(path_stat.st_mode) & 0o077:
+        raise UnsafeSocketPath(f"{path} can be accessed by other users")
+
+
+def check_socket_path(socket_path: str):
+    """Raises UnsafeSocketPath unless only the current user can have created the socket"""
+    check_owner(os.path.dirname(socket_path), stat.S_ISDIR, private=True)
+    check_owner(socket_path, stat.S_ISSOCK)
+
+
+def run_remote(socket_path: str, transform_name: str, args) -> bytes:
+    """Runs the transform in the daemon and returns its output"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps({"transform": transform_name, "args": args}).encode("utf8"))
+        client.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+def run_local(project_path: str, transform_name: str, args) -> Optional[int]:
+    """Runs `project.py local` instead of the daemon"""
+    command = [sys.executable, project_path, "local", transform_name, *args]
+    if os.name == "nt":
+        # execv starts a separate process on Windows and returns right away
+        return subprocess.call(command)
+    return os.execv(sys.executable, command)
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("Usage: python -m maltego_trx.local_client <project.py> <transform_name> <value> [properties]")
+        return 1
+
+    project_path, transform_name, args = argv[0], argv[1], argv[2:]
+    if not daemon_supported():
+        return run_local(project_path, transform_name, args)
+
+    socket_path = get_socket_path(project_path)
+    try:
+        check_socket_path(socket_path)
+        output = run_remote(socket_path, transform_name, args)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # no daemon running, the project runs the transform itself
+        return run_local(project_path, transform_name, args)
+    except UnsafeSocketPath as e:
+        print(f"Not using the local transform daemon: {e}", file=sys.stderr)
+        return run_local(project_path, transform_name, args)
+
+    sys.stdout.buffer.write(output)
+    sys.stdout.buffer.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
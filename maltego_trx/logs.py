@@ -0,0 +1,146 @@
+"""
+Logging for production servers, which keeps writing the logs off the request threads.
+
+configure_logging() routes the loggers of maltego-trx through a queue to a writer thread. A request thread only puts
+the record into the queue. The message is formatted by the writer thread, and only if the record is written at all.
+Repeated warnings, e.g. for every entity without a weight, are written once per rate_limit seconds with the number of
+suppressed repeats, errors are always written. The root logger and its level aren't changed, the maltego-trx loggers don't propagate to it anymore.
+
+With app.config["TRX_REQUEST_LOG"] = True, the server logs a record per transform request to REQUEST_LOGGER, with the
+transform, status, duration, entities and bytes as attributes. JSONFormatter writes them as JSON lines.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# the loggers of maltego-trx: maltego.server, maltego.asgi, maltego-trx of utils and maltego_trx.* of the modules
+LOGGERS = ("maltego", "maltego-trx", "maltego_trx")
+REQUEST_LOGGER = "maltego.requests"
+
+DEFAULT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+DEFAULT_RATE_LIMIT = 60.0
+
+# attributes of every LogRecord, everything else was passed as extra
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets a warning through once per interval, by logger and message template, and counts the suppressed repeats.
+    Errors and records with exception info are always let through, they may look alike but come from different calls.
+    """
+
+    def __init__(self, interval: float = DEFAULT_RATE_LIMIT):
+        super().__init__()
+        self.interval = interval
+        # (logger name, message template) -> (time the message was let through, suppressed repeats since)
+        self._seen: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.WARNING or record.exc_info:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            passed_at, suppressed = self._seen.get(key, (None, 0))
+            if passed_at is not None and now - passed_at < self.interval:
+                self._seen[key] = (passed_at, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler which leaves formatting to the handlers of the QueueListener.
+    QueueHandler.prepare would format every message on the logging thread, even if it's never written.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SuppressedFormatter(logging.Formatter):
+    """Formatter which notes the repeats suppressed by RateLimitFilter"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f" ({suppressed} similar messages suppressed)"
+        return message
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as JSON lines, with the attributes passed as extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[LazyQueueHandler] = None
+
+
+def configure_logging(level: int = logging.INFO, handler: Optional[logging.Handler] = None, json_lines: bool = False,
+                      rate_limit: float = DEFAULT_RATE_LIMIT) -> logging.handlers.QueueListener:
+    """
+    Routes the maltego-trx loggers through a queue to handler, by default stderr, and starts the writer thread.
+    Messages below level are dropped before they're queued. rate_limit=0 writes every repeated warning.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+    if handler.formatter is None:
+        handler.setFormatter(JSONFormatter() if json_lines else SuppressedFormatter(DEFAULT_FORMAT))
+
+    _queue_handler = LazyQueueHandler(queue.SimpleQueue())
+    if rate_limit:
+        _queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        logger.addHandler(_queue_handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Writes the queued records and stops the writer thread, the loggers propagate to the root logger again"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+
+    _listener.stop()
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        logger.removeHandler(_queue_handler)
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+
+    _listener = _queue_handler = None
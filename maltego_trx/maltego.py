@@ -1,11 +1,14 @@
-import logging
+import copy
 import uuid
+from itertools import repeat
 from xml.dom import minidom
-from xml.etree.ElementTree import Element, SubElement
+from xml.etree.ElementTree import Element, SubElement, XMLPullParser
 
+from .deadline import Deadline
 from .entities import translate_legacy_property_name, entity_property_map
 from .overlays import OverlayPosition, OverlayType
-from .utils import remove_invalid_xml_chars, serialize_xml, deprecated, logger
+from .serializer import serialize_response
+from .utils import remove_invalid_xml_chars, sanitize_xml_text, serialize_xml, deprecated, logger
 
 BOOKMARK_COLOR_NONE = "-1"
 BOOKMARK_COLOR_BLUE = "0"
@@ -49,8 +52,33 @@ DISP_INFO_TEMPLATE = "<Label Name=\"%(name)s\" Type=\"text/html\"><![CDATA[' %(c
 UIM_TEMPLATE = "<UIMessage MessageType=\"%(type)s\">%(text)s</UIMessage>"
 OVERLAY_TEMPLATE = "<Overlay position=\"%(position)s\" propertyName=\"%(property_name)s\" type=\"%(type)s\"/>"
 
+SERIALIZER_ETREE = "etree"
+SERIALIZER_STRING = "string"
+SERIALIZERS = {
+    "etree": SERIALIZER_ETREE,
+    "string": SERIALIZER_STRING,
+}
+
+PARSER_MINIDOM = "minidom"
+PARSER_ETREE = "etree"
+PARSERS = {
+    "minidom": PARSER_MINIDOM,
+    "etree": PARSER_ETREE,
+}
+
+# size of the slices fed to the pull parser, so large bodies are never duplicated as a whole
+PARSER_FEED_SIZE = 64 * 1024
+
+# minidom keeps CDATA sections and comments as nodes of their own, which ElementTree merges into the surrounding text
+# or drops, so requests containing them are always parsed with minidom
+MINIDOM_ONLY_MARKUP = ("<![CDATA[", "<!--")
+
 
 class MaltegoEntity(object):
+    # responses can hold tens of thousands of entities, so they have no __dict__ and their property, display
+    # information and overlay lists are only allocated once the first item is added
+    __slots__ = ("entityType", "value", "weight", "iconURL", "_additional_fields", "_display_information", "_overlays")
+
     def __init__(self, type=None, value=None):
         if not type:
             logger.warning("Entity has no Type and will default to maltego.Phrase")
@@ -64,10 +92,40 @@ class MaltegoEntity(object):
         self.value = value
 
         self.weight = 100
-        self.additionalFields = []
-        self.displayInformation = []
         self.iconURL = ""
-        self.overlays = []
+        self._additional_fields = None
+        self._display_information = None
+        self._overlays = None
+
+    @property
+    def additionalFields(self):
+        if self._additional_fields is None:
+            self._additional_fields = []
+        return self._additional_fields
+
+    @additionalFields.setter
+    def additionalFields(self, additional_fields):
+        self._additional_fields = additional_fields
+
+    @property
+    def displayInformation(self):
+        if self._display_information is None:
+            self._display_information = []
+        return self._display_information
+
+    @displayInformation.setter
+    def displayInformation(self, display_information):
+        self._display_information = display_information
+
+    @property
+    def overlays(self):
+        if self._overlays is None:
+            self._overlays = []
+        return self._overlays
+
+    @overlays.setter
+    def overlays(self, overlays):
+        self._overlays = overlays
 
     def setType(self, type=None):
         if type:
@@ -83,10 +141,10 @@ class MaltegoEntity(object):
 
     def addDisplayInformation(self, content=None, title='Info'):
         if content and title:
-            self.displayInformation.append([title, content])
+            self.displayInformation.append((title, content))
 
     def addProperty(self, fieldName=None, displayName=None, matchingRule='loose', value=None):
-        self.additionalFields.append([fieldName, displayName, matchingRule, value])
+        self.additionalFields.append((fieldName, displayName, matchingRule, value))
 
     def setIconURL(self, url=None):
         if url:
@@ -120,7 +178,7 @@ class MaltegoEntity(object):
     def addOverlay(
             self, propertyName, position: OverlayPosition, overlayType: OverlayType
     ):
-        self.overlays.append([propertyName, position.value, overlayType.value])
+        self.overlays.append((propertyName, position.value, overlayType.value))
 
     @deprecated()
     def add_field_to_xml(self, additional_field):
@@ -143,97 +201,410 @@ class MaltegoEntity(object):
             "name": name,
         }
 
-    def build_xml(self) -> Element:
-        # defaults are set to allow for backwards compatibility with old serializer
-
-        entity_xml = Element('Entity', attrib={'Type': self.entityType})
-
-        value_xml = SubElement(entity_xml, 'Value')
-        value_xml.text = str(self.value)
-
+    def ensure_weight(self):
         if not self.weight:
             logger.warning("Entity has no Weight and will default to 100")
             self.weight = 100
 
-        weight_xml = SubElement(entity_xml, 'Weight')
-        weight_xml.text = str(self.weight)
+        return self.weight
 
-        if self.displayInformation:
-            display_infos_xml = SubElement(entity_xml, 'DisplayInformation')
-            for display_info in self.displayInformation:
-                title, content = display_info
+    def iter_display_information(self):
+        """Yields (title, content) of every display information with defaults applied."""
+        for display_info in self._display_information or ():
+            title, content = display_info
 
-                if not title:
-                    logger.warning(f"Display information is missing title and will default to 'Info': "
-                                   f"title={title}")
-                    title = 'Info'
+            if not title:
+                logger.warning("Display information is missing title and will default to 'Info': title=%s", title)
+                title = 'Info'
 
-                if not content:
-                    logging.warning(f"Display information is missing content: "
-                                    f"content={content}")
-                    content = ""
+            if not content:
+                logger.warning("Display information is missing content: content=%s", content)
+                content = ""
 
-                display_info_xml = SubElement(display_infos_xml, 'Label', attrib={'Name': title, 'Type': "text/html"})
-                # for some reason, the client accepts escaped html and renders it correctly, so we don't need CDATA
-                display_info_xml.text = str(content)
+            yield title, content
 
-        if self.additionalFields:
-            properties_xml = SubElement(entity_xml, 'AdditionalFields')
-            for prop in self.additionalFields:
-                field_name, display_name, matching_rule, value = prop
+    def iter_properties(self):
+        """Yields (field_name, display_name, matching_rule, value) of every property as serialized strings."""
+        for prop in self._additional_fields or ():
+            field_name, display_name, matching_rule, value = prop
+
+            if not field_name:
+                logger.error("No property name specified. field_name=%s, display_name=%s, matching_rule=%s, value=%s",
+                             field_name, display_name, matching_rule, value)
+
+            # the client will still use the entity definitions display value
+            # if there is none, it would use the empty string, so we use the title as a backup
+            display_name = display_name or field_name
+
+            matching_rule = "strict" if matching_rule == "strict" else "loose"
+
+            yield str(field_name), str(display_name), matching_rule, str(value or "")
 
-                if not field_name:
-                    logger.error(f"No property name specified. "
-                                 f"field_name={field_name}, display_name={display_name}, "
-                                 f"matching_rule={matching_rule}, value={value}")
+    def iter_overlays(self):
+        """Yields (property_name, position, overlay_type) of every overlay."""
+        for overlay in self._overlays or ():
+            property_name, position, overlay_type = overlay
 
-                # the client will still use the entity definitions display value
-                # if there is none, it would use the empty string, so we use the title as a backup
-                display_name = display_name or field_name
+            if not all((property_name, position, overlay_type)):
+                logger.warning("Overlay is missing a property name, position or type: "
+                               "property_name=%s, position=%s, overlay_type=%s", property_name, position, overlay_type)
 
-                matching_rule = "strict" if matching_rule == "strict" else "loose"
+            yield str(property_name), position, overlay_type
 
+    def build_xml(self, sanitize=True) -> Element:
+        # defaults are set to allow for backwards compatibility with old serializer
+        clean = sanitize_xml_text if sanitize else str
+
+        entity_xml = Element('Entity', attrib={'Type': clean(str(self.entityType))})
+
+        value_xml = SubElement(entity_xml, 'Value')
+        value_xml.text = clean(str(self.value))
+
+        weight_xml = SubElement(entity_xml, 'Weight')
+        weight_xml.text = clean(str(self.ensure_weight()))
+
+        if self._display_information:
+            display_infos_xml = SubElement(entity_xml, 'DisplayInformation')
+            for title, content in self.iter_display_information():
+                display_info_xml = SubElement(display_infos_xml, 'Label',
+                                              attrib={'Name': clean(str(title)), 'Type': "text/html"})
+                # for some reason, the client accepts escaped html and renders it correctly, so we don't need CDATA
+                display_info_xml.text = clean(str(content))
+
+        if self._additional_fields:
+            properties_xml = SubElement(entity_xml, 'AdditionalFields')
+            for field_name, display_name, matching_rule, value in self.iter_properties():
                 field_xml = SubElement(properties_xml, 'Field',
-                                       attrib={'Name': str(field_name),
-                                               'DisplayName': str(display_name),
+                                       attrib={'Name': clean(field_name),
+                                               'DisplayName': clean(display_name),
                                                'MatchingRule': matching_rule})
-                field_xml.text = str(value or "")
+                field_xml.text = clean(value)
 
-        if self.overlays:
+        if self._overlays:
             overlays_xml = SubElement(entity_xml, 'Overlays')
-            for overlay in self.overlays:
-                property_name, position, overlay_type = overlay
-
-                if not all((property_name, position, overlay_type)):
-                    logging.warning(f"Overlay is missing a property name, position or type: "
-                                    f"property_name={property_name}, position={position}, overlay_type={overlay_type}")
-
+            for property_name, position, overlay_type in self.iter_overlays():
                 SubElement(overlays_xml, 'Overlay',
-                           attrib={'propertyName': str(property_name),
-                                   'position': position,
-                                   'type': overlay_type})
+                           attrib={'propertyName': clean(property_name),
+                                   'position': clean(str(position)),
+                                   'type': clean(str(overlay_type))})
 
         if self.iconURL:
             icon_xml = SubElement(entity_xml, 'IconURL')
-            icon_xml.text = self.iconURL
+            icon_xml.text = clean(str(self.iconURL))
 
         return entity_xml
 
     def returnEntity(self):
         return serialize_xml(self.build_xml())
 
+    def merge_key(self):
+        """Entities with the same key are merged by the client: same type, value and strict properties."""
+        strict_properties = frozenset(
+            (str(field_name), str(value or ""))
+            for field_name, _, matching_rule, value in self._additional_fields or ()
+            if matching_rule == "strict"
+        )
+        return str(self.entityType), str(self.value), strict_properties
+
+    def merge(self, other):
+        """
+        Merges another entity with the same merge key into this one. Properties are merged by name and
+        overlays by position, non-empty values of the other entity win. Display information is combined
+        without duplicates.
+        """
+        if other.weight:
+            self.weight = other.weight
+        if other.iconURL:
+            self.iconURL = other.iconURL
+
+        if other._additional_fields:
+            additional_fields = self.additionalFields
+            field_index = {prop[0]: idx for idx, prop in enumerate(additional_fields)}
+            for prop in other._additional_fields:
+                idx = field_index.get(prop[0])
+                if idx is None:
+                    field_index[prop[0]] = len(additional_fields)
+                    additional_fields.append(prop)
+                elif prop[3] not in (None, ""):
+                    additional_fields[idx] = prop
+
+        if other._display_information:
+            display_information = self.displayInformation
+            # items appended to displayInformation directly may be lists
+            known = set(map(tuple, display_information))
+            for display_info in other._display_information:
+                if tuple(display_info) not in known:
+                    known.add(tuple(display_info))
+                    display_information.append(display_info)
+
+        if other._overlays:
+            overlays = self.overlays
+            overlay_index = {overlay[1]: idx for idx, overlay in enumerate(overlays)}
+            for overlay in other._overlays:
+                idx = overlay_index.get(overlay[1])
+                if idx is None:
+                    overlay_index[overlay[1]] = len(overlays)
+                    overlays.append(overlay)
+                else:
+                    overlays[idx] = overlay
+
+    def __reduce__(self):
+        # pickled as a plain tuple of the slot values, which keeps responses sent between processes small
+        return _restore_entity, (type(self), self.entityType, self.value, self.weight, self.iconURL,
+                                 self._additional_fields, self._display_information, self._overlays)
+
+    def copy(self):
+        entity = MaltegoEntity.__new__(type(self))
+        entity.entityType = self.entityType
+        entity.value = self.value
+        entity.weight = self.weight
+        entity.iconURL = self.iconURL
+        entity._additional_fields = list(self._additional_fields) if self._additional_fields else None
+        entity._display_information = list(self._display_information) if self._display_information else None
+        entity._overlays = list(self._overlays) if self._overlays else None
+        return entity
+
+
+def _restore_entity(entity_cls, entity_type, value, weight, icon_url, additional_fields, display_information,
+                    overlays):
+    entity = MaltegoEntity.__new__(entity_cls)
+    entity.entityType = entity_type
+    entity.value = value
+    entity.weight = weight
+    entity.iconURL = icon_url
+    entity._additional_fields = additional_fields
+    entity._display_information = display_information
+    entity._overlays = overlays
+    return entity
+
+
+def merge_duplicate_entities(entities):
+    """
+    Returns the entities with every group of duplicates (see MaltegoEntity.merge_key) merged into one entity
+    at the position of the first one. The given entities are left unchanged, merged entities are copies.
+    """
+    merged = []
+    index = {}
+    copied = set()
+    for entity in entities:
+        key = entity.merge_key()
+        position = index.get(key)
+        if position is None:
+            index[key] = len(merged)
+            merged.append(entity)
+            continue
+
+        if position not in copied:
+            copied.add(position)
+            merged[position] = merged[position].copy()
+        merged[position].merge(entity)
+
+    return merged
+
+
+class EntityBatch(object):
+    """
+    Entities of a single type stored as columns, created by MaltegoTransform.addEntities.
+    Rows are serialized straight from the columns without creating a MaltegoEntity per row.
+    """
+    __slots__ = ("entityType", "values", "weights", "properties", "iconURL")
+
+    def __init__(self, type, values, properties=None, weights=None, display_names=None, matching_rules=None,
+                 icon_url=""):
+        if not type:
+            logger.warning("Entity batch has no Type and will default to maltego.Phrase")
+            type = 'maltego.Phrase'
+
+        self.entityType = type
+        self.values = values if isinstance(values, (list, tuple)) else list(values)
+        self.weights = self._as_column(weights, "weights") if weights is not None else None
+        self.iconURL = icon_url or ""
+
+        display_names = display_names or {}
+        matching_rules = matching_rules or {}
+
+        self.properties = []
+        for field_name, column in (properties or {}).items():
+            if not field_name:
+                logger.error("No property name specified for entity batch of type %s", type)
+
+            self.properties.append((
+                str(field_name),
+                # the client will still use the entity definitions display value, see MaltegoEntity.iter_properties
+                str(display_names.get(field_name) or field_name),
+                "strict" if matching_rules.get(field_name) == "strict" else "loose",
+                self._as_column(column, field_name),
+            ))
+
+    def _as_column(self, column, name):
+        column = column if isinstance(column, (list, tuple)) else list(column)
+        if len(column) != len(self.values):
+            raise ValueError(f"Column '{name}' has {len(column)} rows, but there are {len(self.values)} values")
+        return column
+
+    def __len__(self):
+        return len(self.values)
+
+    def truncate(self, length):
+        """Drops all rows after the first length rows"""
+        self.values = self.values[:length]
+        if self.weights is not None:
+            self.weights = self.weights[:length]
+        self.properties = [
+            (field_name, display_name, matching_rule, column[:length])
+            for field_name, display_name, matching_rule, column in self.properties
+        ]
+
+    def iter_rows(self):
+        """Yields (value, weight, property_values) of every entity with defaults applied"""
+        weights = self.weights if self.weights is not None else repeat(100)
+        columns = [column for _, _, _, column in self.properties]
+
+        for value, weight, *property_values in zip(self.values, weights, *columns):
+            yield value or "", weight or 100, property_values
+
+    def build_xml(self, sanitize=True):
+        """Yields an <Entity> element for every row"""
+        clean = sanitize_xml_text if sanitize else str
+
+        for value, weight, property_values in self.iter_rows():
+            entity_xml = Element('Entity', attrib={'Type': clean(str(self.entityType))})
+            SubElement(entity_xml, 'Value').text = clean(str(value))
+            SubElement(entity_xml, 'Weight').text = clean(str(weight))
+
+            if self.properties:
+                properties_xml = SubElement(entity_xml, 'AdditionalFields')
+                for (field_name, display_name, matching_rule, _), property_value in zip(self.properties,
+                                                                                        property_values):
+                    field_xml = SubElement(properties_xml, 'Field',
+                                           attrib={'Name': clean(field_name),
+                                                   'DisplayName': clean(display_name),
+                                                   'MatchingRule': matching_rule})
+                    field_xml.text = clean(str(property_value or ""))
+
+            if self.iconURL:
+                SubElement(entity_xml, 'IconURL').text = clean(self.iconURL)
+
+            yield entity_xml
+
+
+class EntityLimitReached(Exception):
+    """Raised by addEntity when the response already holds as many entities as the limit allows"""
+
 
 class MaltegoTransform(object):
-    def __init__(self):
+    # serializer used by returnOutput, either SERIALIZER_ETREE or SERIALIZER_STRING
+    serializer = SERIALIZER_ETREE
+
+    # replace characters which aren't allowed in XML before serializing, see utils.sanitize_xml_text
+    sanitize = True
+
+    # merge entities the client would merge anyway before serializing, see merge_duplicate_entities
+    deduplicate = False
+
+    # with a limit, addEntity raises EntityLimitReached once the response is full instead of ignoring the entity
+    raise_on_limit = False
+
+    def __init__(self, serializer=None, deduplicate=None, limit=None, raise_on_limit=None, deadline=None):
         self.entities = []
+        self.entity_batches = []
         self.exceptions = []
         self.UIMessages = []
 
+        # maximum number of entities in the response, usually the request's Slider, None for no limit
+        self.limit = limit
+
+        # once the deadline expired, addEntity and addEntities raise DeadlineExceeded
+        self.deadline = deadline if deadline is not None else Deadline()
+
+        if serializer:
+            self.serializer = serializer
+        if deduplicate is not None:
+            self.deduplicate = deduplicate
+        if raise_on_limit is not None:
+            self.raise_on_limit = raise_on_limit
+
+    def count_entities(self):
+        return len(self.entities) + sum(len(batch) for batch in self.entity_batches)
+
+    @property
+    def remaining(self):
+        """Number of entities that can still be added, None without a limit"""
+        if self.limit is None:
+            return None
+        return max(self.limit - self.count_entities(), 0)
+
+    def is_full(self):
+        return self.limit is not None and self.count_entities() >= self.limit
+
     def addEntity(self, type=None, value=None):
+        self.deadline.check()
+
         entity = MaltegoEntity(type, value)
+        if self.is_full():
+            if self.raise_on_limit:
+                raise EntityLimitReached(f"The response is limited to {self.limit} entities")
+            # the entity can still be filled by the caller, but it's never serialized
+            return entity
+
         self.entities.append(entity)
         return entity
 
+    def addEntities(self, type, values, properties=None, weights=None, display_names=None, matching_rules=None,
+                    icon_url=""):
+        """
+        Adds one entity of the given type per value, much cheaper than calling addEntity for every row.
+
+        :param values: the entity values
+        :param properties: property name -> column of property values, one per entity
+        :param weights: column of entity weights, defaults to 100
+        :param display_names: property name -> display name, defaults to the property name
+        :param matching_rules: property name -> 'strict' or 'loose', defaults to 'loose'
+        :param icon_url: icon url for all entities
+
+        With a limit, only the rows which still fit into the response are kept.
+        """
+        self.deadline.check()
+
+        batch = EntityBatch(type, values, properties, weights, display_names, matching_rules, icon_url)
+        remaining = self.remaining
+        if remaining is not None and len(batch) > remaining:
+            batch.truncate(remaining)
+
+        self.entity_batches.append(batch)
+        return batch
+
+    def addEntityRecords(self, type, records, value_field="value", property_fields=None, weight_field=None,
+                         display_names=None, matching_rules=None, icon_url=""):
+        """
+        Adds one entity of the given type per record (a dict), see addEntities.
+        property_fields defaults to all fields of the first record except the value and weight fields.
+        """
+        records = records if isinstance(records, (list, tuple)) else list(records)
+
+        if property_fields is None:
+            first_record = records[0] if records else {}
+            property_fields = [name for name in first_record if name not in (value_field, weight_field)]
+
+        return self.addEntities(
+            type,
+            [record.get(value_field) for record in records],
+            {name: [record.get(name) for record in records] for name in property_fields},
+            [record.get(weight_field) for record in records] if weight_field else None,
+            display_names,
+            matching_rules,
+            icon_url,
+        )
+
+    def snapshot(self):
+        """A copy of the response with the entities and messages added so far"""
+        response = copy.copy(self)
+        response.entities = list(self.entities)
+        response.entity_batches = list(self.entity_batches)
+        response.exceptions = list(self.exceptions)
+        response.UIMessages = list(self.UIMessages)
+        return response
+
     def addUIMessage(self, message, messageType="Inform"):
         self.UIMessages.append([messageType, message])
 
@@ -254,32 +625,55 @@ class MaltegoTransform(object):
     def throwExceptions(self):
         return serialize_xml(self.build_exceptions_xml())
 
+    def iter_ui_messages(self):
+        """Yields (message_type, message_content) of every UI message with defaults applied."""
+        for ui_message in self.UIMessages:
+            message_type, message_content = ui_message
+            if not all((message_type, message_content)):
+                message_type = message_type or UIM_INFORM
+                logger.warning("UIMessage is missing a message type or content: message_type=%s, message_content=%s",
+                               message_type, message_content)
+
+            yield message_type, message_content
+
+    def iter_entities(self):
+        """The entities to serialize, with duplicates merged if deduplicate is set. Batches are never merged."""
+        if self.deduplicate:
+            return merge_duplicate_entities(self.entities)
+        return self.entities
+
     def build_xml(self) -> Element:
+        clean = sanitize_xml_text if self.sanitize else str
+
         message_xml = Element('MaltegoMessage')
         response_xml = SubElement(message_xml, 'MaltegoTransformResponseMessage')
 
         entities_xml = SubElement(response_xml, 'Entities')
-        for entity in self.entities:
-            entities_xml.append(entity.build_xml())
+        for entity in self.iter_entities():
+            entities_xml.append(entity.build_xml(self.sanitize))
+        for batch in self.entity_batches:
+            entities_xml.extend(batch.build_xml(self.sanitize))
 
         ui_messages_xml = SubElement(response_xml, 'UIMessages')
-        for ui_message in self.UIMessages:
-            message_type, message_content = ui_message
-            if not all((message_type, message_content)):
-                message_type = message_type or UIM_INFORM
-                logging.warning(f"UIMessage is missing a message type or content: "
-                                f"message_type={message_type}, message_content={message_content}")
-
-            ui_message_xml = SubElement(ui_messages_xml, 'UIMessage', attrib={'MessageType': message_type})
-            ui_message_xml.text = str(message_content)
+        for message_type, message_content in self.iter_ui_messages():
+            ui_message_xml = SubElement(ui_messages_xml, 'UIMessage',
+                                        attrib={'MessageType': clean(str(message_type))})
+            ui_message_xml.text = clean(str(message_content))
 
         return message_xml
 
-    def returnOutput(self):
-        return serialize_xml(self.build_xml())
+    def returnOutput(self, indent=True):
+        if self.serializer == SERIALIZER_STRING:
+            return serialize_response(self.iter_entities(), self.iter_ui_messages(), indent=indent,
+                                      batches=self.entity_batches, sanitize=self.sanitize)
+
+        return serialize_xml(self.build_xml(), indent=indent)
 
 
 class MaltegoMsg:
+    # parser used for incoming requests, either PARSER_MINIDOM or PARSER_ETREE
+    parser = PARSER_MINIDOM
+
     @staticmethod
     def _get_text(element):
         for child in element.childNodes:
@@ -287,58 +681,38 @@ class MaltegoMsg:
                 return child.data
 
     @staticmethod
-    def _get_int(element, tag_name, attr_name=None):
+    def _get_element_text(element):
+        # ElementTree counterpart of _get_text, the first text node can also follow a child element
+        if element.text is not None:
+            return element.text
+
+        for child in element:
+            if child.tail is not None:
+                return child.tail
+
+    @staticmethod
+    def _to_int(value, tag_name):
         try:
-            element = element.getElementsByTagName(tag_name)[0]
-            value = MaltegoMsg._get_text(element) if not attr_name else element.getAttribute(attr_name)
             return int(value)
         except ValueError:
             print("Error: Unable to convert XML value for '%s' to an integer." % tag_name)
             return 0
 
-    def __init__(self, MaltegoXML="", LocalArgs=[]):
+    @staticmethod
+    def _get_int(element, tag_name, attr_name=None):
+        element = element.getElementsByTagName(tag_name)[0]
+        value = MaltegoMsg._get_text(element) if not attr_name else element.getAttribute(attr_name)
+        return MaltegoMsg._to_int(value, tag_name)
+
+    def __init__(self, MaltegoXML="", LocalArgs=[], parser=None):
         self.TransformSettings = {}
         self.Properties = {}
 
         if MaltegoXML:
-            maltego_msg = minidom.parseString(MaltegoXML)
-            entities = maltego_msg.getElementsByTagName("Entity")
-            entity = entities[0]
-
-            self.Value = self._get_text(entity.getElementsByTagName("Value")[0])
-            self.Type = entity.attributes["Type"].value
-
-            self.Weight = self._get_int(entity, "Weight")
-            self.Slider = self._get_int(maltego_msg, "Limits", attr_name="SoftLimit")
-            self.Genealogy = []
-            genealogy_tag = maltego_msg.getElementsByTagName("Genealogy")
-            genealogy_types = genealogy_tag[0].getElementsByTagName("Type") if genealogy_tag else []
-            for genealogy_type_tag in genealogy_types:
-                entity_type_name = genealogy_type_tag.getAttribute("Name")
-                entity_type_old_name = genealogy_type_tag.getAttribute("OldName")
-                entity_type = {"Name": entity_type_name,
-                               "OldName": entity_type_old_name if entity_type_old_name else None}
-                self.Genealogy.append(entity_type)
-
-            # Additional Fields
-            additional_fields_tag = entity.getElementsByTagName("AdditionalFields")
-            additional_fields = additional_fields_tag[0].getElementsByTagName("Field") if additional_fields_tag else []
-            for field in additional_fields:
-                name = field.getAttribute("Name")
-                value = self._get_text(field)
-                self.Properties[name] = value
-                for entity_type in self.Genealogy:
-                    v3_property_name = translate_legacy_property_name(entity_type["Name"], name)
-                    if v3_property_name is not None:
-                        self.Properties[v3_property_name] = value
-
-            # Transform Settings
-            settings_tag = maltego_msg.getElementsByTagName("TransformFields")
-            settings = settings_tag[0].getElementsByTagName("Field") if settings_tag else []
-            for setting in settings:
-                name = setting.getAttribute("Name")
-                value = self._get_text(setting)
-                self.TransformSettings[name] = value
+            if (parser or self.parser) == PARSER_ETREE and not self._needs_minidom(MaltegoXML):
+                self._parse_etree(MaltegoXML)
+            else:
+                self._parse_minidom(MaltegoXML)
 
         elif LocalArgs:
             self.Value = LocalArgs[0]
@@ -359,6 +733,145 @@ class MaltegoMsg:
 
                 self.buildProperties(text.split("#"), hash_rnd, equals_rnd, bslash_rnd)
 
+    def _parse_minidom(self, MaltegoXML):
+        maltego_msg = minidom.parseString(MaltegoXML)
+        entities = maltego_msg.getElementsByTagName("Entity")
+        entity = entities[0]
+
+        self.Value = self._get_text(entity.getElementsByTagName("Value")[0])
+        self.Type = entity.attributes["Type"].value
+
+        self.Weight = self._get_int(entity, "Weight")
+        self.Slider = self._get_int(maltego_msg, "Limits", attr_name="SoftLimit")
+        self.Genealogy = []
+        genealogy_tag = maltego_msg.getElementsByTagName("Genealogy")
+        genealogy_types = genealogy_tag[0].getElementsByTagName("Type") if genealogy_tag else []
+        for genealogy_type_tag in genealogy_types:
+            entity_type_name = genealogy_type_tag.getAttribute("Name")
+            entity_type_old_name = genealogy_type_tag.getAttribute("OldName")
+            entity_type = {"Name": entity_type_name,
+                           "OldName": entity_type_old_name if entity_type_old_name else None}
+            self.Genealogy.append(entity_type)
+
+        # Additional Fields
+        additional_fields_tag = entity.getElementsByTagName("AdditionalFields")
+        additional_fields = additional_fields_tag[0].getElementsByTagName("Field") if additional_fields_tag else []
+        self._add_properties((field.getAttribute("Name"), self._get_text(field)) for field in additional_fields)
+
+        # Transform Settings
+        settings_tag = maltego_msg.getElementsByTagName("TransformFields")
+        settings = settings_tag[0].getElementsByTagName("Field") if settings_tag else []
+        for setting in settings:
+            name = setting.getAttribute("Name")
+            value = self._get_text(setting)
+            self.TransformSettings[name] = value
+
+    @staticmethod
+    def _needs_minidom(MaltegoXML):
+        """Whether the request contains markup which only the minidom parser reads exactly like before"""
+        is_bytes = isinstance(MaltegoXML, bytes)
+        for markup in MINIDOM_ONLY_MARKUP:
+            if (markup.encode() if is_bytes else markup) in MaltegoXML:
+                return True
+        # processing instructions other than a leading XML declaration
+        return MaltegoXML.find(b"<?" if is_bytes else "<?", 1) != -1
+
+    @staticmethod
+    def _iter_parse_events(MaltegoXML):
+        pull_parser = XMLPullParser(events=("start", "end"))
+        for offset in range(0, len(MaltegoXML), PARSER_FEED_SIZE):
+            pull_parser.feed(MaltegoXML[offset:offset + PARSER_FEED_SIZE])
+            yield from pull_parser.read_events()
+
+        pull_parser.close()
+        yield from pull_parser.read_events()
+
+    def _parse_etree(self, MaltegoXML):
+        """
+        Single pass over the request with a pull parser, filling the same attributes as the minidom parser.
+        Like getElementsByTagName(...)[0], the first element of each kind is used.
+        Fields and entities are cleared as soon as they have been read, so the request is never held as a whole tree.
+        """
+        entity = entity_type = value = weight = limits = None
+        genealogy = additional_fields = settings = None
+        in_entity = in_genealogy = in_additional_fields = in_settings = False
+        fields = []
+
+        self.Genealogy = []
+
+        for event, element in self._iter_parse_events(MaltegoXML):
+            tag = element.tag
+
+            if event == "start":
+                if tag == "Entity":
+                    if entity is None:
+                        entity, entity_type, in_entity = element, element.get("Type"), True
+                elif tag == "Value":
+                    if in_entity and value is None:
+                        value = element
+                elif tag == "Weight":
+                    if in_entity and weight is None:
+                        weight = element
+                elif tag == "Type":
+                    if in_genealogy:
+                        entity_type_old_name = element.get("OldName")
+                        self.Genealogy.append({"Name": element.get("Name", ""),
+                                               "OldName": entity_type_old_name if entity_type_old_name else None})
+                elif tag == "Limits":
+                    if limits is None:
+                        limits = element
+                elif tag == "Genealogy":
+                    if genealogy is None:
+                        genealogy, in_genealogy = element, True
+                elif tag == "AdditionalFields":
+                    if in_entity and additional_fields is None:
+                        additional_fields, in_additional_fields = element, True
+                elif tag == "TransformFields":
+                    if settings is None:
+                        settings, in_settings = element, True
+
+            elif tag == "Field":
+                if in_additional_fields:
+                    fields.append((element.get("Name", ""), self._get_element_text(element)))
+                if in_settings:
+                    self.TransformSettings[element.get("Name", "")] = self._get_element_text(element)
+                element.clear()
+            elif element is entity:
+                in_entity = False
+                element.clear()
+            elif element is genealogy:
+                in_genealogy = False
+            elif element is additional_fields:
+                in_additional_fields = False
+            elif element is settings:
+                in_settings = False
+            elif tag == "Entity":
+                element.clear()
+
+        # raise for missing elements in the same order as the minidom parser does
+        if entity is None or value is None:
+            raise IndexError("list index out of range")
+        self.Value = self._get_element_text(value)
+
+        if entity_type is None:
+            raise KeyError("Type")
+        self.Type = entity_type
+
+        if weight is None or limits is None:
+            raise IndexError("list index out of range")
+        self.Weight = self._to_int(self._get_element_text(weight), "Weight")
+        self.Slider = self._to_int(limits.get("SoftLimit", ""), "Limits")
+
+        self._add_properties(fields)
+
+    def _add_properties(self, fields):
+        for name, value in fields:
+            self.Properties[name] = value
+            for entity_type in self.Genealogy:
+                v3_property_name = translate_legacy_property_name(entity_type["Name"], name)
+                if v3_property_name is not None:
+                    self.Properties[v3_property_name] = value
+
     def clearLegacyProperties(self):
         to_clear = set()
         for entity_type in self.Genealogy or []:
@@ -0,0 +1,138 @@
+"""
+Manifest of the transform classes in a package, for registering transforms without importing them.
+
+Like registry.register_transform_classes, every module of the package which defines a class of the same name is a
+transform. The modules are read with ast instead of being imported, and the manifest caches the class name of every
+module with its modification time and size. Only modules which changed since are read again. A LazyTransform imports
+its module on first use, usually the first request of the transform.
+"""
+import ast
+import functools
+import importlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from .transform import DiscoverableTransform
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE = ".transforms-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def find_transform_class(path: str, name: str) -> Optional[str]:
+    """Returns name if the module at path defines a class of that name with a base class, without importing it"""
+    try:
+        with open(path, "rb") as module_file:
+            tree = ast.parse(module_file.read(), filename=path)
+    except SyntaxError as e:
+        log.warning("Ignoring File: %s can't be parsed: %s", path, e)
+        return None
+
+    for node in tree.body:
+        # the base classes can't be resolved without importing, LazyTransform checks for DiscoverableTransform
+        if isinstance(node, ast.ClassDef) and node.name == name and node.bases:
+            return name
+    return None
+
+
+def get_manifest_path(package) -> str:
+    return os.path.join(package.__path__[0], MANIFEST_FILE)
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("modules", {})
+
+
+def write_manifest(path: str, modules: dict):
+    try:
+        with open(path + ".tmp", "w") as manifest_file:
+            json.dump({"version": MANIFEST_VERSION, "modules": modules}, manifest_file, indent=2, sort_keys=True)
+        # replaced at once, so workers starting at the same time never read half a manifest
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        log.warning("Unable to write the transform manifest %s: %s", path, e)
+
+
+def load_manifest(package, path: Optional[str] = None, rebuild: bool = False) -> Dict[str, str]:
+    """
+    Returns module name -> transform class name for the modules of the package.
+    The cached manifest at path is updated for changed modules, or rebuilt completely with rebuild=True.
+    """
+    path = path or get_manifest_path(package)
+    cached = {} if rebuild else read_manifest(path)
+
+    modules = {}
+    for entry in os.scandir(package.__path__[0]):
+        name, extension = os.path.splitext(entry.name)
+        if extension != ".py" or name == "__init__" or not entry.is_file():
+            continue
+
+        stat = entry.stat()
+        cached_module = cached.get(name)
+        if cached_module and cached_module["mtime_ns"] == stat.st_mtime_ns and cached_module["size"] == stat.st_size:
+            modules[name] = cached_module
+        else:
+            modules[name] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                             "class": find_transform_class(entry.path, name)}
+
+    if modules != cached:
+        write_manifest(path, modules)
+
+    return {name: module["class"] for name, module in modules.items() if module["class"]}
+
+
+class LazyTransform(object):
+    """Stands in for a transform class in registry.mapping and imports its module on first use"""
+
+    def __init__(self, module_name: str, class_name: str):
+        self.__name__ = class_name
+        self.module_name = module_name
+        self._transform = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<LazyTransform {self.module_name}.{self.__name__}>"
+
+    def load(self):
+        """Imports the transform class once, a failed import is tried again on the next call like any other import"""
+        if self._transform is None:
+            with self._lock:
+                if self._transform is None:
+                    self._transform = self._import()
+        return self._transform
+
+    def _import(self):
+        transform = getattr(importlib.import_module(self.module_name), self.__name__)
+        if not (isinstance(transform, type) and issubclass(transform, DiscoverableTransform)):
+            raise TypeError(f"{self.module_name}.{self.__name__} is not a DiscoverableTransform")
+        return transform
+
+    def __getattr__(self, name):
+        # only called for attributes the proxy doesn't have itself
+        if name in ("_transform", "_lock"):
+            raise AttributeError(name)
+        try:
+            transform = self.load()
+        except Exception as e:
+            # settings like stream and coalesce fall back to their defaults, and running the transform raises the
+            # import error inside the error handling of the runner, which logs it and returns the exception message
+            if name == "run_transform":
+                return functools.partial(_raise_import_error, e)
+            raise AttributeError(name) from e
+        return getattr(transform, name)
+
+
+def _raise_import_error(e, client_msg):
+    raise e
@@ -0,0 +1,245 @@
+"""
+Per-transform metrics in the Prometheus text format, served by the transform server on /metrics once enabled with
+MALTEGO_TRX_METRICS=1 or app.config["TRX_METRICS"] = metrics.
+
+For every transform, the number of requests and errors, a latency histogram, and the entities and bytes of the
+responses are counted in memory. Servers with several worker processes, e.g. gunicorn, set a directory shared by all
+workers with MALTEGO_TRX_METRICS_DIR or set_multiprocess_dir. Every worker then writes its counts to a file of its own
+at most once per flush_interval, and at the latest flush_interval seconds after its last request, even if it's idle
+afterwards. /metrics adds up the files of all workers, including workers that have exited.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# the metrics are disabled unless enabled with this variable, or a multiprocess directory is set
+METRICS_ENV = "MALTEGO_TRX_METRICS"
+MULTIPROCESS_DIR_ENV = "MALTEGO_TRX_METRICS_DIR"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+ERROR_MESSAGE_TYPES = ('MessageType="PartialError"', 'MessageType="FatalError"')
+_ERROR_MESSAGE_TYPES_BYTES = tuple(message_type.encode() for message_type in ERROR_MESSAGE_TYPES)
+
+# positions of the counters in the list of a transform, followed by the histogram buckets and +Inf
+REQUESTS, ERRORS, ENTITIES, RESPONSE_BYTES, DURATION_SUM = range(5)
+BUCKETS_START = 5
+
+COUNTERS = (
+    (REQUESTS, "maltego_trx_requests_total", "Transform requests."),
+    (ERRORS, "maltego_trx_errors_total", "Transform requests which failed or returned an error message."),
+    (ENTITIES, "maltego_trx_entities_total", "Entities returned by the transform."),
+    (RESPONSE_BYTES, "maltego_trx_response_bytes_total", "Bytes of the transform responses."),
+)
+HISTOGRAM = ("maltego_trx_request_duration_seconds", "Duration of the transform requests.")
+
+
+def metrics_enabled() -> bool:
+    """Whether the servers serve the metrics by default, see METRICS_ENV"""
+    enabled = os.environ.get(METRICS_ENV, "").lower() in ("1", "true", "yes", "on")
+    return enabled or bool(os.environ.get(MULTIPROCESS_DIR_ENV))
+
+
+def has_error_message(output) -> bool:
+    """Whether the response has an error message, only the UI messages at the end of the response are searched"""
+    if isinstance(output, bytes):
+        start = output.rfind(b"<UIMessages")
+        return start != -1 and any(message_type in output[start:] for message_type in _ERROR_MESSAGE_TYPES_BYTES)
+
+    start = output.rfind("<UIMessages")
+    return start != -1 and any(message_type in output[start:] for message_type in ERROR_MESSAGE_TYPES)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS, multiprocess_dir: Optional[str] = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.buckets = tuple(buckets)
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+
+        self._transforms: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._flush_lock = threading.Lock()
+        # the file of this process, see _path
+        self._file_pid: Optional[int] = None
+        self._file_name = ""
+
+    def _new_counts(self) -> list:
+        return [0, 0, 0, 0, 0.0] + [0] * (len(self.buckets) + 1)
+
+    def observe(self, transform_name: str, duration: float, response_bytes: int = 0, entities: int = 0,
+                error: bool = False):
+        bucket = BUCKETS_START + bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            counts = self._transforms.get(transform_name)
+            if counts is None:
+                counts = self._transforms[transform_name] = self._new_counts()
+
+            counts[REQUESTS] += 1
+            counts[ERRORS] += error
+            counts[ENTITIES] += entities
+            counts[RESPONSE_BYTES] += response_bytes
+            counts[DURATION_SUM] += duration
+            counts[bucket] += 1
+
+        if self.multiprocess_dir:
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Flushes after flush_interval, so the counts of a worker which goes idle are written as well"""
+        with self._lock:
+            timer = self._flush_timer
+            if timer is not None and timer.is_alive():
+                return
+            # a timer copied from the parent of a forked worker isn't running in the worker
+            timer = self._flush_timer = threading.Timer(self.flush_interval, self._timed_flush)
+        timer.daemon = True
+        timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._flush_timer = None
+        self.flush()
+
+    def observe_response(self, transform_name: str, duration: float, output, status: int = 200, entities: int = 0):
+        """
+        Observes a transform response. The entities are counted by the transform, see
+        instrumentation.count_entities, so the response isn't scanned for them.
+        """
+        error = status != 200 or has_error_message(output)
+        # the length of the text, which is the number of bytes for ASCII responses
+        self.observe(transform_name, duration, len(output), entities, error)
+
+    def observe_stream(self, transform_name: str, chunks, start: Optional[float] = None):
+        """Yields the chunks of a streamed response and observes it once it has been sent"""
+        start = time.perf_counter() if start is None else start
+        response_bytes = entities = 0
+        error = False
+        try:
+            for chunk in chunks:
+                response_bytes += len(chunk.encode("utf8"))
+                entities += chunk.count("<Entity ")
+                error = error or any(message_type in chunk for message_type in ERROR_MESSAGE_TYPES)
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            self.observe(transform_name, time.perf_counter() - start, response_bytes, entities, error)
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {name: list(counts) for name, counts in self._transforms.items()}
+
+    def _path(self) -> str:
+        # a new worker may get the pid of a worker which has exited, the random part keeps it from overwriting its file
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file_pid = pid
+            self._file_name = f"metrics_{pid}_{uuid.uuid4().hex[:12]}.json"
+        return os.path.join(self.multiprocess_dir, self._file_name)
+
+    def flush(self):
+        """Writes the counts of this process to the multiprocess directory"""
+        if not self.multiprocess_dir:
+            return
+
+        # the timer, request threads and collect may flush at the same time, a later flush must never write older counts
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            path = self._path()
+            temp_path = None
+            try:
+                # a temporary file of its own, which collect doesn't read since it doesn't match metrics_*.json
+                with tempfile.NamedTemporaryFile("w", dir=self.multiprocess_dir, prefix=".metrics_", suffix=".tmp",
+                                                 delete=False) as metrics_file:
+                    temp_path = metrics_file.name
+                    json.dump({"buckets": self.buckets, "transforms": self.snapshot()}, metrics_file)
+                os.replace(temp_path, path)
+            except OSError as e:
+                log.warning("Unable to write metrics to %s: %s", path, e)
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def collect(self) -> Dict[str, list]:
+        """Counts of all transforms, added up over all worker processes in multiprocess mode"""
+        if not self.multiprocess_dir:
+            return self.snapshot()
+
+        self.flush()
+        collected = {}
+        for path in glob.glob(os.path.join(self.multiprocess_dir, "metrics_*.json")):
+            try:
+                with open(path) as metrics_file:
+                    worker_metrics = json.load(metrics_file)
+            except (OSError, ValueError) as e:
+                log.warning("Unable to read metrics from %s: %s", path, e)
+                continue
+
+            if tuple(worker_metrics["buckets"]) != self.buckets:
+                continue
+
+            for name, counts in worker_metrics["transforms"].items():
+                total = collected.setdefault(name, self._new_counts())
+                for idx, count in enumerate(counts):
+                    total[idx] += count
+
+        return collected
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        collected = sorted(self.collect().items())
+        labels = {name: f'transform="{_escape_label(name)}"' for name, _ in collected}
+        lines: List[str] = []
+
+        for position, metric_name, description in COUNTERS:
+            lines += (f"# HELP {metric_name} {description}", f"# TYPE {metric_name} counter")
+            lines += (f"{metric_name}{{{labels[name]}}} {_format_number(counts[position])}"
+                      for name, counts in collected)
+
+        metric_name, description = HISTOGRAM
+        lines += (f"# HELP {metric_name} {description}", f"# TYPE {metric_name} histogram")
+        for name, counts in collected:
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + ("+Inf",), counts[BUCKETS_START:]):
+                cumulative += count
+                bound = upper_bound if upper_bound == "+Inf" else _format_number(float(upper_bound))
+                lines.append(f'{metric_name}_bucket{{{labels[name]},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric_name}_sum{{{labels[name]}}} {_format_number(counts[DURATION_SUM])}")
+            lines.append(f"{metric_name}_count{{{labels[name]}}} {counts[REQUESTS]}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(multiprocess_dir=os.environ.get(MULTIPROCESS_DIR_ENV) or None)
+atexit.register(metrics.flush)
+
+
+def set_multiprocess_dir(path: str):
+    """Shares the metrics of all worker processes through files in path, call before the workers are started"""
+    os.makedirs(path, exist_ok=True)
+    metrics.multiprocess_dir = path
@@ -1,11 +1,10 @@
-"""Maltego OAuth Crypto Helper"""
-import base64
+"""
+Maltego OAuth Crypto Helper
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization, padding as primitives_padding
-from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from requests.auth import AuthBase
+cryptography and requests are only imported once they are used, so importing this module doesn't slow down the start
+of projects which don't decrypt any secrets.
+"""
+import base64
 
 
 class MaltegoOauth:
@@ -26,6 +25,9 @@ class MaltegoOauth:
         """
         RSA Decryption function, returns decrypted plaintext in b64 encoding
         """
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
+
         ciphertext = base64.b64decode(ciphertext)
 
         with open(private_key_path, "rb") as key_file:
@@ -41,6 +43,10 @@ class MaltegoOauth:
         """
         AES Decryption function, returns decrypted plaintext value
         """
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import padding as primitives_padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
         key = base64.b64decode(key)
         cipher = Cipher(algorithms.AES(key), modes.ECB(), backend=default_backend())
         decryptor = cipher.decryptor()
@@ -124,38 +130,51 @@ class MaltegoOauth:
         return token_fields
 
 
-class OAuth2BearerToken(AuthBase):
-    """Implements OAuth2 Bearer access token authentication.
+def _create_bearer_token_class():
+    from requests.auth import AuthBase
 
-    Pass this object via the `auth` parameter to a request or a
-    session object in order to authenticate your requests.
+    class OAuth2BearerToken(AuthBase):
+        """Implements OAuth2 Bearer access token authentication.
 
-    Example usage, once you have the `access_token`:
+        Pass this object via the `auth` parameter to a request or a
+        session object in order to authenticate your requests.
 
-    class GreetPerson(DiscoverableTransform):
+        Example usage, once you have the `access_token`:
 
-        @classmethod
-        def create_entities(cls, request, response):
-            person_name = request.Value
+        class GreetPerson(DiscoverableTransform):
 
-            private_key_path = "private_key.pem"
+            @classmethod
+            def create_entities(cls, request, response):
+                person_name = request.Value
 
-            encrypted_secrets = request.getTransformSetting('maltego.web.api.key.linkedin')
+                private_key_path = "private_key.pem"
 
-            token_fields = MaltegoCrypto.decrypt_secrets(private_key_path,encrypted_secrets)
+                encrypted_secrets = request.getTransformSetting('maltego.web.api.key.linkedin')
 
-            api_url = ("https://api.linkedin.com/v2/emailAddress?q=members&projection=(elements*(handle~))")
-            auth = OAuth2BearerToken(token_fields['token'])
-            result = requests.get(api_url,auth=auth)
+                token_fields = MaltegoCrypto.decrypt_secrets(private_key_path,encrypted_secrets)
 
-            response.addEntity(Phrase, result.text)
-    """
+                api_url = ("https://api.linkedin.com/v2/emailAddress?q=members&projection=(elements*(handle~))")
+                auth = OAuth2BearerToken(token_fields['token'])
+                result = requests.get(api_url,auth=auth)
+
+                response.addEntity(Phrase, result.text)
+        """
+
+        def __init__(self, access_token):
+            self.access_token = access_token
+
+        def __call__(self, request):
+            request.headers['Authorization'] = 'Bearer {}'.format(
+                self.access_token
+            )
+            return request
+
+    OAuth2BearerToken.__qualname__ = "OAuth2BearerToken"
+    return OAuth2BearerToken
 
-    def __init__(self, access_token):
-        self.access_token = access_token
 
-    def __call__(self, request):
-        request.headers['Authorization'] = 'Bearer {}'.format(
-            self.access_token
-        )
-        return request
+def __getattr__(name):
+    # OAuth2BearerToken subclasses requests.auth.AuthBase, so it's created on first use
+    if name == "OAuth2BearerToken":
+        return globals().setdefault(name, _create_bearer_token_class())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
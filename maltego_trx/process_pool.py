@@ -0,0 +1,73 @@
+"""
+Process pool for CPU-bound transforms.
+
+Transforms with use_process_pool run create_entities in a pool of worker processes that is started once and reused
+for every call, so they don't hold the GIL of the server process. The request and the filled response are pickled
+between the processes, the response is serialized in the server process.
+The transform class has to be importable by the worker processes, i.e. defined at the top level of a module.
+
+The workers are started with forkserver, or spawn where forkserver isn't available, never by forking the server
+process: the pool is usually started from a request thread, and a fork while other threads hold locks, e.g. of
+logging, can deadlock the workers. Like with spawn, the workers import the main module, e.g. project.py, without
+running its `if __name__ == '__main__'` block.
+"""
+import logging
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    # imported on start, multiprocessing is only needed once a transform uses the pool
+    from concurrent.futures import ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+_pool: Optional["ProcessPoolExecutor"] = None
+_pool_lock = threading.Lock()
+
+
+def _warm_up():
+    return None
+
+
+def get_default_start_method() -> str:
+    import multiprocessing
+
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def start(max_workers: Optional[int] = None, start_method: Optional[str] = None) -> "ProcessPoolExecutor":
+    """
+    Starts the pool with max_workers processes (the number of CPUs by default) if it isn't running yet.
+    All workers are started right away, so the first transform calls don't pay for starting them.
+    start_method defaults to get_default_start_method, pass "fork" only if the pool is started before any threads.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            mp_context = multiprocessing.get_context(start_method or get_default_start_method())
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+            for future in [_pool.submit(_warm_up) for _ in range(_pool._max_workers)]:
+                future.result()
+            log.debug("Started process pool with %d workers", _pool._max_workers)
+
+        return _pool
+
+
+def get_pool() -> "ProcessPoolExecutor":
+    return _pool if _pool is not None else start()
+
+
+def run(fn, *args):
+    """Calls fn(*args) in a worker process and returns its result, fn and args have to be picklable"""
+    return get_pool().submit(fn, *args).result()
+
+
+def shutdown(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None
@@ -0,0 +1,144 @@
+"""
+On-demand profiling of transform requests in production.
+
+With app.config["TRX_PROFILER"] = Profiler(directory), requests with the X-Maltego-Profile header, and a sample_rate
+share of all requests, run the transform under cProfile. Every profile is written to the directory, named after the
+time, the transform and the input entity type, and only the newest max_profiles profiles are kept.
+`python project.py profiles` summarizes the collected profiles, see summarize_profiles.
+"""
+import contextvars
+import cProfile
+import glob
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Maltego-Profile"
+PROFILE_SUFFIX = ".prof"
+DEFAULT_MAX_PROFILES = 100
+
+# the profiler of the current request, if the request is profiled
+_current: contextvars.ContextVar[Optional["Profiler"]] = contextvars.ContextVar("profiler", default=None)
+
+# since Python 3.12, only one cProfile.Profile can be active per process
+_profile_lock = threading.Lock()
+
+
+def _clean(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.-]", "-", name or "unknown")
+
+
+class Profiler(object):
+    def __init__(self, directory: str, max_profiles: int = DEFAULT_MAX_PROFILES, sample_rate: float = 0.0,
+                 header: Optional[str] = PROFILE_HEADER):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        # share of all requests which are profiled, from 0 to 1
+        self.sample_rate = sample_rate
+        # requests with this header are profiled, None to only profile sampled requests
+        self.header = header
+
+        os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, headers) -> bool:
+        if self.header and headers.get(self.header):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile_request(self):
+        """Context manager within which the transform runs of the current request are profiled"""
+        return _ProfiledRequest(self)
+
+    def run(self, transform_name: str, input_type: str, fn, *args):
+        """
+        Runs fn(*args) under cProfile and writes the profile.
+        While another request is profiled, fn runs without profiling instead of waiting for it.
+        """
+        if not _profile_lock.acquire(blocking=False):
+            log.debug("Not profiling %s, another request is profiled", transform_name)
+            return fn(*args)
+
+        try:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(fn, *args)
+            finally:
+                self.save(profile, transform_name, input_type)
+        finally:
+            _profile_lock.release()
+
+    def save(self, profile: cProfile.Profile, transform_name: str, input_type: str):
+        file_name = f"{time.time_ns()}_{_clean(transform_name)}_{_clean(input_type)}{PROFILE_SUFFIX}"
+        try:
+            profile.dump_stats(os.path.join(self.directory, file_name))
+            self.rotate()
+        except OSError as e:
+            log.warning("Unable to write the profile of %s: %s", transform_name, e)
+
+    def rotate(self):
+        """Removes the oldest profiles beyond max_profiles"""
+        for path in list_profiles(self.directory)[:-self.max_profiles or None]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by another worker
+
+
+class _ProfiledRequest(object):
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+
+    def __enter__(self):
+        self._token = _current.set(self.profiler)
+        return self.profiler
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current.reset(self._token)
+
+
+def current_profiler() -> Optional[Profiler]:
+    """The profiler if the current request is profiled, else None"""
+    return _current.get()
+
+
+def list_profiles(directory: str):
+    """Paths of all profiles in the directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, "*" + PROFILE_SUFFIX)), key=os.path.basename)
+
+
+def parse_profile_name(path: str):
+    """Returns the time, transform name and input type of a profile"""
+    created_ns, transform_name, input_type = os.path.basename(path)[:-len(PROFILE_SUFFIX)].split("_", 2)
+    return int(created_ns) / 1e9, transform_name, input_type
+
+
+def summarize_profiles(directory: str, limit: int = 20) -> str:
+    """Profiles per transform and input type, followed by the functions with the most cumulative time"""
+    paths = list_profiles(directory)
+    if not paths:
+        return f"No profiles found in {directory}."
+
+    totals = {}
+    for path in paths:
+        _, transform_name, input_type = parse_profile_name(path)
+        count, total_time = totals.get((transform_name, input_type), (0, 0.0))
+        totals[(transform_name, input_type)] = (count + 1, total_time + pstats.Stats(path).total_tt)
+
+    output = io.StringIO()
+    output.write(f"= {len(paths)} profiles in {directory} =\n")
+    output.write(f"{'Transform':<30} {'Input Type':<30} {'Profiles':>8} {'Avg (ms)':>10}\n")
+    for (transform_name, input_type), (count, total_time) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        output.write(f"{transform_name:<30} {input_type:<30} {count:>8} {total_time / count * 1000:>10.1f}\n")
+    output.write("\n")
+
+    stats = pstats.Stats(*paths, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return output.getvalue()
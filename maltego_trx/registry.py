@@ -1,6 +1,7 @@
 import logging
 import pkgutil
 
+from .manifest import LazyTransform, load_manifest
 from .transform import DiscoverableTransform
 from .utils import name_to_path
 
@@ -11,6 +12,9 @@ transform_functions = []
 transform_classes = []
 mapping = {}
 
+# packages registered with register_lazy_transform_classes and their manifest paths, see rebuild_manifests
+lazy_packages = []
+
 
 def update_mapping():
     # Get mapping from URL path to transform
@@ -23,11 +27,13 @@ def update_mapping():
 def register_transform_function(transform_function):
     # Register a transform function with the server.
     global transform_functions
-    if transform_function not in transform_functions:
+    url_path = name_to_path(transform_function.__name__)
+    # checked in the mapping instead of the list, so registering many functions doesn't take quadratic time
+    if mapping.get(url_path) is not transform_function:
         transform_functions.append(transform_function)
+        mapping[url_path] = transform_function
     else:
         log.warning("Transform function already registered.")
-    update_mapping()
 
 
 def register_transform_classes(module):
@@ -35,6 +41,7 @@ def register_transform_classes(module):
     global transform_classes
 
     prefix = module.__name__ + "."  # transform.
+    registered = []
     for importer, modname, ispkg in pkgutil.iter_modules(module.__path__, prefix):
         if not ispkg:
             module = __import__(modname, fromlist="dummy")
@@ -43,10 +50,36 @@ def register_transform_classes(module):
             if hasattr(module, name):  # Does the .py file have a class of the same name.
                 transform_cls = getattr(module, name)
                 if issubclass(transform_cls, DiscoverableTransform):  # Does the class subclass MaltegoTransform
-                    transform_classes.append(transform_cls)
+                    registered.append(transform_cls)
             else:
                 log.info('Ignoring File: "%s" does not contain a class of the same name' % name)
-    update_mapping()
+    add_transform_classes(registered)
+
+
+def register_lazy_transform_classes(module, manifest_path=None):
+    # Register the transform classes of a python package without importing its modules, see maltego_trx.manifest.
+    # Every module is imported on the first request of its transform.
+    lazy_packages.append((module, manifest_path))
+
+    prefix = module.__name__ + "."
+    add_transform_classes([
+        LazyTransform(prefix + modname, class_name)
+        for modname, class_name in sorted(load_manifest(module, manifest_path).items())
+    ])
+
+
+def add_transform_classes(classes):
+    global transform_classes
+    transform_classes.extend(classes)
+    for transform_cls in classes:
+        mapping[name_to_path(transform_cls.__name__)] = transform_cls
+
+
+def rebuild_manifests():
+    # Read all modules of the lazily registered packages again and write their manifests
+    for module, manifest_path in lazy_packages:
+        transforms = load_manifest(module, manifest_path, rebuild=True)
+        print("%s: %d transforms in the manifest" % (module.__name__, len(transforms)))
 
 
 def print_registered():
@@ -0,0 +1,93 @@
+"""
+Running transforms of the registry, without a web server.
+
+The transform server (server.py), the ASGI app, the local transform daemon and `project.py local` all run transforms
+through run_transform. This module doesn't import Flask, so local transforms and the CLI commands don't pay for it.
+"""
+import logging
+
+from .cache import make_cache_key
+from .coalesce import SingleFlight
+from .executor import TransformSaturated, get_executor
+from .instrumentation import EXECUTE, span
+from .maltego import MaltegoTransform
+from .profiling import current_profiler
+from .registry import mapping
+
+# the logger of server.py, where the transforms used to run
+log = logging.getLogger("maltego.server")
+
+URL_TEMPLATE = '/run/<transform_name>/'
+
+EXCEPTION_MESSAGE = "An exception occurred with the transform. Check the logs for more details."
+SATURATED_MESSAGE = "The transform is busy with too many other requests. Please try again later."
+
+
+def get_exception_message(msg=EXCEPTION_MESSAGE):
+    transform_run = MaltegoTransform()
+    transform_run.addUIMessage(msg, "PartialError")
+
+    return transform_run.returnOutput()
+
+
+def print_transforms():
+    print("= Transform Server URLs =")
+    for path in mapping:
+        print(URL_TEMPLATE.replace("<transform_name>", path) + ": " + mapping[path].__name__)
+    print("\n")
+
+    print("= Local Transform Names =")
+    for path in mapping:
+        print(path + ": " + mapping[path].__name__)
+    print("\n")
+
+
+# identical calls of transforms with coalesce = True which are running right now, see maltego_trx.coalesce
+in_flight = SingleFlight()
+
+
+def run_transform(transform_name, client_msg):
+    transform = mapping[transform_name]
+    if getattr(transform, "coalesce", False):
+        key = make_cache_key(transform_name, transform, client_msg)
+        return in_flight.do(key, getattr(transform, "coalesce_window", 0), run_limited_transform,
+                            transform_name, client_msg)
+
+    return run_limited_transform(transform_name, client_msg)
+
+
+def run_limited_transform(transform_name, client_msg):
+    transform_executor = get_executor(transform_name, mapping[transform_name])
+    if transform_executor is None:
+        return execute_transform(transform_name, client_msg)
+
+    try:
+        return transform_executor.submit(execute_transform, transform_name, client_msg).result()
+    except TransformSaturated as e:
+        return get_saturated_message(e)
+
+
+def get_saturated_message(e):
+    log.warning(e)
+    return get_exception_message(SATURATED_MESSAGE), 200
+
+
+def execute_transform(transform_name, client_msg):
+    try:
+        profiler = current_profiler()
+        if profiler is not None:
+            return profiler.run(transform_name, client_msg.Type, call_transform, transform_name, client_msg), 200
+        return call_transform(transform_name, client_msg), 200
+    except Exception as e:
+        log.error("An exception occurred while executing your transform code.")
+        log.error(e, exc_info=True)
+        return get_exception_message(), 200
+
+
+def call_transform(transform_name, client_msg):
+    transform_method = mapping[transform_name]
+    if hasattr(transform_method, "run_transform"):
+        return transform_method.run_transform(client_msg)  # Transform class
+    else:
+        with span(EXECUTE, transform_name):
+            return transform_method(client_msg)  # Transform method
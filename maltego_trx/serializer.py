@@ -0,0 +1,187 @@
+"""
+String builder serializer for transform responses.
+
+Writes the same canonical XML (C14N 2.0, alphabetical attributes, no self-closing tags) that
+`utils.serialize_xml(MaltegoTransform.build_xml())` produces, but straight from the entity data
+without building, indenting and re-parsing an ElementTree.
+"""
+from typing import Iterable, Iterator, Tuple
+
+from .utils import sanitize_xml_text, has_invalid_xml_chars
+
+MAX_INDENT_LEVEL = 6
+
+
+def escape_text(text: str) -> str:
+    # line breaks are normalized to \n, the same way the XML parser in ElementTree.canonicalize does
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attribute(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\t" in text:
+        text = text.replace("\t", "&#x9;")
+    if "\n" in text:
+        text = text.replace("\n", "&#xA;")
+    if "\r" in text:
+        text = text.replace("\r", "&#xD;")
+    return text
+
+
+def sanitize_text(text: str) -> str:
+    return escape_text(sanitize_xml_text(text))
+
+
+def sanitize_attribute(text: str) -> str:
+    return escape_attribute(sanitize_xml_text(text))
+
+
+ESCAPERS = (escape_text, escape_attribute)
+SANITIZING_ESCAPERS = (sanitize_text, sanitize_attribute)
+
+
+def make_newlines(indent: bool = True) -> Tuple[str, ...]:
+    """Separators before an element on each nesting level, as written by ElementTree.indent"""
+    if not indent:
+        return ("",) * MAX_INDENT_LEVEL
+
+    return tuple("\n" + "  " * level for level in range(MAX_INDENT_LEVEL))
+
+
+def entity_to_xml(entity, newlines: Tuple[str, ...], sanitize: bool = True) -> str:
+    """Serializes a MaltegoEntity on the nesting level of the response's <Entities>"""
+    nl_entity, nl_child, nl_item = newlines[3], newlines[4], newlines[5]
+    text, attribute = SANITIZING_ESCAPERS if sanitize else ESCAPERS
+
+    parts = [
+        '<Entity Type="', attribute(str(entity.entityType)), '">',
+        nl_child, "<Value>", text(str(entity.value)), "</Value>",
+        nl_child, "<Weight>", text(str(entity.ensure_weight())), "</Weight>",
+    ]
+
+    if entity._display_information:
+        parts.append(nl_child + "<DisplayInformation>")
+        for title, content in entity.iter_display_information():
+            parts += (nl_item, '<Label Name="', attribute(str(title)), '" Type="text/html">',
+                      text(str(content)), "</Label>")
+        parts.append(nl_child + "</DisplayInformation>")
+
+    if entity._additional_fields:
+        parts.append(nl_child + "<AdditionalFields>")
+        for field_name, display_name, matching_rule, value in entity.iter_properties():
+            parts += (nl_item, '<Field DisplayName="', attribute(display_name),
+                      '" MatchingRule="', matching_rule,
+                      '" Name="', attribute(field_name), '">', text(value), "</Field>")
+        parts.append(nl_child + "</AdditionalFields>")
+
+    if entity._overlays:
+        parts.append(nl_child + "<Overlays>")
+        for property_name, position, overlay_type in entity.iter_overlays():
+            parts += (nl_item, '<Overlay position="', attribute(str(position)),
+                      '" propertyName="', attribute(property_name),
+                      '" type="', attribute(str(overlay_type)), '"></Overlay>')
+        parts.append(nl_child + "</Overlays>")
+
+    if entity.iconURL:
+        parts += (nl_child, "<IconURL>", text(str(entity.iconURL)), "</IconURL>")
+
+    parts.append(nl_entity + "</Entity>")
+    return "".join(parts)
+
+
+def _column_escaper(column: Iterable[str], sanitize: bool):
+    # a whole column is checked at once, so only columns with invalid characters are sanitized value by value
+    return sanitize_text if sanitize and has_invalid_xml_chars(column) else escape_text
+
+
+def batch_to_xml(batch, newlines: Tuple[str, ...], sanitize: bool = True) -> str:
+    """Serializes all rows of an EntityBatch, every entity is preceded by its newline"""
+    nl_entity, nl_child, nl_item = newlines[3], newlines[4], newlines[5]
+    text, attribute = SANITIZING_ESCAPERS if sanitize else ESCAPERS
+
+    # everything but the values is the same for all rows, so it's escaped only once
+    entity_start = nl_entity + '<Entity Type="' + attribute(str(batch.entityType)) + '">' + nl_child + "<Value>"
+    weight_start = "</Value>" + nl_child + "<Weight>"
+    field_starts = [
+        nl_item + '<Field DisplayName="' + attribute(display_name) + '" MatchingRule="' + matching_rule +
+        '" Name="' + attribute(field_name) + '">'
+        for field_name, display_name, matching_rule, _ in batch.properties
+    ]
+    value_text = _column_escaper(map(str, batch.values), sanitize)
+    field_texts = [
+        _column_escaper((str(value or "") for value in column), sanitize)
+        for _, _, _, column in batch.properties
+    ]
+    fields_start = "</Weight>" + nl_child + "<AdditionalFields>" if field_starts else "</Weight>"
+    fields_end = nl_child + "</AdditionalFields>" if field_starts else ""
+    entity_end = fields_end
+    if batch.iconURL:
+        entity_end += nl_child + "<IconURL>" + text(batch.iconURL) + "</IconURL>"
+    entity_end += nl_entity + "</Entity>"
+
+    parts = []
+    append = parts.append
+    for value, weight, property_values in batch.iter_rows():
+        append(entity_start)
+        append(value_text(str(value)))
+        append(weight_start)
+        append(text(str(weight)))
+        append(fields_start)
+        for field_start, field_text, property_value in zip(field_starts, field_texts, property_values):
+            append(field_start)
+            append(field_text(str(property_value or "")))
+            append("</Field>")
+        append(entity_end)
+
+    return "".join(parts)
+
+
+def iter_response_xml(entities: Iterable, ui_messages: Iterable[Tuple[str, str]], indent: bool = True,
+                      batches: Iterable = (), sanitize: bool = True) -> Iterator[str]:
+    """
+    Yields the response document piece by piece, one piece per entity and one per entity batch.
+    batches and ui_messages are only consumed after all entities have been written.
+    With sanitize, characters which aren't allowed in XML are replaced, see utils.sanitize_xml_text.
+    """
+    newlines = make_newlines(indent)
+    text, attribute = SANITIZING_ESCAPERS if sanitize else ESCAPERS
+
+    yield "<MaltegoMessage>" + newlines[1] + "<MaltegoTransformResponseMessage>" + newlines[2] + "<Entities>"
+
+    closing = "</Entities>"
+    for entity in entities:
+        closing = newlines[2] + "</Entities>"
+        yield newlines[3] + entity_to_xml(entity, newlines, sanitize)
+
+    for batch in batches:
+        if len(batch):
+            closing = newlines[2] + "</Entities>"
+            yield batch_to_xml(batch, newlines, sanitize)
+
+    parts = [closing, newlines[2], "<UIMessages>"]
+    closing = "</UIMessages>"
+    for message_type, message_content in ui_messages:
+        closing = newlines[2] + "</UIMessages>"
+        parts += (newlines[3], '<UIMessage MessageType="', attribute(str(message_type)), '">',
+                  text(str(message_content)), "</UIMessage>")
+
+    parts += (closing, newlines[1], "</MaltegoTransformResponseMessage>", newlines[0], "</MaltegoMessage>")
+    yield "".join(parts)
+
+
+def serialize_response(entities: Iterable, ui_messages: Iterable[Tuple[str, str]], indent: bool = True,
+                       batches: Iterable = (), sanitize: bool = True) -> str:
+    return "".join(iter_response_xml(entities, ui_messages, indent, batches, sanitize))
@@ -1,72 +1,218 @@
 import logging
+import time
 
 from flask import Flask, request
 
-from .maltego import MaltegoMsg, MaltegoTransform
+from .batch import DEFAULT_MAX_ENTITIES, DEFAULT_PARALLELISM, PARSE_ERRORS, parse_batch_request, run_batch
+from .fanout import DEFAULT_MAX_TRANSFORMS, FORMATS, FORMAT_COMBINED, FORMAT_KEYED, combine_responses, run_fanout
+from .instrumentation import PARSE, collect_timings, count_entities, format_server_timing, span
+from .logs import REQUEST_LOGGER
+from .maltego import MaltegoMsg
+from .metrics import CONTENT_TYPE, metrics, metrics_enabled
 from .registry import mapping
+# the transforms run in runner.py, which doesn't need Flask, imported here as well for backwards compatibility
+from .runner import (EXCEPTION_MESSAGE, SATURATED_MESSAGE, URL_TEMPLATE, call_transform, execute_transform,
+                     get_exception_message, get_saturated_message, in_flight, print_transforms, run_limited_transform,
+                     run_transform)
 
 log = logging.getLogger("maltego.server")
-logging.basicConfig(level=logging.DEBUG)
+request_log = logging.getLogger(REQUEST_LOGGER)
 
-URL_TEMPLATE = '/run/<transform_name>/'
 URL_TEMPLATE_NO_SLASH = '/run/<transform_name>'
+BATCH_URL_TEMPLATE = '/run/<transform_name>/batch'
+FANOUT_URL = '/fanout'
+METRICS_URL = '/metrics'
 
 
-def get_exception_message(msg="An exception occurred with the transform. Check the logs for more details."):
-    transform_run = MaltegoTransform()
-    transform_run.addUIMessage(msg, "PartialError")
+def stream_transform(transform_name, client_msg):
+    transform_method = mapping[transform_name]
+    chunks = transform_method.stream_transform(client_msg, EXCEPTION_MESSAGE)
+    if app.config["TRX_METRICS"] is not None:
+        chunks = app.config["TRX_METRICS"].observe_stream(transform_name, chunks, time.perf_counter())
+    return app.response_class(chunks), 200
 
-    return transform_run.returnOutput()
 
+app = Flask(__name__)
+application = app  # application variable for usage with apache mod wsgi
 
-def print_transforms():
-    print("= Transform Server URLs =")
-    for path in mapping:
-        print(URL_TEMPLATE.replace("<transform_name>", path) + ": " + mapping[path].__name__)
-    print("\n")
+# a maltego_trx.cache.ResponseCache to cache transform responses, disabled by default
+app.config.setdefault("TRX_RESPONSE_CACHE", None)
 
-    print("= Local Transform Names =")
-    for path in mapping:
-        print(path + ": " + mapping[path].__name__)
-    print("\n")
+# input entities of a batch request that run at the same time, and the maximum number of input entities
+app.config.setdefault("TRX_BATCH_PARALLELISM", DEFAULT_PARALLELISM)
+app.config.setdefault("TRX_BATCH_MAX_ENTITIES", DEFAULT_MAX_ENTITIES)
 
+# maximum number of transforms of a fan-out request
+app.config.setdefault("TRX_FANOUT_MAX_TRANSFORMS", DEFAULT_MAX_TRANSFORMS)
 
-def run_transform(transform_name, client_msg):
-    transform_method = mapping[transform_name]
-    try:
-        if hasattr(transform_method, "run_transform"):
-            return transform_method.run_transform(client_msg), 200  # Transform class
-        else:
-            return transform_method(client_msg), 200  # Transform method
-    except Exception as e:
-        log.error("An exception occurred while executing your transform code.")
-        log.error(e, exc_info=True)
-        return get_exception_message(), 200
+# the maltego_trx.metrics.Metrics served on /metrics, disabled by default unless enabled with MALTEGO_TRX_METRICS=1
+app.config.setdefault("TRX_METRICS", metrics if metrics_enabled() else None)
 
+# add a Server-Timing header with the phases of the request to transform responses, see maltego_trx.instrumentation
+app.config.setdefault("TRX_SERVER_TIMING", False)
 
-app = Flask(__name__)
-application = app  # application variable for usage with apache mod wsgi
+# log a record per transform request to maltego.requests, see maltego_trx.logs
+app.config.setdefault("TRX_REQUEST_LOG", False)
+
+# a maltego_trx.profiling.Profiler to profile requests with its header and a sample of all requests, disabled by default
+app.config.setdefault("TRX_PROFILER", None)
+
+
+def observe(run):
+    """Wraps a function running a transform, so its responses are counted in the metrics and the request log"""
+    transform_metrics = app.config["TRX_METRICS"]
+    log_requests = app.config["TRX_REQUEST_LOG"]
+    if transform_metrics is None and not log_requests:
+        return run
+
+    def run_observed(transform_name, *args):
+        start = time.perf_counter()
+        # the transform counts its entities in its EXECUTE span, so the response doesn't have to be scanned for them
+        with collect_timings() as timings:
+            output, status = run(transform_name, *args)
+        duration = time.perf_counter() - start
+        entities = count_entities(timings)
+        if transform_metrics is not None:
+            transform_metrics.observe_response(transform_name, duration, output, status, entities)
+        if log_requests:
+            log_request(transform_name, duration, output, status, entities)
+        return output, status
+
+    return run_observed
+
+
+def log_request(transform_name, duration, output, status, entities):
+    if not request_log.isEnabledFor(logging.INFO):
+        return
+
+    request_log.info("%s %d %.1f ms", transform_name, status, duration * 1000, extra={
+        "transform": transform_name,
+        "status": status,
+        "duration_ms": round(duration * 1000, 3),
+        "entities": entities,
+        "bytes": len(output),
+    })
+
+
+def get_runner(transform_name):
+    """Returns the function which runs a parsed request of the transform, through the response cache if enabled"""
+    response_cache = app.config["TRX_RESPONSE_CACHE"]
+    transform = mapping[transform_name]
+    if response_cache is None or not response_cache.is_cacheable(transform):
+        return observe(run_transform)
+
+    def run_cached_transform(name, client_msg):
+        return response_cache.run_parsed_transform(name, transform, client_msg, run_transform)
+
+    return observe(run_cached_transform)
 
 
 def transform_runner(transform_name):
     transform_name = transform_name.lower()
     if transform_name in mapping:
         if request.method == 'POST':
-            client_msg = MaltegoMsg(request.data)
-            return run_transform(transform_name, client_msg)
+            profiler = app.config["TRX_PROFILER"]
+            if profiler is not None and profiler.should_profile(request.headers):
+                with profiler.profile_request():
+                    return run_post_request(transform_name)
+            return run_post_request(transform_name)
         else:
             return "Transform found with name '%s', you will need to send a POST request to run it." % transform_name, 200
     else:
-        log.info("No transform found with the name '%s'." % transform_name)
-        log.info("Available transforms are:\n %s" % str(list(mapping.keys())))
+        log.info("No transform found with the name '%s'.", transform_name)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Available transforms are:\n %s", list(mapping))
         return "No transform found with the name '%s'." % transform_name, 404
 
 
+def run_post_request(transform_name):
+    if getattr(mapping[transform_name], "stream", False):
+        return stream_transform(transform_name, parse_request(transform_name, request.data))
+    if not app.config["TRX_SERVER_TIMING"]:
+        return observe(run_request)(transform_name, request.data)
+
+    with collect_timings() as timings:
+        output, status = observe(run_request)(transform_name, request.data)
+    return output, status, {"Server-Timing": format_server_timing(timings)}
+
+
+def run_request(transform_name, request_xml):
+    response_cache = app.config["TRX_RESPONSE_CACHE"]
+    if response_cache is not None and response_cache.is_cacheable(mapping[transform_name]):
+        return response_cache.run_transform(transform_name, mapping[transform_name], request_xml, run_transform)
+
+    return run_transform(transform_name, parse_request(transform_name, request_xml))
+
+
+def parse_request(transform_name, request_xml):
+    with span(PARSE, transform_name, len(request_xml)):
+        return MaltegoMsg(request_xml)
+
+
 # Add the route with and without the slash, since POSTs can't be redirected
 app.route(URL_TEMPLATE_NO_SLASH, methods=['GET', 'POST'])(transform_runner)
 app.route(URL_TEMPLATE, methods=['GET', 'POST'])(transform_runner)
 
 
+@app.route(BATCH_URL_TEMPLATE, methods=['POST'])
+def batch_runner(transform_name):
+    transform_name = transform_name.lower()
+    if transform_name not in mapping:
+        log.info("No transform found with the name '%s'.", transform_name)
+        return "No transform found with the name '%s'." % transform_name, 404
+
+    try:
+        with span(PARSE, transform_name, len(request.data)):
+            client_msgs = parse_batch_request(request.data)
+    except PARSE_ERRORS as e:
+        log.info("Invalid batch request: %s", e)
+        return "Invalid batch request.", 400
+
+    max_entities = app.config["TRX_BATCH_MAX_ENTITIES"]
+    if len(client_msgs) > max_entities:
+        return "A batch request can contain at most %d entities." % max_entities, 413
+
+    results = run_batch(transform_name, client_msgs, get_runner(transform_name), app.config["TRX_BATCH_PARALLELISM"])
+    return {"results": results}, 200
+
+
+@app.route(FANOUT_URL, methods=['POST'])
+def fanout_runner():
+    transform_names = [name.strip().lower() for name in request.args.get("transforms", "").split(",") if name.strip()]
+    response_format = FORMATS.get(request.args.get("format", FORMAT_KEYED))
+    if not transform_names or response_format is None:
+        return "Send the transforms as ?transforms=a,b and the format as ?format=keyed or ?format=combined.", 400
+
+    missing = [name for name in transform_names if name not in mapping]
+    if missing:
+        return "No transform found with the name '%s'." % "', '".join(missing), 404
+
+    max_transforms = app.config["TRX_FANOUT_MAX_TRANSFORMS"]
+    if len(transform_names) > max_transforms:
+        return "A fan-out request can run at most %d transforms." % max_transforms, 413
+
+    # duplicate names run only once
+    transform_names = list(dict.fromkeys(transform_names))
+    try:
+        client_msg = MaltegoMsg(request.data)
+    except PARSE_ERRORS as e:
+        log.info("Invalid fan-out request: %s", e)
+        return "Invalid fan-out request.", 400
+
+    outputs = run_fanout(transform_names, client_msg, get_runner)
+
+    if response_format == FORMAT_COMBINED:
+        return combine_responses(list(outputs.values())), 200
+    return {"results": {name: {"output": output} for name, output in outputs.items()}}, 200
+
+
+@app.route(METRICS_URL, methods=['GET'])
+def metrics_exporter():
+    if app.config["TRX_METRICS"] is None:
+        return "Metrics are disabled.", 404
+    return app.config["TRX_METRICS"].render(), 200, {"Content-Type": CONTENT_TYPE}
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     return "You have reached a Maltego Transform Server.", 200
@@ -0,0 +1,183 @@
+"""
+Cache store in a local SQLite database, shared by all worker processes of a server.
+
+The database runs in WAL mode, so readers don't block each other or the writer, and its entries survive worker
+restarts. Once the cached values exceed max_bytes, the least recently used entries are removed.
+It has the same get/set interface as cache.LRUCache. It can back a cache.ResponseCache, and transforms can use it
+directly for upstream responses. Database errors, e.g. while another process holds the write lock for longer than
+BUSY_TIMEOUT, are logged and turn reads into misses and skip writes, so they never fail a request.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# reads only update the access time of an entry if it's older than this, to save most of the writes
+ACCESS_TIME_RESOLUTION = 1.0
+
+# how long a writer waits for another process to finish its write, in milliseconds
+BUSY_TIMEOUT = 5000
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS total_size (size INTEGER NOT NULL);
+INSERT INTO total_size (size) SELECT 0 WHERE NOT EXISTS (SELECT * FROM total_size);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+    BEGIN UPDATE total_size SET size = size + new.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+    BEGIN UPDATE total_size SET size = size - old.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+    BEGIN UPDATE total_size SET size = size - old.size + new.size; END;
+COMMIT;
+"""
+
+
+class SQLiteCache(object):
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        # the schema is created in a single transaction, since all workers start at the same time
+        self.connection.executescript(SCHEMA)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # connections can't be shared between threads, nor survive a fork into a new worker process
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT / 1000, isolation_level=None)
+            local.connection.execute("PRAGMA journal_mode=WAL")
+            local.connection.execute("PRAGMA synchronous=NORMAL")
+            local.connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT}")
+            local.pid = os.getpid()
+        return local.connection
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        return self.connection.execute("SELECT size FROM total_size").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            row = self.connection.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("Unable to read from the cache %s: %s", self.path, e)
+            return None
+        if row is None:
+            return None
+
+        value, expires_at, accessed_at = row
+        now = time.time()
+        try:
+            if expires_at is not None and expires_at <= now:
+                with self._transaction() as connection:
+                    connection.execute("DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, now))
+                return None
+
+            if now - accessed_at > ACCESS_TIME_RESOLUTION:
+                with self._transaction() as connection:
+                    connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            # the value is still valid, only its access time or the removal of the expired entry is lost
+            log.warning("Unable to update the cache %s: %s", self.path, e)
+            if expires_at is not None and expires_at <= now:
+                return None
+
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        try:
+            self._set(key, value, size, ttl)
+        except sqlite3.Error as e:
+            log.warning("Unable to write to the cache %s: %s", self.path, e)
+
+    def _set(self, key: str, value: bytes, size: int, ttl: Optional[float]):
+        now = time.time()
+        with self._transaction() as connection:
+            # an upsert instead of INSERT OR REPLACE, whose implicit delete wouldn't fire the size trigger
+            connection.execute(
+                "INSERT INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, sqlite3.Binary(value), size, now + ttl if ttl else None, now),
+            )
+            self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        excess = connection.execute("SELECT size FROM total_size").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+
+        connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        excess = connection.execute("SELECT size FROM total_size").fetchone()[0] - self.max_bytes
+
+        keys = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+    def delete(self, key: str):
+        try:
+            with self._transaction() as connection:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            log.warning("Unable to delete from the cache %s: %s", self.path, e)
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM entries")
+
+
+class _Transaction(object):
+    """Write transaction which locks the database right away, so concurrent writers wait for each other"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            try:
+                self.connection.execute("COMMIT")
+                return
+            except sqlite3.Error:
+                # e.g. a full disk, the transaction is still open and has to end before the next one
+                self._rollback()
+                raise
+        self._rollback()
+
+    def _rollback(self):
+        if self.connection.in_transaction:
+            self.connection.execute("ROLLBACK")
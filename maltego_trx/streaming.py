@@ -0,0 +1,152 @@
+"""
+Streaming transform responses.
+
+The transform runs in a background thread and hands its entities over in chunks. Every chunk is serialized and sent
+to the client while the transform is still creating the next one, so only a few chunks are held in memory at a time.
+Once the deadline of the transform expires, the response ends with the entities handed over so far and a
+PartialError message, even if the transform is stuck and doesn't add any more entities.
+"""
+import logging
+import queue
+import threading
+
+from .deadline import DEADLINE_MESSAGE, DeadlineExceeded
+from .maltego import MaltegoTransform, EntityLimitReached, UIM_PARTIAL
+from .serializer import iter_response_xml
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# number of finished chunks that may wait for the client before the transform is blocked
+MAX_PENDING_CHUNKS = 2
+
+
+class StreamClosed(Exception):
+    """Raised inside the transform when the client stopped reading the response"""
+
+
+class StreamingMaltegoTransform(MaltegoTransform):
+    """
+    MaltegoTransform that passes its entities on in chunks instead of keeping all of them.
+
+    The entities added so far are sent as soon as a chunk is full and another entity is added,
+    which means an entity has to be complete before the next call to addEntity.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, limit=None, deadline=None):
+        super().__init__(limit=limit, raise_on_limit=True, deadline=deadline)
+        self.chunk_size = chunk_size
+        self._sent_entities = 0
+        self._chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+        self._closed = threading.Event()
+        self._deadline_lock = threading.Lock()
+        self._deadline_exceeded = False
+
+    def count_entities(self):
+        return self._sent_entities + super().count_entities()
+
+    def addEntity(self, type=None, value=None):
+        if len(self.entities) >= self.chunk_size:
+            self._put(self.entities)
+            self._sent_entities += len(self.entities)
+            self.entities = []
+
+        return super().addEntity(type, value)
+
+    def _put(self, chunk):
+        while not self._closed.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+        raise StreamClosed()
+
+    def run(self, create_entities, request, error_message: str):
+        """Runs the transform and hands over the remaining entities, meant to be the target of a thread"""
+        try:
+            create_entities(request, self)
+        except StreamClosed:
+            return
+        except EntityLimitReached:
+            pass
+        except DeadlineExceeded:
+            self.deadline_exceeded()
+        except Exception as e:
+            log.error("An exception occurred while executing your transform code.")
+            log.error(e, exc_info=True)
+            self.addUIMessage(error_message, UIM_PARTIAL)
+
+        try:
+            self._put(self.entities)
+            self._put(None)
+        except StreamClosed:
+            pass
+
+    def iter_entities(self):
+        while True:
+            try:
+                chunk = self._chunks.get(timeout=self.deadline.remaining())
+            except queue.Empty:
+                # the transform didn't hand over any entities until its deadline, it may be stuck
+                self.deadline_exceeded()
+                self.close()
+                yield from self._drain()
+                return
+
+            if chunk is None:
+                return
+
+            yield from chunk
+
+    def _drain(self):
+        while True:
+            try:
+                chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                return
+            if chunk is None:
+                return
+            yield from chunk
+
+    def deadline_exceeded(self):
+        """Adds the deadline message once, from the transform or from the response waiting for it"""
+        with self._deadline_lock:
+            if self._deadline_exceeded:
+                return
+            self._deadline_exceeded = True
+
+        log.warning("Streamed transform exceeded its timeout of %s seconds", self.deadline.timeout)
+        self.deadline.cancel()
+        self.addUIMessage(DEADLINE_MESSAGE, UIM_PARTIAL)
+
+    def close(self):
+        self._closed.set()
+
+
+def stream_transform(create_entities, request, chunk_size: int, error_message: str, limit=None, deadline=None):
+    """
+    Runs create_entities in a background thread and yields the serialized response in chunks of chunk_size entities.
+    Exceptions in the transform end the response with a PartialError message after the entities sent so far.
+    With a limit, the transform is stopped once it added that many entities. With a deadline, the response ends once
+    it expired, see maltego_trx.deadline.
+    """
+    response = StreamingMaltegoTransform(chunk_size, limit, deadline)
+    worker = threading.Thread(target=response.run, args=(create_entities, request, error_message), daemon=True)
+    worker.start()
+
+    try:
+        pieces = []
+        # entity batches are already stored compactly, so they are sent after the streamed entities
+        for piece in iter_response_xml(response.iter_entities(), response.iter_ui_messages(),
+                                       batches=response.entity_batches, sanitize=response.sanitize):
+            pieces.append(piece)
+            if len(pieces) >= chunk_size:
+                yield "".join(pieces)
+                pieces = []
+
+        yield "".join(pieces)
+    finally:
+        response.close()
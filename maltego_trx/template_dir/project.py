@@ -4,7 +4,6 @@ import transforms
 from extensions import registry
 from maltego_trx.handler import handle_run
 from maltego_trx.registry import register_transform_classes
-from maltego_trx.server import app as application
 
 register_transform_classes(transforms)
 
@@ -12,4 +11,7 @@ registry.write_transforms_config(include_output_entities=True)
 registry.write_settings_config()
 
 if __name__ == '__main__':
-    handle_run(__name__, sys.argv, application)
+    # runserver imports the server itself, local transforms don't need Flask
+    handle_run(__name__, sys.argv)
+else:
+    from maltego_trx.server import app as application
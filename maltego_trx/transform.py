@@ -1,13 +1,169 @@
-from maltego_trx.maltego import MaltegoTransform
+import contextvars
+import logging
+import threading
+
+from maltego_trx import process_pool
+from maltego_trx.instrumentation import EXECUTE, SERIALIZE, span
+from maltego_trx.deadline import Deadline, DeadlineExceeded, DEADLINE_MESSAGE
+from maltego_trx.maltego import MaltegoTransform, EntityLimitReached, UIM_PARTIAL
+from maltego_trx.streaming import DEFAULT_CHUNK_SIZE, stream_transform
+from maltego_trx.utils import name_to_path
+
+log = logging.getLogger(__name__)
 
 
 class DiscoverableTransform:
+    # serializer for the response, defaults to MaltegoTransform.serializer if not set
+    serializer = None
+
+    # merge duplicate entities before serializing, defaults to MaltegoTransform.deduplicate if not set
+    deduplicate = None
+
+    # stop the transform once it added as many entities as the request's Slider allows
+    enforce_limit = False
+
+    # seconds create_entities may run, afterwards the entities added so far are returned with a PartialError message
+    timeout = None
+
+    # run at most max_concurrency calls at once and let at most queue_depth more calls wait, see maltego_trx.executor
+    max_concurrency = None
+    queue_depth = 0
+
+    # run only once for concurrent identical requests, and share the response for coalesce_window more seconds
+    coalesce = False
+    coalesce_window = 0
+
+    # run create_entities in a worker process of maltego_trx.process_pool, for CPU-bound transforms
+    use_process_pool = False
+
+    # send entities to the client in chunks while create_entities is still running, server transforms only
+    stream = False
+    stream_chunk_size = DEFAULT_CHUNK_SIZE
+
     @classmethod
     def create_entities(cls, request, response):
         raise NotImplementedError("create_entities static method must be implemented in child class.")
 
+    @classmethod
+    def get_limit(cls, request):
+        return request.Slider if cls.enforce_limit else None
+
+    @classmethod
+    def create_response(cls, request):
+        return MaltegoTransform(serializer=cls.serializer, deduplicate=cls.deduplicate,
+                                limit=cls.get_limit(request), raise_on_limit=True, deadline=Deadline(cls.timeout))
+
+    @classmethod
+    def fill_response(cls, request, response):
+        try:
+            cls.create_entities(request, response)
+        except EntityLimitReached:
+            pass
+
+    @classmethod
+    def build_response(cls, request):
+        response = cls.create_response(request)
+        if not cls.timeout:
+            cls.fill_response(request, response)
+            return response
+
+        # create_entities runs in a thread of its own, so a hung upstream call can't hold up the response
+        errors = []
+
+        def fill_response():
+            try:
+                cls.fill_response(request, response)
+            except BaseException as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(fill_response,),
+                                  name=f"maltego-trx-{cls.__name__}", daemon=True)
+        worker.start()
+        worker.join(response.deadline.remaining())
+
+        if worker.is_alive() or (errors and isinstance(errors[0], DeadlineExceeded)):
+            return cls.deadline_exceeded(response)
+        if errors:
+            raise errors[0]
+        return response
+
+    @classmethod
+    def deadline_exceeded(cls, response):
+        log.warning("Transform %s exceeded its timeout of %s seconds", cls.__name__, cls.timeout)
+        response.deadline.cancel()
+
+        # the transform may still be running, so only the entities added until now are returned
+        partial_response = response.snapshot()
+        partial_response.addUIMessage(DEADLINE_MESSAGE, UIM_PARTIAL)
+        return partial_response
+
+    @classmethod
+    def serialize_response(cls, response):
+        with span(SERIALIZE, name_to_path(cls.__name__)) as serialize_span:
+            output = response.returnOutput()
+            serialize_span.size = len(output)
+        return output
+
     @classmethod
     def run_transform(cls, request):
-        response = MaltegoTransform()
-        cls.create_entities(request, response)
-        return response.returnOutput()
+        with span(EXECUTE, name_to_path(cls.__name__)) as execute_span:
+            if cls.use_process_pool:
+                response = process_pool.run(cls.build_response, request)
+            else:
+                response = cls.build_response(request)
+            execute_span.size = response.count_entities()
+        return cls.serialize_response(response)
+
+    @classmethod
+    def stream_transform(cls, request, error_message):
+        return stream_transform(cls.create_entities, request, cls.stream_chunk_size, error_message,
+                                limit=cls.get_limit(request), deadline=Deadline(cls.timeout))
+
+
+class AsyncDiscoverableTransform(DiscoverableTransform):
+    """
+    Transform with an async create_entities. The ASGI app in maltego_trx.asgi awaits it on its event loop,
+    the Flask server and local transforms run it with asyncio.run.
+    """
+
+    @classmethod
+    async def create_entities(cls, request, response):
+        raise NotImplementedError("create_entities static method must be implemented in child class.")
+
+    @classmethod
+    async def fill_response(cls, request, response):
+        try:
+            await cls.create_entities(request, response)
+        except EntityLimitReached:
+            pass
+
+    @classmethod
+    async def run_transform_async(cls, request):
+        import asyncio
+
+        with span(EXECUTE, name_to_path(cls.__name__)) as execute_span:
+            response = cls.create_response(request)
+            try:
+                # the transform is cancelled at the await it's waiting on once the timeout is over
+                await asyncio.wait_for(cls.fill_response(request, response), cls.timeout)
+            except (asyncio.TimeoutError, DeadlineExceeded):
+                response = cls.deadline_exceeded(response)
+            execute_span.size = response.count_entities()
+        return cls.serialize_response(response)
+
+    @classmethod
+    def run_transform(cls, request):
+        import asyncio
+
+        return asyncio.run(cls.run_transform_async(request))
+
+    @classmethod
+    def stream_transform(cls, request, error_message):
+        # the streaming thread gets an event loop of its own
+        def create_entities(request, response):
+            import asyncio
+
+            asyncio.run(cls.create_entities(request, response))
+
+        return stream_transform(create_entities, request, cls.stream_chunk_size, error_message,
+                                limit=cls.get_limit(request), deadline=Deadline(cls.timeout))
@@ -45,6 +45,10 @@ def force_encoding(val, encoding):
         return str(val).encode(encoding, 'replace').decode(encoding, 'replace')
 
 
+# characters which aren't allowed in XML documents
+INVALID_XML_CHARS = re.compile(u'[^\u0020-\uD7FF\u0009\u000A\u000D\uE000-\uFFFD\U00010000-\U0010FFFF]+')
+
+
 def remove_invalid_xml_chars(val):
     """
     Remove characters which aren't allowed in XML.
@@ -52,10 +56,27 @@ def remove_invalid_xml_chars(val):
     :return:
     """
     val = make_utf8(val)
-    val = re.sub(u'[^\u0020-\uD7FF\u0009\u000A\u000D\uE000-\uFFFD\U00010000-\U0010FFFF]+', '?', val)
+    val = INVALID_XML_CHARS.sub('?', val)
     return val
 
 
+def sanitize_xml_text(val: str) -> str:
+    """
+    Same as remove_invalid_xml_chars for strings, but valid strings are returned as they are.
+    Printable strings can't contain invalid characters, so most values never reach the regex.
+    """
+    if val.isprintable() or INVALID_XML_CHARS.search(val) is None:
+        return val
+
+    return remove_invalid_xml_chars(val)
+
+
+def has_invalid_xml_chars(values: Iterable[str]) -> bool:
+    """Checks many strings at once, e.g. a whole column of values"""
+    text = "".join(values)
+    return not text.isprintable() and INVALID_XML_CHARS.search(text) is not None
+
+
 T = TypeVar('T')
 
 
@@ -0,0 +1,182 @@
+import asyncio
+import os.path
+import time
+
+import pytest
+
+from maltego_trx.asgi import TransformASGIApp
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import run_transform
+from maltego_trx.transform import AsyncDiscoverableTransform, DiscoverableTransform
+
+__TESTDIR__ = os.path.dirname(__file__)
+
+with open(os.path.join(__TESTDIR__, "test_request.xml")) as request_file:
+    REQUEST = request_file.read().encode("utf8")
+
+
+class AsyncGreeting(AsyncDiscoverableTransform):
+    @classmethod
+    async def create_entities(cls, request, response):
+        await asyncio.sleep(0.2)
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+
+
+class AsyncFailing(AsyncDiscoverableTransform):
+    @classmethod
+    async def create_entities(cls, request, response):
+        raise ValueError("upstream failed")
+
+
+class SyncGreeting(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        time.sleep(0.05)
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+
+
+class AsyncStreamed(AsyncDiscoverableTransform):
+    stream = True
+    stream_chunk_size = 10
+
+    @classmethod
+    async def create_entities(cls, request, response):
+        for idx in range(25):
+            await asyncio.sleep(0)
+            response.addEntity("maltego.Phrase", f"Entity {idx}")
+
+
+class AsyncLimited(AsyncDiscoverableTransform):
+    max_concurrency = 2
+    queue_depth = 1
+    running = 0
+    max_running = 0
+
+    @classmethod
+    async def create_entities(cls, request, response):
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        await asyncio.sleep(0.05)
+        cls.running -= 1
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+
+
+for transform in (AsyncGreeting, AsyncFailing, SyncGreeting, AsyncStreamed, AsyncLimited):
+    register_transform_function(transform)
+
+
+async def call(app, method, path, body=b""):
+    """Runs a single request against the ASGI app and returns (status, headers, body)"""
+    requests = [{"type": "http.request", "body": body[:10], "more_body": True},
+                {"type": "http.request", "body": body[10:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path}, receive, send)
+
+    start, *bodies = sent
+    assert start["type"] == "http.response.start"
+    return start["status"], dict(start["headers"]), b"".join(message["body"] for message in bodies).decode("utf8")
+
+
+def run_call(method, path, body=b""):
+    return asyncio.run(call(TransformASGIApp(), method, path, body))
+
+
+@pytest.mark.parametrize("transform_name", ["asyncgreeting", "syncgreeting", "asyncstreamed"])
+def test_asgi_output_matches_flask_output(transform_name):
+    status, headers, body = run_call("POST", f"/run/{transform_name}/", REQUEST)
+
+    assert status == 200
+    assert headers[b"content-type"] == b"text/html; charset=utf-8"
+    assert body == run_transform(transform_name, MaltegoMsg(REQUEST))[0]
+
+
+def test_async_transforms_run_concurrently():
+    async def run_many():
+        app = TransformASGIApp(max_threads=1)
+        return await asyncio.gather(*(call(app, "POST", "/run/asyncgreeting", REQUEST) for _ in range(50)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many())
+
+    assert time.perf_counter() - start < 2
+    assert all(status == 200 and "Hello paterva.com" in body for status, _, body in results)
+
+
+def test_sync_transforms_run_in_threads():
+    async def run_many():
+        app = TransformASGIApp(max_threads=10)
+        return await asyncio.gather(*(call(app, "POST", "/run/syncgreeting/", REQUEST) for _ in range(10)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many())
+
+    assert time.perf_counter() - start < 0.4
+    assert all(status == 200 for status, _, _ in results)
+
+
+def test_async_transforms_are_limited():
+    async def run_many():
+        app = TransformASGIApp()
+        return await asyncio.gather(*(call(app, "POST", "/run/asynclimited/", REQUEST) for _ in range(5)))
+
+    results = asyncio.run(run_many())
+    bodies = [body for _, _, body in results]
+
+    assert AsyncLimited.max_running == 2
+    assert sum("Hello paterva.com" in body for body in bodies) == 3
+    assert sum("The transform is busy" in body for body in bodies) == 2
+
+
+def test_async_transform_exception_returns_partial_error():
+    status, _, body = run_call("POST", "/run/asyncfailing/", REQUEST)
+
+    assert status == 200
+    assert 'MessageType="PartialError"' in body
+
+
+@pytest.mark.parametrize("method, path, status, text", [
+    ("GET", "/", 200, "You have reached a Maltego Transform Server."),
+    ("GET", "/run/asyncgreeting/", 200, "you will need to send a POST request"),
+    ("POST", "/run/missing/", 404, "No transform found with the name 'missing'."),
+    ("POST", "/other", 404, "Not Found"),
+])
+def test_asgi_routes(method, path, status, text):
+    response_status, _, body = run_call(method, path)
+
+    assert response_status == status
+    assert text in body
+
+
+def test_invalid_request_returns_server_error():
+    status, _, _ = run_call("POST", "/run/asyncgreeting/", b"<MaltegoMessage>")
+
+    assert status == 500
+
+
+def test_lifespan():
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(TransformASGIApp()({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+def test_async_transform_runs_without_event_loop():
+    output = AsyncGreeting.run_transform(MaltegoMsg(REQUEST))
+
+    assert "Hello paterva.com" in output
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from maltego_trx.cache import ResponseCache
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app, run_transform
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import make_request, make_entity, make_fields
+
+
+class BatchTransform(DiscoverableTransform):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def create_entities(cls, request, response):
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+
+        try:
+            time.sleep(0.02)
+            if request.Value == "fail":
+                raise ValueError("upstream failed")
+            response.addEntity("maltego.Phrase", f"{request.Value} {request.getProperty('mode')} "
+                                                 f"{request.getTransformSetting('api_key')}")
+        finally:
+            with cls.lock:
+                cls.running -= 1
+
+
+def batch_request(*values):
+    entities = [make_entity(value=value, fields=make_fields(("mode", f"mode-{value}"))) for value in values]
+    settings = "<TransformFields>%s</TransformFields>" % make_fields(("api_key", "secret"))
+    return make_request(entities, settings=settings)
+
+
+@pytest.fixture
+def client():
+    register_transform_function(BatchTransform)
+    BatchTransform.running = BatchTransform.max_running = 0
+    with app.test_client() as client:
+        yield client
+
+
+def test_batch_results_are_grouped_per_input(client):
+    values = [f"value{idx}" for idx in range(20)]
+    response = client.post("/run/batchtransform/batch", data=batch_request(*values))
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["value"] for result in results] == values
+    assert all(result["type"] == "maltego.Domain" for result in results)
+
+    for value, result in zip(values, results):
+        single_request = MaltegoMsg(batch_request(value))
+        assert result["output"] == run_transform("batchtransform", single_request)[0]
+        assert f"{value} mode-{value} secret" in result["output"]
+
+
+def test_batch_parallelism_is_bounded(client):
+    app.config["TRX_BATCH_PARALLELISM"] = 3
+    try:
+        client.post("/run/batchtransform/batch", data=batch_request(*map(str, range(30))))
+    finally:
+        app.config["TRX_BATCH_PARALLELISM"] = 8
+
+    assert 1 < BatchTransform.max_running <= 3
+
+
+def test_failures_are_isolated(client):
+    results = client.post("/run/batchtransform/batch", data=batch_request("ok", "fail")).get_json()["results"]
+
+    assert "ok mode-ok secret" in results[0]["output"]
+    assert "PartialError" in results[1]["output"]
+
+
+def test_batch_uses_response_cache(client, mocker):
+    app.config["TRX_RESPONSE_CACHE"] = ResponseCache()
+    try:
+        client.post("/run/batchtransform/batch", data=batch_request("a", "b"))
+        create_entities = mocker.spy(BatchTransform, "create_entities")
+        results = client.post("/run/batchtransform/batch", data=batch_request("b", "c")).get_json()["results"]
+    finally:
+        app.config["TRX_RESPONSE_CACHE"] = None
+
+    assert create_entities.call_count == 1
+    assert "b mode-b secret" in results[0]["output"]
+
+
+@pytest.mark.parametrize("path, body, status", [
+    ("/run/missing/batch", batch_request("a"), 404),
+    ("/run/batchtransform/batch", "<MaltegoMessage>", 400),
+    ("/run/batchtransform/batch", "<MaltegoMessage></MaltegoMessage>", 400),
+    ("/run/batchtransform/batch", batch_request("a").replace("<Value>a</Value>", ""), 400),
+])
+def test_invalid_batch_requests(client, path, body, status):
+    assert client.post(path, data=body).status_code == status
+
+
+def test_batch_size_is_limited(client):
+    app.config["TRX_BATCH_MAX_ENTITIES"] = 2
+    try:
+        response = client.post("/run/batchtransform/batch", data=batch_request("a", "b", "c"))
+    finally:
+        app.config["TRX_BATCH_MAX_ENTITIES"] = 1000
+
+    assert response.status_code == 413
@@ -0,0 +1,33 @@
+import json
+
+from benchmarks import hot_path
+
+
+def test_benchmarks_write_comparable_results(tmp_path, capsys):
+    previous_path = tmp_path / "previous.json"
+    hot_path.main(["--quick", "--filter", "_1_", "--output", str(previous_path)])
+
+    previous = json.loads(previous_path.read_text())
+    assert set(previous["benchmarks"]) == {"return_output_1_etree", "return_output_1_string"}
+    assert all(result["best"] > 0 for result in previous["benchmarks"].values())
+
+    capsys.readouterr()
+    hot_path.main(["--quick", "--filter", "parse_small", "--compare", str(previous_path)])
+
+    assert "parse_small_etree" in capsys.readouterr().out
+
+
+def test_benchmarks_cover_the_hot_path():
+    results = hot_path.run(quick=True)
+
+    assert {"parse_large_etree", "return_output_100_string", "transform_runner_100",
+            "registry_local_mtz"} <= set(results["benchmarks"])
+
+
+def test_benchmarks_remove_their_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(hot_path.tempfile, "tempdir", str(tmp_path))
+
+    results = hot_path.run("registry", quick=True)
+
+    assert "registry_local_mtz" in results["benchmarks"]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+
+from maltego_trx.asgi import TransformASGIApp
+from maltego_trx.cache import LRUCache, ResponseCache, make_cache_key
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_asgi import call
+from tests.test_request_parser import make_request, make_entity, make_fields
+
+
+class CountingTransform(DiscoverableTransform):
+    calls = 0
+
+    @classmethod
+    def create_entities(cls, request, response):
+        cls.calls += 1
+        response.addEntity("maltego.Phrase", f"{request.Value} {request.getProperty('mode')}")
+
+
+class RandomTransform(CountingTransform):
+    cacheable = False
+    calls = 0
+
+
+class ShortLivedTransform(CountingTransform):
+    cache_ttl = 0.05
+    calls = 0
+
+
+class FailingCountingTransform(CountingTransform):
+    calls = 0
+
+    @classmethod
+    def create_entities(cls, request, response):
+        cls.calls += 1
+        raise ValueError("upstream failed")
+
+
+def request_body(value="paterva.com", mode="fast", weight="0"):
+    return make_request([make_entity(value=value, weight=weight, fields=make_fields(("mode", mode)))])
+
+
+@pytest.fixture
+def client():
+    for transform in (CountingTransform, RandomTransform, ShortLivedTransform, FailingCountingTransform):
+        register_transform_function(transform)
+        transform.calls = 0
+
+    app.config["TRX_RESPONSE_CACHE"] = ResponseCache()
+    with app.test_client() as client:
+        yield client
+    app.config["TRX_RESPONSE_CACHE"] = None
+
+
+def post(client, transform_name, body):
+    response = client.post(f"/run/{transform_name}/", data=body)
+    assert response.status_code == 200
+    return response.data.decode("utf8")
+
+
+def test_repeated_request_is_cached(client, mocker):
+    first = post(client, "countingtransform", request_body())
+
+    parse = mocker.spy(MaltegoMsg, "__init__")
+    second = post(client, "countingtransform", request_body())
+
+    assert first == second
+    assert CountingTransform.calls == 1
+    assert parse.call_count == 0
+
+
+def test_normalized_request_is_cached(client):
+    post(client, "countingtransform", request_body(weight="0"))
+    post(client, "countingtransform", request_body(weight="50"))
+
+    assert CountingTransform.calls == 1
+
+
+def test_different_requests_are_not_shared(client):
+    post(client, "countingtransform", request_body(mode="fast"))
+    output = post(client, "countingtransform", request_body(mode="slow"))
+    post(client, "countingtransform", request_body(value="maltego.com"))
+
+    assert "paterva.com slow" in output
+    assert CountingTransform.calls == 3
+
+
+def test_transforms_can_opt_out(client):
+    post(client, "randomtransform", request_body())
+    post(client, "randomtransform", request_body())
+
+    assert RandomTransform.calls == 2
+
+
+def test_transform_ttl(client):
+    post(client, "shortlivedtransform", request_body())
+    time.sleep(0.06)
+    post(client, "shortlivedtransform", request_body())
+
+    assert ShortLivedTransform.calls == 2
+
+
+def test_errors_are_not_cached(client):
+    output = post(client, "failingcountingtransform", request_body())
+    post(client, "failingcountingtransform", request_body())
+
+    assert "PartialError" in output
+    assert FailingCountingTransform.calls == 2
+
+
+def test_asgi_app_uses_cache():
+    register_transform_function(CountingTransform)
+    CountingTransform.calls = 0
+    asgi_app = TransformASGIApp(cache=ResponseCache())
+
+    async def run_twice():
+        first = await call(asgi_app, "POST", "/run/countingtransform/", request_body().encode())
+        second = await call(asgi_app, "POST", "/run/countingtransform/", request_body(weight="1").encode())
+        return first, second
+
+    first, second = asyncio.run(run_twice())
+
+    assert first[2] == second[2]
+    assert CountingTransform.calls == 1
+
+
+def test_cache_properties_limit_the_key():
+    class ModeOnly(DiscoverableTransform):
+        cache_properties = ["mode"]
+
+    first = MaltegoMsg(make_request([make_entity(fields=make_fields(("mode", "a"), ("seen", "1")))]))
+    second = MaltegoMsg(make_request([make_entity(fields=make_fields(("mode", "a"), ("seen", "2")))]))
+
+    assert make_cache_key("modeonly", ModeOnly, first) == make_cache_key("modeonly", ModeOnly, second)
+    assert make_cache_key("other", DiscoverableTransform, first) != make_cache_key("other", DiscoverableTransform,
+                                                                                   second)
+
+
+def test_lru_cache_keeps_byte_budget():
+    cache = LRUCache(max_bytes=100)
+    cache.set("a", b"x" * 40)
+    cache.set("b", b"x" * 40)
+    cache.get("a")
+    cache.set("c", b"x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.size == 82
+
+    cache.set("too big", b"x" * 200)
+    assert cache.get("too big") is None
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache()
+    cache.set("a", b"value", ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from maltego_trx.asgi import TransformASGIApp
+from maltego_trx.coalesce import SingleFlight
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import run_transform, in_flight
+from maltego_trx.transform import DiscoverableTransform, AsyncDiscoverableTransform
+from tests.test_asgi import call
+from tests.test_cache import request_body
+
+release = threading.Event()
+
+
+class CoalescedTransform(DiscoverableTransform):
+    coalesce = True
+    calls = 0
+
+    @classmethod
+    def create_entities(cls, request, response):
+        cls.calls += 1
+        release.wait(5)
+        response.addEntity("maltego.Phrase", f"{request.Value} {cls.calls}")
+
+
+class UncoalescedTransform(CoalescedTransform):
+    coalesce = False
+    calls = 0
+
+
+class WindowedTransform(CoalescedTransform):
+    coalesce_window = 0.2
+    calls = 0
+
+
+class AsyncCoalescedTransform(AsyncDiscoverableTransform):
+    coalesce = True
+    calls = 0
+
+    @classmethod
+    async def create_entities(cls, request, response):
+        cls.calls += 1
+        await asyncio.sleep(0.1)
+        response.addEntity("maltego.Phrase", request.Value)
+
+
+@pytest.fixture(autouse=True)
+def transforms():
+    for transform in (CoalescedTransform, UncoalescedTransform, WindowedTransform, AsyncCoalescedTransform):
+        register_transform_function(transform)
+        transform.calls = 0
+    release.clear()
+    yield
+    release.set()
+
+
+def run_concurrently(transform_name, bodies):
+    results = []
+    threads = [threading.Thread(target=lambda body=body: results.append(
+        run_transform(transform_name, MaltegoMsg(body))[0])) for body in bodies]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_requests_run_once():
+    results = run_concurrently("coalescedtransform", [request_body()] * 10)
+
+    assert CoalescedTransform.calls == 1
+    assert len(results) == 10
+    assert len(set(results)) == 1
+    assert len(in_flight) == 0
+
+
+def test_different_requests_run_separately():
+    run_concurrently("coalescedtransform", [request_body(value="a.com"), request_body(value="b.com")])
+
+    assert CoalescedTransform.calls == 2
+
+
+def test_transforms_without_coalesce_run_every_time():
+    run_concurrently("uncoalescedtransform", [request_body()] * 3)
+
+    assert UncoalescedTransform.calls == 3
+
+
+def test_window_shares_finished_call():
+    release.set()
+    first = run_transform("windowedtransform", MaltegoMsg(request_body()))
+    second = run_transform("windowedtransform", MaltegoMsg(request_body()))
+    time.sleep(0.25)
+    third = run_transform("windowedtransform", MaltegoMsg(request_body()))
+
+    assert first == second != third
+    assert WindowedTransform.calls == 2
+
+
+def test_asgi_app_coalesces_requests():
+    async def run_many():
+        app = TransformASGIApp()
+        return await asyncio.gather(*(call(app, "POST", "/run/asynccoalescedtransform/", request_body().encode())
+                                      for _ in range(20)))
+
+    results = asyncio.run(run_many())
+
+    assert AsyncCoalescedTransform.calls == 1
+    assert len({body for _, _, body in results}) == 1
+
+
+def test_errors_are_shared_and_not_kept():
+    single_flight = SingleFlight()
+
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        single_flight.do("key", 10, fail)
+
+    assert len(single_flight) == 0
+    assert single_flight.do("key", 10, lambda: 42) == 42
+    assert single_flight.do("key", 10, lambda: 43) == 42
@@ -0,0 +1,169 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from maltego_trx import local_client
+from maltego_trx.daemon import DaemonAlreadyRunning, LocalTransformDaemon
+from maltego_trx.decorator_registry import TransformRegistry
+from maltego_trx.handler import handle_run
+from maltego_trx.local_client import UnsafeSocketPath, check_socket_path, get_socket_path, run_remote
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+
+__TESTDIR__ = os.path.dirname(__file__)
+
+
+class LocalGreeting(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", f"Hello {request.Value} {request.getProperty('title')}")
+
+
+register_transform_function(LocalGreeting)
+
+
+def start_daemon(socket_path):
+    daemon = LocalTransformDaemon(socket_path)
+    threading.Thread(target=daemon.serve_forever, args=(0.05,), daemon=True).start()
+    return daemon
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    socket_path = str(tmp_path / "sockets" / "project.sock")
+    daemon = start_daemon(socket_path)
+    yield socket_path
+    daemon.shutdown()
+    daemon.server_close()
+
+
+def test_daemon_output_matches_local_command(socket_path, capsys):
+    args = ["Alice", "title=Dr\\#1"]
+    handle_run("__main__", ["project.py", "local", "localgreeting", *args], app)
+    expected = capsys.readouterr().out
+
+    output = run_remote(socket_path, "LocalGreeting", args).decode("utf8")
+
+    assert output == expected
+    assert "Hello Alice Dr#1" in output
+
+
+def test_daemon_runs_requests_concurrently(socket_path):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(lambda idx: run_remote(socket_path, "localgreeting", [f"entity {idx}"]), range(20)))
+
+    assert all(f"Hello entity {idx}".encode() in output for idx, output in enumerate(outputs))
+
+
+def test_daemon_unknown_transform(socket_path):
+    output = run_remote(socket_path, "missing", ["value"])
+
+    assert b"Unable to find a transform matching 'missing'." in output
+
+
+def test_socket_directory_is_private(socket_path):
+    assert os.stat(os.path.dirname(socket_path)).st_mode & 0o777 == 0o700
+
+
+def test_second_daemon_is_refused(socket_path):
+    with pytest.raises(DaemonAlreadyRunning):
+        LocalTransformDaemon(socket_path)
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    socket_path = str(tmp_path / "project.sock")
+    # a daemon which was killed leaves its socket file behind
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as killed_daemon:
+        killed_daemon.bind(socket_path)
+    assert os.path.exists(socket_path)
+
+    daemon = start_daemon(socket_path)
+    try:
+        assert b"Hello Bob" in run_remote(socket_path, "localgreeting", ["Bob"])
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
+    assert not os.path.exists(socket_path)
+
+
+def test_client_without_daemon_runs_the_project(tmp_path, mocker):
+    execv = mocker.patch("maltego_trx.local_client.os.execv")
+    mocker.patch("maltego_trx.local_client.run_remote", side_effect=FileNotFoundError)
+
+    local_client.main(["project.py", "localgreeting", "Alice"])
+
+    execv.assert_called_once_with(sys.executable, [sys.executable, "project.py", "local", "localgreeting", "Alice"])
+
+
+def test_client_process_round_trip(tmp_path):
+    project_path = str(tmp_path / "project.py")
+    daemon = start_daemon(get_socket_path(project_path))
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "maltego_trx.local_client", project_path, "localgreeting", "Carol"],
+            capture_output=True, cwd=os.path.dirname(__TESTDIR__), timeout=30,
+        )
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
+
+    assert result.returncode == 0
+    assert b"Hello Carol" in result.stdout
+
+
+def test_socket_of_another_user_is_refused(socket_path, mocker):
+    check_socket_path(socket_path)
+    mocker.patch("maltego_trx.local_client.os.getuid", return_value=os.getuid() + 1)
+
+    with pytest.raises(UnsafeSocketPath):
+        check_socket_path(socket_path)
+    with pytest.raises(UnsafeSocketPath):
+        LocalTransformDaemon(socket_path)
+
+
+def test_client_with_unsafe_socket_runs_the_project(socket_path, mocker, monkeypatch):
+    monkeypatch.setattr(local_client, "get_socket_path", lambda project_path: socket_path)
+    execv = mocker.patch("maltego_trx.local_client.os.execv")
+    run_remote_spy = mocker.spy(local_client, "run_remote")
+    os.chmod(os.path.dirname(socket_path), 0o755)
+
+    local_client.main(["project.py", "localgreeting", "Alice"])
+
+    assert run_remote_spy.call_count == 0
+    execv.assert_called_once_with(sys.executable, [sys.executable, "project.py", "local", "localgreeting", "Alice"])
+
+
+def test_client_without_unix_sockets_runs_the_project(mocker):
+    mocker.patch("maltego_trx.local_client.daemon_supported", return_value=False)
+    get_socket_path_mock = mocker.patch("maltego_trx.local_client.get_socket_path")
+    execv = mocker.patch("maltego_trx.local_client.os.execv")
+
+    local_client.main(["project.py", "localgreeting", "Alice"])
+
+    assert get_socket_path_mock.call_count == 0
+    execv.assert_called_once_with(sys.executable, [sys.executable, "project.py", "local", "localgreeting", "Alice"])
+
+
+def test_socket_in_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+    assert os.path.dirname(get_socket_path("project.py")) == str(tmp_path / "maltego-trx")
+
+
+def test_local_mtz_with_daemon():
+    registry = TransformRegistry(owner="", author="", host_url="", seed_ids=[])
+
+    @registry.register_transform("", "", "")
+    class DaemonTransform:
+        pass
+
+    files = dict(registry._create_local_mtz(working_dir="/home/maltego", daemon=True))
+
+    settings = files["TransformRepositories/Local/daemontransform.transformsettings"]
+    assert "-m maltego_trx.local_client project.py daemontransform" in settings
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from maltego_trx.deadline import Deadline, DeadlineExceeded, DEADLINE_MESSAGE
+from maltego_trx.decorator_registry import TransformRegistry
+from maltego_trx.maltego import MaltegoMsg, MaltegoTransform
+from maltego_trx.transform import DiscoverableTransform, AsyncDiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+hung_upstream = threading.Event()
+
+
+class HangingTransform(DiscoverableTransform):
+    timeout = 0.2
+    stopped = threading.Event()
+
+    @classmethod
+    def create_entities(cls, request, response):
+        for idx in range(3):
+            response.addEntity("maltego.Phrase", f"Entity {idx}")
+
+        hung_upstream.wait(5)
+        try:
+            response.addEntity("maltego.Phrase", "too late")
+        except DeadlineExceeded:
+            cls.stopped.set()
+            raise
+
+
+class CooperativeTransform(DiscoverableTransform):
+    timeout = 0.2
+
+    @classmethod
+    def create_entities(cls, request, response):
+        idx = 0
+        while True:
+            response.addEntity("maltego.Phrase", f"Entity {idx}")
+            idx += 1
+            time.sleep(0.01)
+
+
+class FastTransform(DiscoverableTransform):
+    timeout = 5
+
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", f"{response.deadline.remaining():.0f}")
+
+
+class FailingTransform(DiscoverableTransform):
+    timeout = 5
+
+    @classmethod
+    def create_entities(cls, request, response):
+        raise ValueError("upstream failed")
+
+
+class AsyncHangingTransform(AsyncDiscoverableTransform):
+    timeout = 0.2
+
+    @classmethod
+    async def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", "before")
+        await asyncio.sleep(5)
+        response.addEntity("maltego.Phrase", "after")
+
+
+def run(transform):
+    return transform.run_transform(MaltegoMsg(read_test_request()))
+
+
+def test_hanging_transform_returns_partial_results():
+    start = time.monotonic()
+    output = run(HangingTransform)
+
+    assert time.monotonic() - start < 1
+    assert output.count("<Entity ") == 3
+    assert DEADLINE_MESSAGE in output
+    assert 'MessageType="PartialError"' in output
+
+    hung_upstream.set()
+    assert HangingTransform.stopped.wait(5)
+
+
+def test_transform_is_stopped_at_the_next_entity():
+    output = run(CooperativeTransform)
+
+    assert 5 < output.count("<Entity ") < 30
+    assert DEADLINE_MESSAGE in output
+
+
+def test_transform_within_its_deadline():
+    output = run(FastTransform)
+
+    assert "<Value>5</Value>" in output
+    assert "PartialError" not in output
+
+
+def test_exceptions_are_raised():
+    with pytest.raises(ValueError):
+        run(FailingTransform)
+
+
+def test_async_transform_is_cancelled():
+    start = time.monotonic()
+    output = run(AsyncHangingTransform)
+
+    assert time.monotonic() - start < 1
+    assert "<Value>before</Value>" in output
+    assert "after" not in output
+    assert DEADLINE_MESSAGE in output
+
+
+def test_deadline():
+    deadline = Deadline(0.05)
+    assert not deadline.expired()
+    assert 0 < deadline.remaining() <= 0.05
+
+    time.sleep(0.06)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_deadline_without_timeout():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+
+    deadline.cancel()
+    assert deadline.expired()
+
+    response = MaltegoTransform(deadline=deadline)
+    with pytest.raises(DeadlineExceeded):
+        response.addEntity("maltego.Phrase", "cancelled")
+
+
+def test_timeout_can_be_registered():
+    registry = TransformRegistry(owner="Maltego", author="Maltego", host_url="localhost", seed_ids=["demo"])
+
+    @registry.register_transform(display_name="Timed", input_entity="maltego.Phrase", description="", timeout=3)
+    class TimedTransform(DiscoverableTransform):
+        pass
+
+    assert TimedTransform.timeout == 3
+    assert DiscoverableTransform.timeout is None
@@ -0,0 +1,116 @@
+import pytest
+
+from maltego_trx.maltego import MaltegoTransform, MaltegoMsg, SERIALIZER_STRING, SERIALIZER_ETREE
+from maltego_trx.overlays import OverlayPosition, OverlayType
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+
+def add_duplicates(response):
+    first = response.addEntity("maltego.Domain", "paterva.com")
+    first.addProperty("whois", "Whois", "loose", "first")
+    first.addProperty("source", "Source", "loose", "a")
+    first.addDisplayInformation("<p>from a</p>", "Source")
+    first.addOverlay("source", OverlayPosition.NORTH, OverlayType.TEXT)
+
+    response.addEntity("maltego.Phrase", "paterva.com")
+
+    second = response.addEntity("maltego.Domain", "paterva.com")
+    second.setWeight(50)
+    second.setIconURL("https://example.com/icon.png")
+    second.addProperty("whois", "Whois", "loose", "")
+    second.addProperty("source", "Source", "loose", "b")
+    second.addProperty("registrar", "Registrar", "loose", "registrar")
+    second.addDisplayInformation("<p>from a</p>", "Source")
+    second.addDisplayInformation("<p>from b</p>", "Source")
+    second.addOverlay("registrar", OverlayPosition.NORTH, OverlayType.TEXT)
+    second.addOverlay("#45e06f", OverlayPosition.SOUTH, OverlayType.COLOUR)
+    return first, second
+
+
+def test_duplicates_are_merged():
+    response = MaltegoTransform(deduplicate=True)
+    add_duplicates(response)
+
+    domain, phrase = response.iter_entities()
+
+    assert phrase.entityType == "maltego.Phrase"
+    assert domain.weight == 50
+    assert domain.iconURL == "https://example.com/icon.png"
+    assert domain.additionalFields == [
+        ("whois", "Whois", "loose", "first"),
+        ("source", "Source", "loose", "b"),
+        ("registrar", "Registrar", "loose", "registrar"),
+    ]
+    assert domain.displayInformation == [("Source", "<p>from a</p>"), ("Source", "<p>from b</p>")]
+    assert domain.overlays == [("registrar", "N", "text"), ("#45e06f", "S", "colour")]
+
+
+def test_display_information_lists_are_merged():
+    response = MaltegoTransform(deduplicate=True)
+    first = response.addEntity("maltego.Domain", "paterva.com")
+    first.displayInformation = [["Source", "<p>from a</p>"]]
+    second = response.addEntity("maltego.Domain", "paterva.com")
+    second.displayInformation = [["Source", "<p>from a</p>"], ["Source", "<p>from b</p>"]]
+
+    [merged] = response.iter_entities()
+
+    assert [tuple(info) for info in merged.displayInformation] == [
+        ("Source", "<p>from a</p>"), ("Source", "<p>from b</p>")
+    ]
+    assert response.returnOutput().count("from a") == 1
+
+
+def test_added_entities_are_unchanged():
+    response = MaltegoTransform(deduplicate=True)
+    first, second = add_duplicates(response)
+
+    response.returnOutput()
+
+    assert len(response.entities) == 3
+    assert first.weight == 100
+    assert first.additionalFields == [("whois", "Whois", "loose", "first"), ("source", "Source", "loose", "a")]
+
+
+def test_entities_with_different_strict_properties_are_not_merged():
+    response = MaltegoTransform(deduplicate=True)
+    response.addEntity("maltego.Domain", "paterva.com").addProperty("id", "ID", "strict", "1")
+    response.addEntity("maltego.Domain", "paterva.com").addProperty("id", "ID", "strict", "2")
+    response.addEntity("maltego.Domain", "paterva.com").addProperty("id", "ID", "strict", "1")
+
+    assert [entity.additionalFields for entity in response.iter_entities()] == [
+        [("id", "ID", "strict", "1")],
+        [("id", "ID", "strict", "2")],
+    ]
+
+
+def test_entities_are_not_merged_by_default():
+    response = MaltegoTransform()
+    add_duplicates(response)
+
+    assert len(response.iter_entities()) == 3
+
+
+@pytest.mark.parametrize("serializer", [SERIALIZER_ETREE, SERIALIZER_STRING])
+def test_serializers_write_merged_entities(serializer):
+    response = MaltegoTransform(serializer=serializer, deduplicate=True)
+    add_duplicates(response)
+
+    expected = MaltegoTransform(serializer=serializer)
+    expected.entities = response.iter_entities()
+
+    assert response.returnOutput() == expected.returnOutput()
+    assert response.returnOutput().count("<Entity ") == 2
+
+
+def test_deduplication_can_be_set_per_transform():
+    class DuplicateTransform(DiscoverableTransform):
+        deduplicate = True
+
+        @classmethod
+        def create_entities(cls, request, response):
+            add_duplicates(response)
+
+    output = DuplicateTransform.run_transform(MaltegoMsg(read_test_request()))
+
+    assert output.count("<Entity ") == 2
@@ -0,0 +1,64 @@
+import pickle
+
+from maltego_trx.maltego import MaltegoEntity
+from maltego_trx.overlays import OverlayPosition, OverlayType
+
+
+def test_entity_has_no_instance_dict():
+    entity = MaltegoEntity("maltego.Phrase", "Hello Spencer!")
+
+    assert not hasattr(entity, "__dict__")
+
+
+def test_entity_lists_are_allocated_lazily():
+    entity = MaltegoEntity("maltego.Phrase", "Hello Spencer!")
+
+    assert entity._additional_fields is None
+    assert entity._display_information is None
+    assert entity._overlays is None
+
+    entity.addProperty("fieldName", "Display Name", "strict", "value")
+    entity.addDisplayInformation("<p>content</p>", "Title")
+    entity.addOverlay("fieldName", OverlayPosition.NORTH, OverlayType.TEXT)
+
+    assert entity.additionalFields == [("fieldName", "Display Name", "strict", "value")]
+    assert entity.displayInformation == [("Title", "<p>content</p>")]
+    assert entity.overlays == [("fieldName", "N", "text")]
+
+
+def test_entity_lists_can_be_changed_directly():
+    entity = MaltegoEntity("maltego.Phrase", "Hello Spencer!")
+
+    entity.additionalFields.append(["fieldName", "Display Name", "loose", "value"])
+    entity.displayInformation = [["Title", "content"]]
+
+    assert list(entity.iter_properties()) == [("fieldName", "Display Name", "loose", "value")]
+    assert list(entity.iter_display_information()) == [("Title", "content")]
+
+
+def test_entity_can_be_pickled():
+    entity = MaltegoEntity("maltego.Phrase", "Hello Spencer!")
+    entity.addProperty("fieldName", "Display Name", "strict", "value")
+
+    copy = pickle.loads(pickle.dumps(entity))
+
+    assert copy.value == entity.value
+    assert copy.additionalFields == entity.additionalFields
+    assert copy._overlays is None
+
+
+class CustomEntity(MaltegoEntity):
+    __slots__ = ()
+
+
+def test_entity_pickle_is_compact():
+    entity = CustomEntity("maltego.Phrase", "Hello Spencer!")
+    entity.addDisplayInformation("<p>content</p>", "Title")
+
+    data = pickle.dumps(entity)
+    copy = pickle.loads(data)
+
+    assert type(copy) is CustomEntity
+    assert copy.displayInformation == [("Title", "<p>content</p>")]
+    assert copy.weight == 100
+    assert b"_additional_fields" not in data
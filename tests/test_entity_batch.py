@@ -0,0 +1,105 @@
+import pytest
+
+from maltego_trx.maltego import MaltegoMsg, MaltegoTransform, SERIALIZER_STRING, SERIALIZER_ETREE
+from maltego_trx.server import EXCEPTION_MESSAGE
+from maltego_trx.transform import DiscoverableTransform
+
+VALUES = ["first", "second & <third>", None, 'quoted "value"']
+PROPERTIES = {
+    "index": [0, 1, 2, 3],
+    "source": ("a", None, "c\r\n", "d"),
+}
+WEIGHTS = [10, None, 30, 40]
+DISPLAY_NAMES = {"index": "Index"}
+MATCHING_RULES = {"index": "strict"}
+ICON_URL = "https://maltego.com/icon.png?size=1&type=2"
+
+
+def add_single_entities(response):
+    for idx, value in enumerate(VALUES):
+        entity = response.addEntity("maltego.Phrase", value)
+        entity.setWeight(WEIGHTS[idx])
+        entity.addProperty("index", "Index", "strict", PROPERTIES["index"][idx])
+        entity.addProperty("source", None, "loose", PROPERTIES["source"][idx])
+        entity.setIconURL(ICON_URL)
+
+
+def add_entity_batch(response):
+    response.addEntities("maltego.Phrase", VALUES, PROPERTIES, WEIGHTS, DISPLAY_NAMES, MATCHING_RULES, ICON_URL)
+
+
+@pytest.mark.parametrize("serializer", [SERIALIZER_ETREE, SERIALIZER_STRING])
+@pytest.mark.parametrize("indent", [True, False])
+def test_entity_batch_matches_single_entities(serializer, indent):
+    expected = MaltegoTransform(serializer=serializer)
+    add_single_entities(expected)
+
+    actual = MaltegoTransform(serializer=serializer)
+    add_entity_batch(actual)
+
+    assert actual.returnOutput(indent=indent) == expected.returnOutput(indent=indent)
+
+
+def test_entity_batch_serializers_match():
+    etree_response = MaltegoTransform(serializer=SERIALIZER_ETREE)
+    string_response = MaltegoTransform(serializer=SERIALIZER_STRING)
+
+    for response in (etree_response, string_response):
+        response.addEntity("maltego.Domain", "maltego.com").addProperty("fqdn", "Domain", "strict", "maltego.com")
+        add_entity_batch(response)
+        response.addEntities("maltego.Phrase", [])
+        response.addEntities("maltego.Phrase", iter(["a", "b"]))
+        response.addUIMessage("done")
+
+    assert string_response.returnOutput() == etree_response.returnOutput()
+
+
+def test_entity_records():
+    records = [
+        {"value": value, "index": PROPERTIES["index"][idx], "source": PROPERTIES["source"][idx], "weight": WEIGHTS[idx]}
+        for idx, value in enumerate(VALUES)
+    ]
+
+    expected = MaltegoTransform(serializer=SERIALIZER_STRING)
+    add_entity_batch(expected)
+
+    actual = MaltegoTransform(serializer=SERIALIZER_STRING)
+    batch = actual.addEntityRecords("maltego.Phrase", iter(records), weight_field="weight",
+                                    display_names=DISPLAY_NAMES, matching_rules=MATCHING_RULES, icon_url=ICON_URL)
+
+    assert len(batch) == len(VALUES)
+    assert [name for name, _, _, _ in batch.properties] == ["index", "source"]
+    assert actual.returnOutput() == expected.returnOutput()
+
+
+def test_entity_records_without_records():
+    response = MaltegoTransform(serializer=SERIALIZER_STRING)
+    response.addEntityRecords("maltego.Phrase", [])
+
+    assert response.returnOutput() == MaltegoTransform(serializer=SERIALIZER_STRING).returnOutput()
+
+
+def test_entity_batch_column_length_mismatch():
+    response = MaltegoTransform()
+
+    with pytest.raises(ValueError, match="Column 'index' has 2 rows, but there are 4 values"):
+        response.addEntities("maltego.Phrase", VALUES, {"index": [1, 2]})
+
+
+def test_streamed_transform_sends_entity_batches():
+    class StreamedBatchTransform(DiscoverableTransform):
+        stream = True
+        stream_chunk_size = 2
+
+        @classmethod
+        def create_entities(cls, request, response):
+            add_single_entities(response)
+            add_entity_batch(response)
+
+    expected = MaltegoTransform(serializer=SERIALIZER_STRING)
+    add_single_entities(expected)
+    add_entity_batch(expected)
+
+    chunks = StreamedBatchTransform.stream_transform(MaltegoMsg(LocalArgs=["input"]), EXCEPTION_MESSAGE)
+
+    assert "".join(chunks) == expected.returnOutput()
@@ -0,0 +1,108 @@
+import pytest
+
+from maltego_trx.maltego import MaltegoTransform, MaltegoMsg, EntityLimitReached
+from maltego_trx.streaming import stream_transform
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import make_request
+
+
+def add_entities(response, count):
+    for idx in range(count):
+        response.addEntity("maltego.Phrase", f"Entity {idx}")
+
+
+def test_remaining_entities():
+    response = MaltegoTransform(limit=5)
+    assert response.remaining == 5
+    assert not response.is_full()
+
+    add_entities(response, 3)
+    assert response.remaining == 2
+
+    add_entities(response, 2)
+    assert response.remaining == 0
+    assert response.is_full()
+
+
+def test_no_limit():
+    response = MaltegoTransform()
+    add_entities(response, 100)
+
+    assert response.remaining is None
+    assert not response.is_full()
+
+
+def test_entities_over_the_limit_are_ignored():
+    response = MaltegoTransform(limit=3)
+    add_entities(response, 5)
+
+    entity = response.addEntity("maltego.Phrase", "ignored")
+    entity.addProperty("still", "Still", "loose", "works")
+
+    assert [entity.value for entity in response.entities] == ["Entity 0", "Entity 1", "Entity 2"]
+    assert "ignored" not in response.returnOutput()
+
+
+def test_entities_over_the_limit_raise():
+    response = MaltegoTransform(limit=3, raise_on_limit=True)
+    add_entities(response, 3)
+
+    with pytest.raises(EntityLimitReached):
+        response.addEntity("maltego.Phrase", "too many")
+
+
+def test_batches_count_towards_the_limit():
+    response = MaltegoTransform(limit=5)
+    add_entities(response, 2)
+
+    batch = response.addEntities("maltego.Phrase", ["a", "b", "c", "d"], {"name": ["A", "B", "C", "D"]},
+                                 weights=[1, 2, 3, 4])
+
+    assert batch.values == ["a", "b", "c"]
+    assert batch.weights == [1, 2, 3]
+    assert batch.properties[0][3] == ["A", "B", "C"]
+    assert response.is_full()
+    assert len(response.addEntities("maltego.Phrase", ["e"])) == 0
+
+
+class LimitedTransform(DiscoverableTransform):
+    enforce_limit = True
+    pages = 0
+
+    @classmethod
+    def create_entities(cls, request, response):
+        # an endless upstream is only paged until the response is full
+        while True:
+            cls.pages += 1
+            add_entities(response, 5)
+
+
+def test_transform_stops_at_the_slider():
+    request = MaltegoMsg(make_request(soft_limit="12"))
+
+    output = LimitedTransform.run_transform(request)
+
+    assert output.count("<Entity ") == 12
+    assert LimitedTransform.pages == 3
+
+
+def test_limit_is_not_enforced_by_default():
+    class UnlimitedTransform(DiscoverableTransform):
+        @classmethod
+        def create_entities(cls, request, response):
+            add_entities(response, 20)
+
+    output = UnlimitedTransform.run_transform(MaltegoMsg(make_request(soft_limit="12")))
+
+    assert output.count("<Entity ") == 20
+
+
+def test_streamed_transform_stops_at_the_limit():
+    def create_entities(request, response):
+        while True:
+            add_entities(response, 7)
+
+    output = "".join(stream_transform(create_entities, None, chunk_size=10, error_message="failed", limit=25))
+
+    assert output.count("<Entity ") == 25
+    assert "failed" not in output
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from maltego_trx import executor
+from maltego_trx.executor import BoundedExecutor, TransformSaturated, set_limits
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import SATURATED_MESSAGE, app, run_transform
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+release = threading.Event()
+
+
+class BlockingTransform(DiscoverableTransform):
+    max_concurrency = 2
+    queue_depth = 1
+
+    @classmethod
+    def create_entities(cls, request, response):
+        release.wait(5)
+        response.addEntity("maltego.Phrase", threading.current_thread().name)
+
+
+def blocking_function(request):
+    release.wait(5)
+    return "done"
+
+
+class UnlimitedTransform(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", threading.current_thread().name)
+
+
+@pytest.fixture(autouse=True)
+def transforms():
+    for transform in (BlockingTransform, blocking_function, UnlimitedTransform):
+        register_transform_function(transform)
+    release.clear()
+
+    yield
+
+    release.set()
+    executor.shutdown()
+    executor.transform_limits.clear()
+
+
+def start_calls(transform_name, count):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(run_transform(transform_name, MaltegoMsg(read_test_request()))))
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_pending(transform_name, count):
+    deadline = time.monotonic() + 5
+    while transform_name not in executor.executors or executor.executors[transform_name].pending < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_saturated_transform_returns_partial_error_immediately():
+    threads, results = start_calls("blockingtransform", 3)
+    wait_for_pending("blockingtransform", 3)
+
+    start = time.monotonic()
+    output, status = run_transform("blockingtransform", MaltegoMsg(read_test_request()))
+
+    assert time.monotonic() - start < 0.5
+    assert status == 200
+    assert 'MessageType="PartialError"' in output
+    assert SATURATED_MESSAGE in output
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 3
+    assert all("maltego-trx-blockingtransform" in output for output, _ in results)
+    assert executor.executors["blockingtransform"].pending == 0
+
+
+def test_limits_can_be_set_by_name():
+    set_limits("Blocking_Function", 1)
+
+    threads, results = start_calls("blocking-function", 1)
+    wait_for_pending("blocking-function", 1)
+
+    output, _ = run_transform("blocking-function", MaltegoMsg(read_test_request()))
+    assert SATURATED_MESSAGE in output
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [("done", 200)]
+
+
+def test_transforms_without_limit_run_on_the_request_thread():
+    output, _ = run_transform("unlimitedtransform", MaltegoMsg(read_test_request()))
+
+    assert threading.current_thread().name in output
+    assert "unlimitedtransform" not in executor.executors
+
+
+def test_saturated_transform_through_flask():
+    threads, _ = start_calls("blockingtransform", 3)
+    wait_for_pending("blockingtransform", 3)
+
+    with app.test_client() as client:
+        response = client.post("/run/blockingtransform/", data=read_test_request())
+
+    assert response.status_code == 200
+    assert SATURATED_MESSAGE in response.data.decode("utf8")
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_bounded_executor_releases_failed_calls():
+    bounded = BoundedExecutor(1, name="failing")
+
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        bounded.submit(fail).result()
+
+    assert bounded.pending == 0
+    assert bounded.submit(lambda: 42).result() == 42
+
+    gate = threading.Event()
+    blocked = bounded.submit(gate.wait)
+    with pytest.raises(TransformSaturated):
+        bounded.submit(lambda: 42)
+
+    gate.set()
+    blocked.result()
+    bounded.shutdown()
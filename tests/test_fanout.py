@@ -0,0 +1,101 @@
+import threading
+from xml.etree import ElementTree
+
+import pytest
+
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+barrier = threading.Barrier(3, timeout=5)
+
+
+class FirstFanout(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        barrier.wait()
+        request.Properties["changed"] = "by first"
+        response.addEntity("maltego.Phrase", f"first {request.Value}")
+        response.addUIMessage("first done")
+
+
+class SecondFanout(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        barrier.wait()
+        response.addEntity("maltego.Phrase", f"second {request.Value} {request.getProperty('changed')}")
+
+
+class FailingFanout(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        barrier.wait()
+        raise ValueError("upstream failed")
+
+
+@pytest.fixture
+def client():
+    for transform in (FirstFanout, SecondFanout, FailingFanout):
+        register_transform_function(transform)
+    barrier.reset()
+    with app.test_client() as client:
+        yield client
+
+
+def fanout(client, transforms, response_format=None):
+    query = {"transforms": transforms}
+    if response_format:
+        query["format"] = response_format
+    return client.post("/fanout", query_string=query, data=read_test_request())
+
+
+def test_keyed_fanout_runs_transforms_concurrently(client, mocker):
+    parse = mocker.spy(MaltegoMsg, "__init__")
+
+    response = fanout(client, "firstfanout,SecondFanout,failingfanout")
+
+    assert response.status_code == 200
+    assert parse.call_count == 1
+
+    results = response.get_json()["results"]
+    assert set(results) == {"firstfanout", "secondfanout", "failingfanout"}
+    assert "first paterva.com" in results["firstfanout"]["output"]
+    assert "second paterva.com None" in results["secondfanout"]["output"]
+    assert "PartialError" in results["failingfanout"]["output"]
+
+
+def test_combined_fanout(client):
+    response = fanout(client, "firstfanout,secondfanout,failingfanout", "combined")
+
+    assert response.status_code == 200
+    message = ElementTree.fromstring(response.data)
+    values = [value.text for value in message.iter("Value")]
+    ui_messages = [ui_message.get("MessageType") for ui_message in message.iter("UIMessage")]
+    assert values == ["first paterva.com", "second paterva.com None"]
+    assert ui_messages == ["Inform", "PartialError"]
+
+
+@pytest.mark.parametrize("transforms, response_format, status", [
+    ("", None, 400),
+    ("firstfanout", "xml", 400),
+    ("firstfanout,missing", None, 404),
+])
+def test_invalid_fanout_requests(client, transforms, response_format, status):
+    assert fanout(client, transforms, response_format).status_code == status
+
+
+@pytest.mark.parametrize("data", ["<MaltegoMessage>", "<MaltegoMessage></MaltegoMessage>"])
+def test_invalid_fanout_request_body(client, data):
+    response = client.post("/fanout", query_string={"transforms": "firstfanout"}, data=data)
+
+    assert response.status_code == 400
+
+
+def test_fanout_size_is_limited(client):
+    app.config["TRX_FANOUT_MAX_TRANSFORMS"] = 1
+    try:
+        assert fanout(client, "firstfanout,secondfanout").status_code == 413
+    finally:
+        app.config["TRX_FANOUT_MAX_TRANSFORMS"] = 20
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+__ROOTDIR__ = os.path.dirname(os.path.dirname(__file__))
+
+# cumulative import time in microseconds, about twice what maltego_trx.handler takes, Flask alone takes longer
+IMPORT_BUDGET = 200_000
+
+# only needed by the web server, the ASGI app, async transforms, the process pool and OAuth secrets
+HEAVY_MODULES = ["flask", "werkzeug", "cryptography", "requests", "asyncio", "multiprocessing"]
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module `import <module>` imports, parsed from -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=__ROOTDIR__, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", [
+    "maltego_trx.maltego",
+    "maltego_trx.runner",
+    "maltego_trx.handler",
+    "maltego_trx.commands",
+    "maltego_trx.oauth",
+])
+def test_import_time(module):
+    times = import_times(module)
+
+    assert module in times
+    assert [name for name in times if name.split(".")[0] in HEAVY_MODULES] == []
+    assert times[module] < IMPORT_BUDGET
+
+
+def test_server_imports_flask():
+    assert "flask" in import_times("maltego_trx.server")
@@ -0,0 +1,112 @@
+import pytest
+
+from maltego_trx import instrumentation
+from maltego_trx.instrumentation import EXECUTE, NO_SPAN, PARSE, SERIALIZE, collect_timings, span
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+
+class TimedGreeting(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+        response.addEntity("maltego.Phrase", "Hello again")
+
+
+class LimitedTimedGreeting(TimedGreeting):
+    max_concurrency = 1
+
+
+def timed_function(request):
+    return TimedGreeting.run_transform(request)
+
+
+for transform in (TimedGreeting, LimitedTimedGreeting, timed_function):
+    register_transform_function(transform)
+
+
+@pytest.fixture
+def spans():
+    spans = []
+
+    def hook(phase, transform_name, duration, size):
+        spans.append((phase, transform_name, size))
+
+    instrumentation.add_hook(hook)
+    yield spans
+    instrumentation.remove_hook(hook)
+
+
+def test_span_without_hooks_is_a_no_op():
+    assert span(PARSE, "timedgreeting") is NO_SPAN
+
+    with span(PARSE, "timedgreeting") as parse_span:
+        parse_span.size = 10
+
+    with collect_timings() as timings:
+        with span(PARSE, "timedgreeting"):
+            pass
+    assert [phase for phase, _, _ in timings] == [PARSE]
+
+
+def test_hooks_get_the_phases_of_a_request(spans):
+    request = read_test_request()
+    with app.test_client() as client:
+        response = client.post("/run/timedgreeting/", data=request)
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert spans == [
+        (PARSE, "timedgreeting", len(request)),
+        (EXECUTE, "timedgreeting", 2),
+        (SERIALIZE, "timedgreeting", len(response.get_data(as_text=True))),
+    ]
+
+
+def test_failing_hook_does_not_fail_the_transform(spans):
+    def failing_hook(phase, transform_name, duration, size):
+        raise ValueError("hook failed")
+
+    instrumentation.add_hook(failing_hook)
+    try:
+        with app.test_client() as client:
+            response = client.post("/run/timedgreeting/", data=read_test_request())
+    finally:
+        instrumentation.remove_hook(failing_hook)
+
+    assert b"Hello again" in response.data
+    assert len(spans) == 3
+
+
+@pytest.mark.parametrize("transform_name", ["timedgreeting", "limitedtimedgreeting"])
+def test_server_timing_header(transform_name):
+    app.config["TRX_SERVER_TIMING"] = True
+    try:
+        with app.test_client() as client:
+            response = client.post(f"/run/{transform_name}/", data=read_test_request())
+    finally:
+        app.config["TRX_SERVER_TIMING"] = False
+
+    phases = [metric.split(";")[0] for metric in response.headers["Server-Timing"].split(", ")]
+    assert phases == [PARSE, EXECUTE, SERIALIZE]
+    assert all(";dur=" in metric for metric in response.headers["Server-Timing"].split(", "))
+
+
+def test_server_timing_sums_phases():
+    timings = [(PARSE, 0.001), (EXECUTE, 0.002), (SERIALIZE, 0.0005), (EXECUTE, 0.003)]
+
+    assert instrumentation.format_server_timing(timings) == "parse;dur=1.000, execute;dur=5.000, serialize;dur=0.500"
+
+
+def test_transform_function_execute_span(spans):
+    with app.test_client() as client:
+        client.post("/run/timed-function/", data=read_test_request())
+
+    assert [(phase, transform_name) for phase, transform_name, _ in spans] == [
+        (PARSE, "timed-function"),
+        (EXECUTE, "timedgreeting"),
+        (SERIALIZE, "timedgreeting"),
+        (EXECUTE, "timed-function"),
+    ]
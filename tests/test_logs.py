@@ -0,0 +1,184 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from maltego_trx.handler import handle_run
+from maltego_trx.logs import JSONFormatter, LazyQueueHandler, RateLimitFilter, configure_logging, stop_logging
+from maltego_trx.maltego import MaltegoEntity, MaltegoTransform
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+
+class LoggedGreeting(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+
+
+register_transform_function(LoggedGreeting)
+
+
+class FailA(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        raise ValueError("upstream failed")
+
+
+class FailB(FailA):
+    @classmethod
+    def create_entities(cls, request, response):
+        raise ValueError("upstream failed")
+
+
+register_transform_function(FailA)
+register_transform_function(FailB)
+
+
+class CountingArg(object):
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "counted"
+
+
+@pytest.fixture
+def stream():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    yield stream, handler
+    stop_logging()
+
+
+def make_record(msg, level=logging.WARNING, name="maltego-trx"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_rate_limit_counts_suppressed_repeats(mocker):
+    now = mocker.patch("maltego_trx.logs.time.monotonic", return_value=100.0)
+    rate_limit = RateLimitFilter(interval=10)
+
+    assert rate_limit.filter(make_record("Entity has no Weight"))
+    assert not rate_limit.filter(make_record("Entity has no Weight"))
+    assert not rate_limit.filter(make_record("Entity has no Weight"))
+    assert rate_limit.filter(make_record("Entity has no Value"))
+    assert rate_limit.filter(make_record("Entity has no Weight", level=logging.INFO))
+    assert rate_limit.filter(make_record("Entity has no Weight", level=logging.ERROR))
+
+    now.return_value = 110.0
+    record = make_record("Entity has no Weight")
+    assert rate_limit.filter(record)
+    assert record.suppressed == 2
+
+
+def test_queue_handler_does_not_format_on_the_logging_thread():
+    handler = LazyQueueHandler(None)
+    arg = CountingArg()
+    record = logging.LogRecord("maltego-trx", logging.WARNING, __file__, 1, "value=%s", (arg,), None)
+
+    assert handler.prepare(record) is record
+    assert arg.formatted == 0
+    assert record.args == (arg,)
+
+
+def test_configure_logging_writes_in_the_background(stream):
+    stream, handler = stream
+    root_level = logging.getLogger().level
+    configure_logging(handler=handler, rate_limit=60)
+
+    for _ in range(50):
+        entity = MaltegoEntity("maltego.Phrase", "no weight")
+        entity.weight = None
+        entity.ensure_weight()
+    arg = CountingArg()
+    logging.getLogger("maltego.server").debug("dropped before queueing %s", arg)
+    stop_logging()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert "Entity has no Weight" in lines[0]
+    assert arg.formatted == 0
+    assert logging.getLogger().level == root_level
+    assert logging.getLogger("maltego-trx").propagate
+
+
+def test_suppressed_repeats_are_written(stream, mocker):
+    stream, handler = stream
+    now = mocker.patch("maltego_trx.logs.time.monotonic", return_value=100.0)
+    configure_logging(handler=handler, rate_limit=10)
+
+    response = MaltegoTransform()
+    for _ in range(3):
+        response.addUIMessage("", "")
+        list(response.iter_ui_messages())
+        response.UIMessages.clear()
+    now.return_value = 200.0
+    response.addUIMessage("", "")
+    list(response.iter_ui_messages())
+    stop_logging()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[1].endswith("(2 similar messages suppressed)")
+
+
+def test_errors_are_not_rate_limited(stream):
+    stream, handler = stream
+    configure_logging(handler=handler, rate_limit=60)
+
+    with app.test_client() as client:
+        client.post("/run/faila/", data=read_test_request())
+        client.post("/run/failb/", data=read_test_request())
+    stop_logging()
+
+    output = stream.getvalue()
+    assert output.count("An exception occurred while executing your transform code.") == 2
+    assert output.count("Traceback") == 2
+    assert output.count('raise ValueError("upstream failed")') == 2
+
+
+def test_json_request_records(stream):
+    stream, handler = stream
+    handler.setFormatter(JSONFormatter())
+    configure_logging(handler=handler)
+    app.config["TRX_REQUEST_LOG"] = True
+    try:
+        with app.test_client() as client:
+            client.post("/run/loggedgreeting/", data=read_test_request())
+    finally:
+        app.config["TRX_REQUEST_LOG"] = False
+    stop_logging()
+
+    [record] = [json.loads(line) for line in stream.getvalue().splitlines() if '"maltego.requests"' in line]
+    assert record["transform"] == "loggedgreeting"
+    assert record["status"] == 200
+    assert record["entities"] == 1
+    assert record["bytes"] > 0
+    assert record["duration_ms"] >= 0
+    assert record["message"].startswith("loggedgreeting 200 ")
+
+
+def test_importing_the_server_leaves_the_root_logger_alone():
+    code = "import logging, maltego_trx.server; root = logging.getLogger(); print(len(root.handlers), root.level)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60,
+                            cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    assert result.stdout.split() == ["0", str(logging.WARNING)]
+
+
+def test_development_server_logs_everything(mocker):
+    basic_config = mocker.patch("maltego_trx.handler.logging.basicConfig")
+    run = mocker.patch.object(app, "run")
+
+    handle_run("__main__", ["project.py", "runserver"], app)
+
+    basic_config.assert_called_once_with(level=logging.DEBUG)
+    assert run.call_count == 1
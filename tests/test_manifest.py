@@ -0,0 +1,143 @@
+import importlib
+import os
+import sys
+import textwrap
+
+import pytest
+
+from maltego_trx import manifest, registry
+from maltego_trx.handler import handle_run
+from maltego_trx.manifest import LazyTransform, get_manifest_path, load_manifest
+from maltego_trx.server import app
+from tests.test_request_parser import read_test_request
+
+MODULES = {
+    "LazyGreeting": '''
+        import sys
+        from maltego_trx.transform import DiscoverableTransform
+
+        sys.lazy_greeting_imported = True
+
+
+        class LazyGreeting(DiscoverableTransform):
+            @classmethod
+            def create_entities(cls, request, response):
+                response.addEntity("maltego.Phrase", "Hello lazily")
+    ''',
+    "LazyHelpers": '''
+        def helper():
+            pass
+    ''',
+    "LazyBroken": '''
+        class LazyBroken(
+    ''',
+    "LazyNotATransform": '''
+        class LazyNotATransform(object):
+            pass
+    ''',
+}
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    package_dir = tmp_path / "lazy_transforms"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("")
+    for name, source in MODULES.items():
+        (package_dir / f"{name}.py").write_text(textwrap.dedent(source))
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield importlib.import_module("lazy_transforms")
+
+    for name in list(sys.modules):
+        if name.startswith("lazy_transforms"):
+            del sys.modules[name]
+    for url_path in ("lazygreeting", "lazynotatransform", "lazyfailing"):
+        registry.mapping.pop(url_path, None)
+    registry.lazy_packages.clear()
+    if hasattr(sys, "lazy_greeting_imported"):
+        del sys.lazy_greeting_imported
+
+
+def test_manifest_lists_transform_modules(package):
+    assert load_manifest(package) == {"LazyGreeting": "LazyGreeting", "LazyNotATransform": "LazyNotATransform"}
+    assert os.path.exists(get_manifest_path(package))
+    assert "lazy_transforms.LazyGreeting" not in sys.modules
+
+
+def test_manifest_only_reads_changed_modules(package, mocker):
+    load_manifest(package)
+    find_transform_class = mocker.spy(manifest, "find_transform_class")
+
+    load_manifest(package)
+    assert find_transform_class.call_count == 0
+
+    module_path = os.path.join(package.__path__[0], "LazyHelpers.py")
+    with open(module_path, "a") as module_file:
+        module_file.write("\n\nclass LazyHelpers(dict):\n    pass\n")
+
+    assert load_manifest(package)["LazyHelpers"] == "LazyHelpers"
+    assert find_transform_class.call_count == 1
+
+    load_manifest(package, rebuild=True)
+    assert find_transform_class.call_count == 1 + len(MODULES)
+
+
+def test_lazy_transform_is_imported_on_first_request(package):
+    registry.register_lazy_transform_classes(package)
+
+    transform = registry.mapping["lazygreeting"]
+    assert isinstance(transform, LazyTransform)
+    assert transform.__name__ == "LazyGreeting"
+    assert not hasattr(sys, "lazy_greeting_imported")
+
+    with app.test_client() as client:
+        response = client.post("/run/lazygreeting/", data=read_test_request())
+
+    assert b"Hello lazily" in response.data
+    assert sys.lazy_greeting_imported
+    assert transform.load() is sys.modules["lazy_transforms.LazyGreeting"].LazyGreeting
+
+
+def test_lazy_transform_which_is_not_a_transform(package):
+    registry.register_lazy_transform_classes(package)
+
+    with pytest.raises(TypeError):
+        registry.mapping["lazynotatransform"].load()
+
+
+def test_lazy_transform_which_fails_to_import(package, caplog):
+    module_path = os.path.join(package.__path__[0], "LazyFailing.py")
+    with open(module_path, "w") as module_file:
+        module_file.write("import lazy_transforms_missing_dependency\n")
+    registry.mapping["lazyfailing"] = LazyTransform("lazy_transforms.LazyFailing", "LazyFailing")
+
+    with app.test_client() as client:
+        response = client.post("/run/lazyfailing/", data=read_test_request())
+
+    assert response.status_code == 200
+    assert b"PartialError" in response.data
+    assert "An exception occurred while executing your transform code." in caplog.messages
+    assert "lazy_transforms_missing_dependency" in caplog.text
+
+
+def test_manifest_command(package, capsys):
+    registry.register_lazy_transform_classes(package)
+    os.remove(get_manifest_path(package))
+
+    handle_run("__main__", ["project.py", "manifest"], app)
+
+    assert capsys.readouterr().out == "lazy_transforms: 2 transforms in the manifest\n"
+    assert os.path.exists(get_manifest_path(package))
+
+
+def test_register_transform_function_once(caplog):
+    def registered_once(request):
+        pass
+
+    registry.register_transform_function(registered_once)
+    registry.register_transform_function(registered_once)
+
+    assert registry.mapping["registered-once"] is registered_once
+    assert registry.transform_functions.count(registered_once) == 1
+    assert caplog.messages == ["Transform function already registered."]
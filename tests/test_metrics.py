@@ -0,0 +1,228 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from maltego_trx.asgi import TransformASGIApp
+from maltego_trx.metrics import (CONTENT_TYPE, ENTITIES, ERRORS, METRICS_ENV, MULTIPROCESS_DIR_ENV, REQUESTS,
+                                 RESPONSE_BYTES, Metrics, has_error_message)
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_asgi import call
+from tests.test_request_parser import read_test_request
+
+
+class MeteredGreeting(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", f"Hello {request.Value}")
+        response.addEntity("maltego.Phrase", "Hello again")
+
+
+class MeteredFailing(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        raise ValueError("upstream failed")
+
+
+class MeteredStream(DiscoverableTransform):
+    stream = True
+    stream_chunk_size = 2
+
+    @classmethod
+    def create_entities(cls, request, response):
+        for idx in range(5):
+            response.addEntity("maltego.Phrase", f"Entity {idx}")
+
+
+for transform in (MeteredGreeting, MeteredFailing, MeteredStream):
+    register_transform_function(transform)
+
+
+@pytest.fixture
+def metrics():
+    default_metrics, app.config["TRX_METRICS"] = app.config["TRX_METRICS"], Metrics()
+    yield app.config["TRX_METRICS"]
+    app.config["TRX_METRICS"] = default_metrics
+
+
+def test_observe_counts_requests_and_buckets():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("slow", 0.05, response_bytes=10, entities=2)
+    metrics.observe("slow", 0.5, response_bytes=20, entities=1, error=True)
+    metrics.observe("slow", 5.0)
+
+    assert metrics.snapshot()["slow"] == [3, 1, 3, 30, 5.55, 1, 1, 1]
+
+
+def test_render_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe('say "hi"', 0.05, response_bytes=10, entities=2)
+    metrics.observe('say "hi"', 0.5, error=True)
+
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE maltego_trx_requests_total counter" in lines
+    assert 'maltego_trx_requests_total{transform="say \\"hi\\""} 2' in lines
+    assert 'maltego_trx_errors_total{transform="say \\"hi\\""} 1' in lines
+    assert 'maltego_trx_entities_total{transform="say \\"hi\\""} 2' in lines
+    assert 'maltego_trx_response_bytes_total{transform="say \\"hi\\""} 10' in lines
+    assert "# TYPE maltego_trx_request_duration_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("maltego_trx_request_duration_seconds")] == [
+        'maltego_trx_request_duration_seconds_bucket{transform="say \\"hi\\"",le="0.1"} 1',
+        'maltego_trx_request_duration_seconds_bucket{transform="say \\"hi\\"",le="1.0"} 2',
+        'maltego_trx_request_duration_seconds_bucket{transform="say \\"hi\\"",le="+Inf"} 2',
+        'maltego_trx_request_duration_seconds_sum{transform="say \\"hi\\""} 0.55',
+        'maltego_trx_request_duration_seconds_count{transform="say \\"hi\\""} 2',
+    ]
+
+
+def test_observe_response_counts_entities_bytes_and_errors():
+    metrics = Metrics()
+    metrics.observe_response("greeting", 0.01, '<Entity Type="a"/><Entity Type="b"/><UIMessages></UIMessages>', 200, 2)
+    metrics.observe_response("greeting", 0.01, b'<Entity Type="a"/><UIMessages/>', 200, 1)
+    metrics.observe_response("greeting", 0.01, '<UIMessages><UIMessage MessageType="PartialError">failed</UIMessage>'
+                                               '</UIMessages>')
+
+    counts = metrics.snapshot()["greeting"]
+    assert counts[REQUESTS] == 3
+    assert counts[ERRORS] == 1
+    assert counts[ENTITIES] == 3
+    assert counts[RESPONSE_BYTES] == 61 + 31 + 81
+
+
+def test_error_messages_are_only_searched_in_the_ui_messages():
+    assert not has_error_message('<Value>MessageType="PartialError"</Value><UIMessages></UIMessages>')
+    assert has_error_message(b'<UIMessages><UIMessage MessageType="FatalError">x</UIMessage></UIMessages>')
+    assert not has_error_message("")
+
+
+def _observe_in_worker(path, requests):
+    metrics = Metrics(multiprocess_dir=path)
+    for _ in range(requests):
+        metrics.observe("shared", 0.01, entities=1)
+    metrics.flush()
+
+
+def test_multiprocess_dir_adds_up_all_workers(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_observe_in_worker, args=(str(tmp_path), requests)) for requests in (2, 3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    metrics = Metrics(multiprocess_dir=str(tmp_path))
+    metrics.observe("shared", 0.01, entities=1)
+
+    counts = metrics.collect()["shared"]
+    assert counts[REQUESTS] == 6
+    assert counts[ENTITIES] == 6
+    assert len(list(tmp_path.glob("metrics_*.json"))) == 3
+
+
+def test_multiprocess_flushes_at_most_once_per_interval(tmp_path, mocker):
+    metrics = Metrics(multiprocess_dir=str(tmp_path), flush_interval=60)
+    flush = mocker.spy(metrics, "flush")
+
+    for _ in range(100):
+        metrics.observe("busy", 0.01)
+
+    assert flush.call_count == 0
+
+
+def test_idle_worker_is_flushed(tmp_path):
+    metrics = Metrics(multiprocess_dir=str(tmp_path), flush_interval=0.05)
+    metrics.observe("idle", 0.01)
+
+    deadline = time.monotonic() + 5
+    while not list(tmp_path.glob("metrics_*.json")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert Metrics(multiprocess_dir=str(tmp_path)).collect()["idle"][REQUESTS] == 1
+
+
+def test_worker_with_reused_pid_keeps_the_counts(tmp_path):
+    # both have the same pid, like a new worker with the pid of a worker which has exited
+    for _ in range(2):
+        _observe_in_worker(str(tmp_path), 1)
+
+    assert Metrics(multiprocess_dir=str(tmp_path)).collect()["shared"][REQUESTS] == 2
+
+
+def test_concurrent_flushes(tmp_path):
+    metrics = Metrics(multiprocess_dir=str(tmp_path), flush_interval=60)
+    metrics.observe("busy", 0.01)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: metrics.flush(), range(200)))
+
+    assert [path.name for path in tmp_path.iterdir()] == [os.path.basename(metrics._path())]
+    assert Metrics(multiprocess_dir=str(tmp_path)).collect()["busy"][REQUESTS] == 1
+
+
+def test_server_records_transform_requests(metrics):
+    with app.test_client() as client:
+        client.post("/run/meteredgreeting/", data=read_test_request())
+        client.post("/run/meteredgreeting", data=read_test_request())
+        client.post("/run/meteredfailing/", data=read_test_request())
+        response = client.post("/run/meteredstream/", data=read_test_request())
+        assert response.data.count(b"<Entity ") == 5
+
+        snapshot = metrics.snapshot()
+        assert snapshot["meteredgreeting"][REQUESTS] == 2
+        assert snapshot["meteredgreeting"][ENTITIES] == 4
+        assert snapshot["meteredgreeting"][ERRORS] == 0
+        assert snapshot["meteredfailing"][ERRORS] == 1
+        assert snapshot["meteredstream"][ENTITIES] == 5
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == CONTENT_TYPE
+        assert 'maltego_trx_requests_total{transform="meteredgreeting"} 2' in response.get_data(as_text=True)
+
+
+def test_server_records_batch_requests(metrics):
+    with app.test_client() as client:
+        client.post("/run/meteredgreeting/batch", data=read_test_request())
+
+    assert metrics.snapshot()["meteredgreeting"][REQUESTS] == 1
+
+
+def test_server_metrics_can_be_disabled(metrics):
+    app.config["TRX_METRICS"] = None
+    with app.test_client() as client:
+        assert client.post("/run/meteredgreeting/", data=read_test_request()).status_code == 200
+        assert client.get("/metrics").status_code == 404
+
+
+def test_asgi_records_transform_requests():
+    metrics = Metrics()
+    asgi_app = TransformASGIApp(metrics=metrics)
+
+    asyncio.run(call(asgi_app, "POST", "/run/meteredgreeting/", read_test_request().encode()))
+    asyncio.run(call(asgi_app, "POST", "/run/meteredstream/", read_test_request().encode()))
+    status, headers, body = asyncio.run(call(asgi_app, "GET", "/metrics"))
+
+    assert status == 200
+    assert headers[b"content-type"] == CONTENT_TYPE.encode()
+    assert 'maltego_trx_entities_total{transform="meteredgreeting"} 2' in body
+    assert 'maltego_trx_entities_total{transform="meteredstream"} 5' in body
+
+
+@pytest.mark.parametrize("env, status", [({}, 404), ({METRICS_ENV: "1"}, 200)])
+def test_metrics_are_opt_in(env, status):
+    code = ("from maltego_trx.server import app; from maltego_trx.asgi import app as asgi_app; "
+            "print(app.test_client().get('/metrics').status_code, asgi_app.metrics is not None)")
+    environ = {key: value for key, value in os.environ.items() if key not in (METRICS_ENV, MULTIPROCESS_DIR_ENV)}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60,
+                            env={**environ, **env}, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    assert result.stdout.split() == [str(status), str(status == 200)]
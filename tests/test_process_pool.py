@@ -0,0 +1,99 @@
+import os
+import re
+
+import pytest
+
+from maltego_trx import process_pool
+from maltego_trx.decorator_registry import TransformRegistry
+from maltego_trx.maltego import MaltegoMsg
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import EXCEPTION_MESSAGE, run_transform
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+
+class ProcessPoolTransform(DiscoverableTransform):
+    use_process_pool = True
+
+    @classmethod
+    def create_entities(cls, request, response):
+        for idx in range(100):
+            entity = response.addEntity("maltego.Phrase", f"{request.Value} {idx}")
+            entity.addProperty("pid", "PID", "strict", os.getpid())
+            entity.addDisplayInformation(f"<b>{idx}</b>", "Info")
+        response.addUIMessage("done")
+
+
+class FailingProcessPoolTransform(DiscoverableTransform):
+    use_process_pool = True
+
+    @classmethod
+    def create_entities(cls, request, response):
+        raise ValueError("failed in worker")
+
+
+registry = TransformRegistry(owner="Maltego", author="Maltego", host_url="localhost", seed_ids=["demo"])
+
+
+@registry.register_transform(display_name="Registered", input_entity="maltego.Phrase", description="",
+                             use_process_pool=True)
+class RegisteredProcessPoolTransform(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", str(os.getpid()))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    process_pool.start(max_workers=2)
+    yield
+    process_pool.shutdown()
+
+
+def test_transform_runs_in_worker_process():
+    request = MaltegoMsg(read_test_request())
+
+    output = ProcessPoolTransform.run_transform(request)
+
+    assert "<Value>paterva.com 99</Value>" in output
+    assert str(os.getpid()) not in output
+    assert "done" in output
+
+
+def test_output_matches_inline_run(mocker):
+    request = MaltegoMsg(read_test_request())
+    output = ProcessPoolTransform.run_transform(request)
+
+    mocker.patch.object(ProcessPoolTransform, "use_process_pool", False)
+    inline_output = ProcessPoolTransform.run_transform(request)
+
+    def without_pids(text):
+        return re.sub(r'Name="pid">\d+<', 'Name="pid"><', text)
+
+    assert without_pids(output) == without_pids(inline_output)
+    assert inline_output.count(str(os.getpid())) == 100
+
+
+def test_pool_is_reused():
+    request = MaltegoMsg(read_test_request())
+    pids = {RegisteredProcessPoolTransform.run_transform(request) for _ in range(10)}
+
+    assert len(pids) <= 2
+
+
+def test_exceptions_are_returned_as_partial_error():
+    register_transform_function(FailingProcessPoolTransform)
+
+    output, status = run_transform("failingprocesspooltransform", MaltegoMsg(read_test_request()))
+
+    assert status == 200
+    assert EXCEPTION_MESSAGE in output
+
+
+def test_registry_flag():
+    assert RegisteredProcessPoolTransform.use_process_pool
+    assert not DiscoverableTransform.use_process_pool
+
+
+def test_workers_are_not_forked():
+    assert process_pool.get_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
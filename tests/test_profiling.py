@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from maltego_trx.handler import handle_run
+from maltego_trx.profiling import PROFILE_HEADER, Profiler, list_profiles, parse_profile_name, summarize_profiles
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_request_parser import read_test_request
+
+
+def fibonacci(n):
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+class ProfiledFibonacci(DiscoverableTransform):
+    @classmethod
+    def create_entities(cls, request, response):
+        response.addEntity("maltego.Phrase", str(fibonacci(15)))
+
+
+class LimitedProfiledFibonacci(ProfiledFibonacci):
+    max_concurrency = 1
+
+
+class ConcurrentProfiledTransform(DiscoverableTransform):
+    # both requests have to run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    @classmethod
+    def create_entities(cls, request, response):
+        cls.barrier.wait()
+        response.addEntity("maltego.Phrase", "done")
+
+
+for transform in (ProfiledFibonacci, LimitedProfiledFibonacci, ConcurrentProfiledTransform):
+    register_transform_function(transform)
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(str(tmp_path / "profiles"), max_profiles=3)
+    app.config["TRX_PROFILER"] = profiler
+    yield profiler
+    app.config["TRX_PROFILER"] = None
+
+
+def post(transform_name, headers=None):
+    with app.test_client() as client:
+        return client.post(f"/run/{transform_name}/", data=read_test_request(), headers=headers or {})
+
+
+@pytest.mark.parametrize("transform_name", ["profiledfibonacci", "limitedprofiledfibonacci"])
+def test_requests_with_header_are_profiled(profiler, transform_name):
+    post(transform_name)
+    assert list_profiles(profiler.directory) == []
+
+    response = post(transform_name, {PROFILE_HEADER: "1"})
+
+    assert b"610" in response.data
+    [path] = list_profiles(profiler.directory)
+    _, profiled_name, input_type = parse_profile_name(path)
+    assert (profiled_name, input_type) == (transform_name, "Domain")
+    assert "fibonacci" in summarize_profiles(profiler.directory)
+
+
+def test_concurrent_profiled_requests(profiler):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        responses = list(pool.map(lambda _: post("concurrentprofiledtransform", {PROFILE_HEADER: "1"}), range(2)))
+
+    # only one request at a time is profiled, the other one runs unprofiled
+    assert all(b"done" in response.data for response in responses)
+    assert len(list_profiles(profiler.directory)) == 1
+
+
+def test_sampled_requests_are_profiled(profiler):
+    profiler.sample_rate = 1.0
+    post("profiledfibonacci")
+
+    profiler.sample_rate = 0.0
+    profiler.header = None
+    post("profiledfibonacci", {PROFILE_HEADER: "1"})
+
+    assert len(list_profiles(profiler.directory)) == 1
+
+
+def test_only_newest_profiles_are_kept(profiler):
+    for _ in range(5):
+        post("profiledfibonacci", {PROFILE_HEADER: "1"})
+
+    paths = list_profiles(profiler.directory)
+    assert len(paths) == 3
+    assert [parse_profile_name(path)[0] for path in paths] == sorted(parse_profile_name(path)[0] for path in paths)
+
+
+def test_summarize_profiles(profiler):
+    for _ in range(2):
+        post("profiledfibonacci", {PROFILE_HEADER: "1"})
+    post("limitedprofiledfibonacci", {PROFILE_HEADER: "1"})
+
+    summary = summarize_profiles(profiler.directory, limit=5).splitlines()
+
+    assert summary[0] == f"= 3 profiles in {profiler.directory} ="
+    rows = {tuple(line.split()[:3]) for line in summary[2:4]}
+    assert rows == {("profiledfibonacci", "Domain", "2"), ("limitedprofiledfibonacci", "Domain", "1")}
+
+
+def test_summarize_without_profiles(tmp_path):
+    assert summarize_profiles(str(tmp_path)) == f"No profiles found in {tmp_path}."
+
+
+def test_profiles_command(profiler, capsys):
+    post("profiledfibonacci", {PROFILE_HEADER: "1"})
+
+    handle_run("__main__", ["project.py", "profiles"], app)
+
+    assert "profiledfibonacci" in capsys.readouterr().out
+
+
+def test_profiles_command_without_app(profiler, capsys):
+    post("profiledfibonacci", {PROFILE_HEADER: "1"})
+
+    # like the project template, which doesn't pass the app
+    handle_run("__main__", ["project.py", "profiles"])
+
+    assert "profiledfibonacci" in capsys.readouterr().out
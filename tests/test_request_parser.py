@@ -0,0 +1,185 @@
+import os.path
+import random
+import string
+
+import pytest
+
+from maltego_trx.maltego import MaltegoMsg, PARSER_MINIDOM, PARSER_ETREE
+
+__TESTDIR__ = os.path.dirname(__file__)
+
+REQUEST_TEMPLATE = """<MaltegoMessage>
+    <MaltegoTransformRequestMessage>
+        <Entities>
+            {entities}
+        </Entities>
+        <Limits SoftLimit="{soft_limit}" HardLimit="{hard_limit}"/>
+        {settings}
+    </MaltegoTransformRequestMessage>
+</MaltegoMessage>"""
+
+ENTITY_TEMPLATE = """<Entity Type="{type}">
+                {genealogy}
+                <AdditionalFields>{fields}</AdditionalFields>
+                <Value>{value}</Value>
+                <Weight>{weight}</Weight>
+            </Entity>"""
+
+
+def make_request(entities=None, soft_limit="12", hard_limit="12", settings=""):
+    entities = entities if entities is not None else [make_entity()]
+    return REQUEST_TEMPLATE.format(entities="\n".join(entities), soft_limit=soft_limit, hard_limit=hard_limit,
+                                   settings=settings)
+
+
+def make_entity(type="maltego.Domain", value="paterva.com", weight="0", genealogy="", fields=""):
+    return ENTITY_TEMPLATE.format(type=type, value=value, weight=weight, genealogy=genealogy, fields=fields)
+
+
+def make_fields(*fields):
+    return "".join(f'<Field Name="{name}" DisplayName="{name.title()}">{value}</Field>' for name, value in fields)
+
+
+def read_test_request():
+    with open(os.path.join(__TESTDIR__, 'test_request.xml')) as request_msg:
+        return request_msg.read()
+
+
+def random_text(rnd: random.Random, length: int) -> str:
+    alphabet = string.ascii_letters + string.digits + " .-_äöü€" + "&<>\"'"
+    text = "".join(rnd.choice(alphabet) for _ in range(length))
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def make_random_request(seed: int) -> str:
+    rnd = random.Random(seed)
+    fields = make_fields(*((f"field{idx}", random_text(rnd, rnd.randint(0, 50))) for idx in range(rnd.randint(0, 20))))
+    genealogy = rnd.choice(["", '<Genealogy><Type Name="maltego.Domain" OldName="Domain"/></Genealogy>'])
+    settings = "<TransformFields>%s</TransformFields>" % make_fields(
+        *((f"setting{idx}", random_text(rnd, 10)) for idx in range(rnd.randint(0, 5))))
+    entity = make_entity(value=random_text(rnd, rnd.randint(1, 100)), weight=str(rnd.randint(0, 100)),
+                         genealogy=genealogy, fields=fields)
+    return make_request([entity], soft_limit=str(rnd.randint(1, 10000)), settings=settings)
+
+
+REQUESTS = {
+    "test_request.xml": read_test_request(),
+    "minimal": make_request(),
+    "escaped_value": make_request([make_entity(value="a &amp; b &lt;c&gt; &quot;d&quot;")]),
+    "unicode_value": make_request([make_entity(value="Grüße aus Köln ☃")]),
+    "empty_value": make_request([make_entity(value="")]),
+    "whitespace_value": make_request([make_entity(value="  spaced out \n")]),
+    "invalid_weight": make_request([make_entity(weight="heavy")]),
+    "invalid_soft_limit": make_request(soft_limit="many"),
+    "missing_soft_limit": make_request().replace('SoftLimit="12" ', ""),
+    "genealogy_after_fields": make_request([
+        """<Entity Type="maltego.Website">
+            <AdditionalFields>
+                <Field Name="fqdn" DisplayName="Website">www.paterva.com</Field>
+                <Field Name="ssl-enabled" DisplayName="SSL Enabled">true</Field>
+            </AdditionalFields>
+            <Genealogy>
+                <Type Name="maltego.Website"/>
+                <Type Name="maltego.DNSName" OldName="DNSName"/>
+            </Genealogy>
+            <Value>www.paterva.com</Value>
+            <Weight>12</Weight>
+        </Entity>"""
+    ]),
+    "legacy_properties": make_request([
+        make_entity(genealogy='<Genealogy><Type Name="maltego.Domain" OldName="Domain"/></Genealogy>',
+                    fields=make_fields(("fqdn", "paterva.com"), ("whois", "whois-info found")))
+    ]),
+    "empty_field": make_request([make_entity(fields='<Field Name="empty" DisplayName="Empty"></Field>')]),
+    "field_without_name": make_request([make_entity(fields='<Field DisplayName="Nameless">value</Field>')]),
+    "duplicate_fields": make_request([make_entity(fields=make_fields(("a", "first"), ("a", "second")))]),
+    "transform_settings": make_request(settings="<TransformFields>%s</TransformFields>" % make_fields(
+        ("api_key", "secret"), ("global#language", "de"))),
+    "multiple_entities": make_request([
+        make_entity(value="first", fields=make_fields(("a", "1"))),
+        make_entity(type="maltego.Phrase", value="second", weight="50", fields=make_fields(("b", "2"))),
+    ]),
+    "nested_value_element": make_request([make_entity(value="<b>bold</b> tail")]),
+    "large_property": make_request([make_entity(fields=make_fields(("blob", "x" * 500_000)))]),
+    "cdata_value": make_request([make_entity(value="<![CDATA[foo]]>")]),
+    "mixed_cdata_value": make_request([make_entity(value="a<![CDATA[b]]>")]),
+    "cdata_field": make_request([make_entity(fields=make_fields(("a", "<![CDATA[<b>bold</b>]]>")))]),
+    "comment_in_value": make_request([make_entity(value="a<!-- comment -->b")]),
+    "processing_instruction": make_request([make_entity(value="a<?pi data?>b")]),
+    "xml_declaration": '<?xml version="1.0" encoding="UTF-8"?>' + make_request(),
+    **{f"random_{seed}": make_random_request(seed) for seed in range(25)},
+}
+
+
+def parse(request, parser):
+    return vars(MaltegoMsg(request, parser=parser))
+
+
+@pytest.mark.parametrize("request_xml", REQUESTS.values(), ids=REQUESTS.keys())
+def test_etree_parser_matches_minidom_parser(request_xml):
+    assert parse(request_xml, PARSER_ETREE) == parse(request_xml, PARSER_MINIDOM)
+
+
+@pytest.mark.parametrize("request_xml", REQUESTS.values(), ids=REQUESTS.keys())
+def test_etree_parser_accepts_bytes(request_xml):
+    request_bytes = request_xml.encode("utf8")
+    assert parse(request_bytes, PARSER_ETREE) == parse(request_bytes, PARSER_MINIDOM)
+
+
+def test_etree_parser_reads_request():
+    msg = MaltegoMsg(read_test_request(), parser=PARSER_ETREE)
+
+    assert msg.Value == "paterva.com"
+    assert msg.Type == "Domain"
+    assert msg.Weight == 0
+    assert msg.Slider == 12
+    assert msg.Genealogy == [{"Name": "maltego.Domain", "OldName": "Domain"}]
+    assert msg.Properties == {"fqdn": "paterva.com", "whois": "whois-info found", "whois-info": "whois-info found"}
+    assert msg.TransformSettings == {}
+
+
+def test_etree_parser_prints_invalid_int(capsys):
+    MaltegoMsg(REQUESTS["invalid_weight"], parser=PARSER_ETREE)
+    etree_output = capsys.readouterr().out
+
+    MaltegoMsg(REQUESTS["invalid_weight"], parser=PARSER_MINIDOM)
+    minidom_output = capsys.readouterr().out
+
+    assert etree_output == minidom_output == "Error: Unable to convert XML value for 'Weight' to an integer.\n"
+
+
+@pytest.mark.parametrize("request_xml, exception", [
+    (make_request(entities=[]), IndexError),
+    (make_request([make_entity()]).replace("<Value>paterva.com</Value>", ""), IndexError),
+    (make_request([make_entity()]).replace(' Type="maltego.Domain"', ""), KeyError),
+    (make_request([make_entity()]).replace("<Weight>0</Weight>", ""), IndexError),
+    (make_request([make_entity(weight="")]), TypeError),
+    (make_request().replace('<Limits SoftLimit="12" HardLimit="12"/>', ""), IndexError),
+])
+def test_etree_parser_raises_like_minidom_parser(request_xml, exception):
+    with pytest.raises(exception):
+        MaltegoMsg(request_xml, parser=PARSER_MINIDOM)
+
+    with pytest.raises(exception):
+        MaltegoMsg(request_xml, parser=PARSER_ETREE)
+
+
+@pytest.mark.parametrize("name, parse_etree_calls", [
+    ("mixed_cdata_value", 0), ("comment_in_value", 0), ("processing_instruction", 0), ("xml_declaration", 1),
+])
+def test_markup_etree_merges_is_parsed_with_minidom(name, parse_etree_calls, mocker):
+    parse_etree = mocker.spy(MaltegoMsg, "_parse_etree")
+
+    msg = MaltegoMsg(REQUESTS[name], parser=PARSER_ETREE)
+
+    assert parse_etree.call_count == parse_etree_calls
+    assert msg.Value in ("a", "paterva.com")
+
+
+def test_parser_can_be_set_per_app(mocker):
+    mocker.patch.object(MaltegoMsg, "parser", PARSER_ETREE)
+    parse_etree = mocker.spy(MaltegoMsg, "_parse_etree")
+
+    MaltegoMsg(read_test_request())
+
+    assert parse_etree.call_count == 1
@@ -0,0 +1,250 @@
+import random
+from xml.etree import ElementTree
+
+import pytest
+
+from maltego_trx.maltego import MaltegoTransform, MaltegoMsg, SERIALIZER_STRING, SERIALIZER_ETREE
+from maltego_trx.overlays import OverlayType, OverlayPosition
+from maltego_trx.serializer import serialize_response
+from maltego_trx.transform import DiscoverableTransform
+from maltego_trx.utils import serialize_xml, sanitize_xml_text, remove_invalid_xml_chars, has_invalid_xml_chars
+from tests.test_xml import _serialize_xml
+
+
+def entity_with_value(response):
+    response.addEntity("maltego.Phrase", "Hello Spencer!")
+
+
+def entity_with_none_value(response):
+    response.addEntity("maltego.Phrase", None)
+
+
+def entity_with_none_type(response):
+    response.addEntity(None, "Value")
+
+
+def entity_with_properties(response):
+    entity = response.addEntity("maltego.Phrase", "Hello Spencer!")
+    entity.addProperty(fieldName="fieldNameTest", displayName=None, value="valueTest", matchingRule="loose")
+    entity.addProperty(fieldName="fieldNameTest2", displayName="displayNameTest2", value="valueTest2",
+                       matchingRule="strict")
+    entity.addProperty(fieldName=None, displayName="displayNameTest", value="valueTest", matchingRule="loose")
+    entity.addProperty(fieldName="fieldNameTest", displayName="displayNameTest", matchingRule=None, value=None)
+
+
+def entity_with_display_information(response):
+    entity = response.addEntity("maltego.Phrase", "Hello Spencer!")
+    entity.addDisplayInformation(title="Display Info Title", content="<p>Display Info Content</p>")
+
+
+def entity_with_icon(response):
+    entity = response.addEntity("maltego.Phrase", "Hello Spencer!")
+    entity.setIconURL(url="https://www.maltego.com/img/maltego-logo/maltego-horizontal.png")
+
+
+def entity_with_overlays(response):
+    entity = response.addEntity("maltego.Phrase", "Hello Spencer!")
+    entity.addOverlay('#45e06f', OverlayPosition.NORTH_WEST, OverlayType.COLOUR)
+    entity.addOverlay(None, OverlayPosition.SOUTH, OverlayType.TEXT)
+
+
+def entity_with_links(response):
+    entity = response.addEntity("maltego.Phrase", "Hello Spencer!")
+    entity.setLinkColor("#0000FF")
+    entity.setLinkStyle("2")
+    entity.setLinkThickness(3)
+    entity.setLinkLabel("label")
+    entity.reverseLink()
+    entity.setBookmark(3)
+    entity.setNote("note")
+    entity.setWeight(42)
+
+
+def response_with_ui_messages(response):
+    response.addUIMessage("Test Message", messageType="inform")
+    response.addUIMessage("Test Exception", "PartialError")
+    response.addUIMessage(None, messageType=None)
+
+
+def special_characters(response):
+    entity = response.addEntity("maltego.Phrase", 'a & b < c > d "e" \'f\' \r\n\r\t ünïcödé ☃')
+    entity.addProperty('name "&<>\t\n\r', 'display "&<>\t\n\r', "strict", 'value "&<>\t\n\r\r\n')
+    entity.addDisplayInformation('<a href="https://maltego.com?a=1&b=2">link</a>\r\n', 'title "&<>\t\n')
+    entity.addOverlay('prop "&<>\t', OverlayPosition.CENTER, OverlayType.IMAGE)
+    entity.setIconURL("https://maltego.com/icon.png?a=1&b=<2>")
+    response.addUIMessage('message "&<>\t\r\n', 'type "&<>')
+
+
+def all_null_values(response):
+    entity = response.addEntity(None, None)
+    entity.addProperty(fieldName=None, displayName=None, value=None, matchingRule=None)
+    entity.addDisplayInformation(title=None, content=None)
+    entity.setIconURL(url=None)
+    entity.addOverlay(propertyName=None, position=OverlayPosition.NORTH_WEST, overlayType=OverlayType.COLOUR)
+    entity.setLinkLabel(None)
+    entity.setLinkThickness(None)
+    entity.setLinkColor(None)
+    entity.setLinkStyle(None)
+    entity.setType(None)
+    entity.setWeight(None)
+    entity.addCustomLinkProperty(None, None, None)
+    entity.setNote(None)
+    entity.setValue(None)
+    response.addUIMessage(None, messageType=None)
+
+
+def many_entities(response):
+    rnd = random.Random(1337)
+    for idx in range(200):
+        entity = response.addEntity(rnd.choice(["maltego.Phrase", "maltego.Domain"]), f"value {idx} & <{idx}>")
+        for prop_idx in range(rnd.randint(0, 4)):
+            entity.addProperty(f"prop{prop_idx}", f"Prop {prop_idx}", rnd.choice(["strict", "loose"]), idx)
+        if rnd.random() > 0.5:
+            entity.addDisplayInformation(f"<b>{idx}</b>", "Info")
+        if rnd.random() > 0.5:
+            entity.addOverlay(f"prop{idx}", OverlayPosition.WEST, OverlayType.TEXT)
+
+
+def empty_response(response):
+    pass
+
+
+SCENARIOS = [
+    entity_with_value,
+    entity_with_none_value,
+    entity_with_none_type,
+    entity_with_properties,
+    entity_with_display_information,
+    entity_with_icon,
+    entity_with_overlays,
+    entity_with_links,
+    response_with_ui_messages,
+    special_characters,
+    all_null_values,
+    many_entities,
+    empty_response,
+]
+
+
+def build_response(scenario, serializer=None) -> MaltegoTransform:
+    response = MaltegoTransform(serializer=serializer)
+    scenario(response)
+    return response
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_string_serializer_matches_snapshot_serialization(scenario, caplog):
+    response = build_response(scenario)
+    expected = _serialize_xml(response.build_xml())
+    expected_messages = list(caplog.messages)
+    caplog.clear()
+
+    response = build_response(scenario)
+    actual = serialize_response(response.entities, response.iter_ui_messages(), indent=False)
+
+    assert actual == expected
+    assert caplog.messages == expected_messages
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_string_serializer_matches_return_output(scenario, caplog):
+    expected = build_response(scenario, SERIALIZER_ETREE).returnOutput()
+    expected_messages = list(caplog.messages)
+    caplog.clear()
+
+    actual = build_response(scenario, SERIALIZER_STRING).returnOutput()
+
+    assert actual == expected
+    assert caplog.messages == expected_messages
+
+
+def test_string_serializer_output_is_canonical():
+    response = build_response(special_characters, SERIALIZER_STRING)
+    output = response.returnOutput()
+
+    assert serialize_xml(response.build_xml()) == output
+
+
+def test_serializer_can_be_set_per_app(mocker):
+    mocker.patch.object(MaltegoTransform, "serializer", SERIALIZER_STRING)
+    serialize = mocker.patch("maltego_trx.maltego.serialize_response", return_value="")
+
+    MaltegoTransform().returnOutput()
+
+    assert serialize.call_count == 1
+
+
+def test_serializer_can_be_set_per_transform(mocker):
+    class StringSerializedTransform(DiscoverableTransform):
+        serializer = SERIALIZER_STRING
+
+        @classmethod
+        def create_entities(cls, request, response):
+            response.addEntity("maltego.Phrase", request.Value)
+
+    serialize = mocker.spy(MaltegoTransform, "build_xml")
+
+    output = StringSerializedTransform.run_transform(MaltegoMsg(LocalArgs=["Hello"]))
+
+    assert serialize.call_count == 0
+    assert "<Value>Hello</Value>" in output
+
+
+def invalid_characters(response):
+    entity = response.addEntity("maltego.Phrase\x00",
+                                "null \x00 byte, bell \x07, escape \x1b and lone \ud800 surrogate")
+    entity.addProperty("field\x01", "Field \x02", "loose", "value \x03\x04 ￿")
+    entity.addDisplayInformation("content \x0b", "title \x0c")
+    entity.addOverlay("property \x0e", OverlayPosition.NORTH, OverlayType.TEXT)
+    entity.setIconURL("https://maltego.com/\x1f.png")
+    response.addEntities("maltego.Phrase", ["batch \x05", "valid"], {"field": ["\x06", "valid"]})
+    response.addUIMessage("message \x08")
+
+
+@pytest.mark.parametrize("serializer", [SERIALIZER_ETREE, SERIALIZER_STRING])
+def test_invalid_characters_are_sanitized(serializer):
+    output = build_response(invalid_characters, serializer).returnOutput()
+
+    # the canonicalization parses the output again, which fails for invalid characters
+    assert serialize_xml(ElementTree.fromstring(output), indent=False) == output
+    assert "null ? byte, bell ?, escape ? and lone ? surrogate" in output
+    assert "<Value>batch ?</Value>" in output
+
+
+def test_sanitized_serializers_match():
+    expected = build_response(invalid_characters, SERIALIZER_ETREE).returnOutput()
+
+    assert build_response(invalid_characters, SERIALIZER_STRING).returnOutput() == expected
+
+
+def test_sanitization_can_be_disabled(mocker):
+    mocker.patch.object(MaltegoTransform, "sanitize", False)
+
+    output = build_response(invalid_characters, SERIALIZER_STRING).returnOutput()
+
+    assert "bell \x07" in output
+
+
+@pytest.mark.parametrize("value", [
+    "",
+    "plain ascii",
+    "tab\tnew line\ncarriage return\r",
+    "ünïcödé ☃ 𝄞",
+    "\x00",
+    "a\x01\x02b",
+    "lone \udfff surrogate",
+    "￾￿",
+])
+def test_sanitize_xml_text_matches_remove_invalid_xml_chars(value):
+    assert sanitize_xml_text(value) == remove_invalid_xml_chars(value)
+
+
+def test_sanitize_xml_text_returns_valid_values_unchanged():
+    value = "tab\tünïcödé ☃ " * 100
+
+    assert sanitize_xml_text(value) is value
+
+
+def test_has_invalid_xml_chars():
+    assert not has_invalid_xml_chars(["valid", "tab\t", "ünïcödé"])
+    assert has_invalid_xml_chars(["valid", "\x00"])
@@ -0,0 +1,150 @@
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from maltego_trx.cache import ResponseCache
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app
+from maltego_trx.sqlite_cache import SQLiteCache
+from tests.test_cache import CountingTransform, post, request_body
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def test_get_and_set(path):
+    cache = SQLiteCache(path)
+    cache.set("a", b"value")
+
+    assert cache.get("a") == b"value"
+    assert cache.get("b") is None
+    assert len(cache) == 1
+    assert cache.size == len("a") + len(b"value")
+
+    cache.set("a", b"other")
+    assert cache.get("a") == b"other"
+    assert cache.size == 6
+
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_entries_expire(path):
+    cache = SQLiteCache(path)
+    cache.set("a", b"value", ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entries_are_evicted(path, mocker):
+    cache = SQLiteCache(path, max_bytes=100)
+    clock = mocker.patch("maltego_trx.sqlite_cache.time.time", return_value=1000.0)
+
+    cache.set("a", b"x" * 40)
+    clock.return_value = 1010.0
+    cache.set("b", b"x" * 40)
+    clock.return_value = 1020.0
+    cache.get("a")
+    clock.return_value = 1030.0
+    cache.set("c", b"x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.size <= 100
+
+
+def test_entries_survive_restarts(path):
+    SQLiteCache(path).set("a", b"value")
+
+    assert SQLiteCache(path).get("a") == b"value"
+
+
+def write_entries(path, worker, count):
+    cache = SQLiteCache(path)
+    for idx in range(count):
+        cache.set(f"{worker}-{idx}", f"value {idx}".encode())
+        assert cache.get(f"{worker}-{idx}") == f"value {idx}".encode()
+
+
+def test_concurrent_workers(path):
+    SQLiteCache(path)
+    workers = [multiprocessing.Process(target=write_entries, args=(path, worker, 100)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    cache = SQLiteCache(path)
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len(cache) == 400
+    assert cache.size == sum(len(f"{worker}-{idx}") + len(f"value {idx}") for worker in range(4) for idx in range(100))
+
+
+def test_response_cache_backend(path):
+    register_transform_function(CountingTransform)
+    CountingTransform.calls = 0
+    app.config["TRX_RESPONSE_CACHE"] = ResponseCache(SQLiteCache(path))
+
+    try:
+        with app.test_client() as client:
+            first = post(client, "countingtransform", request_body())
+            app.config["TRX_RESPONSE_CACHE"] = ResponseCache(SQLiteCache(path))
+            second = post(client, "countingtransform", request_body())
+    finally:
+        app.config["TRX_RESPONSE_CACHE"] = None
+
+    assert first == second
+    assert CountingTransform.calls == 1
+
+
+@pytest.fixture
+def locked_path(path, mocker):
+    mocker.patch("maltego_trx.sqlite_cache.BUSY_TIMEOUT", 50)
+    SQLiteCache(path)
+    # another process holding the write lock
+    lock = sqlite3.connect(path, isolation_level=None)
+    yield path, lock
+    if lock.in_transaction:
+        lock.execute("ROLLBACK")
+    lock.close()
+
+
+def test_locked_database_is_a_miss(locked_path, mocker):
+    path, lock = locked_path
+    cache = SQLiteCache(path)
+    cache.set("a", b"value")
+    mocker.patch("maltego_trx.sqlite_cache.time.time", return_value=time.time() + 10)
+
+    lock.execute("BEGIN IMMEDIATE")
+    cache.set("b", b"other value")
+    cache.delete("a")
+
+    # the access time can't be updated, but the value is still read
+    assert cache.get("a") == b"value"
+    lock.execute("ROLLBACK")
+    assert cache.get("b") is None
+
+
+def test_response_cache_with_locked_database(locked_path):
+    path, lock = locked_path
+    register_transform_function(CountingTransform)
+    CountingTransform.calls = 0
+    app.config["TRX_RESPONSE_CACHE"] = ResponseCache(SQLiteCache(path))
+    lock.execute("BEGIN IMMEDIATE")
+
+    try:
+        with app.test_client() as client:
+            responses = [client.post("/run/countingtransform/", data=request_body()) for _ in range(2)]
+    finally:
+        app.config["TRX_RESPONSE_CACHE"] = None
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert CountingTransform.calls == 2
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+
+from maltego_trx.deadline import DEADLINE_MESSAGE, DeadlineExceeded
+from maltego_trx.maltego import MaltegoMsg, MaltegoTransform, SERIALIZER_STRING
+from maltego_trx import server
+from maltego_trx.registry import register_transform_function
+from maltego_trx.server import app, EXCEPTION_MESSAGE
+from maltego_trx.streaming import StreamClosed, MAX_PENDING_CHUNKS
+from maltego_trx.transform import DiscoverableTransform
+from tests.test_property_mapping import make_transform_call
+
+ENTITY_COUNT = 1234
+
+
+def add_entities(response, count=ENTITY_COUNT):
+    for idx in range(count):
+        entity = response.addEntity("maltego.Phrase", f"Entity {idx}")
+        entity.addProperty("index", "Index", "strict", idx)
+        entity.addDisplayInformation(f"<b>{idx}</b>", "Info")
+
+
+class StreamedTransform(DiscoverableTransform):
+    stream = True
+    stream_chunk_size = 100
+
+    @classmethod
+    def create_entities(cls, request, response):
+        add_entities(response)
+        response.addUIMessage("done")
+
+
+class FailingStreamedTransform(DiscoverableTransform):
+    stream = True
+    stream_chunk_size = 100
+
+    @classmethod
+    def create_entities(cls, request, response):
+        add_entities(response, 250)
+        raise ValueError("upstream failed")
+
+
+@pytest.fixture
+def client():
+    register_transform_function(StreamedTransform)
+    register_transform_function(FailingStreamedTransform)
+    app.testing = True
+
+    with app.test_client() as client:
+        yield client
+
+
+def test_streamed_response_matches_materialized_response(client):
+    response = make_transform_call(client, "/run/streamedtransform/")
+
+    assert response.status_code == 200
+
+    expected = MaltegoTransform(serializer=SERIALIZER_STRING)
+    add_entities(expected)
+    expected.addUIMessage("done")
+
+    assert response.data.decode("utf8") == expected.returnOutput()
+
+
+def test_streamed_response_ends_with_error_message(client, caplog):
+    response = make_transform_call(client, "/run/failingstreamedtransform/")
+
+    assert response.status_code == 200
+
+    expected = MaltegoTransform(serializer=SERIALIZER_STRING)
+    add_entities(expected, 250)
+    expected.addUIMessage(EXCEPTION_MESSAGE, "PartialError")
+
+    assert response.data.decode("utf8") == expected.returnOutput()
+    assert "An exception occurred while executing your transform code." in caplog.messages
+
+
+def test_streaming_is_chunked():
+    chunks = list(StreamedTransform.stream_transform(MaltegoMsg(LocalArgs=["input"]), EXCEPTION_MESSAGE))
+
+    # one chunk per full set of entities, plus the remaining entities with the closing tags
+    assert len(chunks) == ENTITY_COUNT // StreamedTransform.stream_chunk_size + 1
+
+
+def test_closing_the_stream_stops_the_transform():
+    added = []
+    stopped = threading.Event()
+
+    class EndlessTransform(DiscoverableTransform):
+        stream_chunk_size = 10
+
+        @classmethod
+        def create_entities(cls, request, response):
+            try:
+                while True:
+                    added.append(response.addEntity("maltego.Phrase", str(len(added))))
+            except StreamClosed:
+                stopped.set()
+                raise
+
+    stream = EndlessTransform.stream_transform(MaltegoMsg(LocalArgs=["input"]), EXCEPTION_MESSAGE)
+    next(stream)
+    stream.close()
+
+    assert stopped.wait(timeout=5)
+    # the transform is blocked while the client isn't reading, so only a few chunks are ever created
+    assert len(added) <= EndlessTransform.stream_chunk_size * (MAX_PENDING_CHUNKS + 3)
+
+
+def test_stuck_streamed_transform_ends_at_its_deadline():
+    release = threading.Event()
+
+    class StuckTransform(DiscoverableTransform):
+        stream_chunk_size = 100
+        timeout = 0.2
+
+        @classmethod
+        def create_entities(cls, request, response):
+            add_entities(response, 150)
+            release.wait(timeout=10)
+
+    start = time.monotonic()
+    output = "".join(StuckTransform.stream_transform(MaltegoMsg(LocalArgs=["input"]), EXCEPTION_MESSAGE))
+    release.set()
+
+    assert time.monotonic() - start < 5
+    # only the full chunk has been handed over when the deadline expired
+    assert output.count("<Entity ") == 100
+    assert output.count(DEADLINE_MESSAGE) == 1
+
+
+def test_streamed_transform_stops_adding_entities_at_its_deadline():
+    stopped = threading.Event()
+
+    class SlowTransform(DiscoverableTransform):
+        stream_chunk_size = 10
+        timeout = 0.2
+
+        @classmethod
+        def create_entities(cls, request, response):
+            try:
+                while True:
+                    response.addEntity("maltego.Phrase", "slow")
+                    time.sleep(0.01)
+            except (DeadlineExceeded, StreamClosed):
+                # the response may have ended at the deadline before the transform added the next entity
+                stopped.set()
+                raise
+
+    output = "".join(SlowTransform.stream_transform(MaltegoMsg(LocalArgs=["input"]), EXCEPTION_MESSAGE))
+
+    assert stopped.wait(timeout=5)
+    assert output.count(DEADLINE_MESSAGE) == 1
+    assert output.count("<Entity ") > 0
+
+
+def test_only_streaming_transforms_are_streamed(client, mocker):
+    class PlainTransform(DiscoverableTransform):
+        @classmethod
+        def create_entities(cls, request, response):
+            response.addEntity("maltego.Phrase", "plain")
+
+    register_transform_function(PlainTransform)
+    stream_transform = mocker.spy(server, "stream_transform")
+
+    make_transform_call(client, "/run/plaintransform/")
+    assert stream_transform.call_count == 0
+
+    make_transform_call(client, "/run/streamedtransform/")
+    assert stream_transform.call_count == 1